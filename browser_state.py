@@ -0,0 +1,129 @@
+"""Uložený stav browseru (cookies + localStorage) per web a proxy identitu.
+
+Každý běh vytváří nový ``browser.new_context`` – bez uloženého stavu se
+ztratí consent cookies i Cloudflare clearance (``cf_clearance``) a první
+stránky znovu narazí na challenge. ``BrowserState`` ukládá
+``context.storage_state()`` do ``browser_state/<web>__<proxy>.json``
+a další běh ho předá do ``new_context(storage_state=...)``.
+
+Clearance cookie platí jen pro IP, ze které byla získána, proto je
+klíčem i proxy (``direct`` = bez proxy). Soubor starší než
+``STATE_TTL_H`` hodin se ignoruje, cookies s prošlou expirací se
+zahazují. Při uložení se stav sloučí s tím, co mezitím zapsal jiný
+proces – cookies živého kontextu nahradí uložené cookies stejných domén,
+ostatní domény zůstanou – a zapíše se atomicky.
+
+Narazí-li kontext vytvořený z uloženého stavu na challenge
+(``challenged``), stav se smaže a kontext se už neuloží – další kontext
+začne s čistými cookies.
+
+Perzistentní profil (``launch_persistent_context``) se nepoužívá –
+nejde otevřít ve sdíleném CDP browseru Manageru (viz shared_browser.py).
+"""
+
+import json
+import os
+import re
+import time
+import weakref
+from pathlib import Path
+
+STATE_DIR = Path(__file__).resolve().parent / "browser_state"
+STATE_TTL_H = 12
+
+# Kontext → BrowserState, ze kterého byl vytvořen; kontexty se zahozeným stavem se neukládají
+_seeded = weakref.WeakKeyDictionary()
+_stale = weakref.WeakSet()
+
+
+def _identity(proxy_cfg) -> str:
+    server = (proxy_cfg or {}).get("server")
+    return re.sub(r'[^0-9A-Za-z.]+', '_', server).strip('_') if server else "direct"
+
+
+def _cookie_key(c):
+    return c.get("name"), c.get("domain"), c.get("path")
+
+
+def _valid(cookie, now) -> bool:
+    exp = cookie.get("expires", -1)
+    return exp is None or exp < 0 or exp > now
+
+
+class BrowserState:
+    def __init__(self, site: str, proxy_cfg=None, ttl_h: float = STATE_TTL_H, state_dir=STATE_DIR):
+        self.path = Path(state_dir) / f"{site}__{_identity(proxy_cfg)}.json"
+        self.ttl = ttl_h * 3600
+
+    def _read(self):
+        """Platný uložený stav, nebo None (chybí, je poškozený nebo starší než TTL)."""
+        try:
+            if time.time() - self.path.stat().st_mtime > self.ttl:
+                return None
+            state = json.loads(self.path.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return None
+        now = time.time()
+        state["cookies"] = [c for c in state.get("cookies", []) if _valid(c, now)]
+        state.setdefault("origins", [])
+        return state
+
+    def kwargs(self, log=print) -> dict:
+        """Argumenty pro ``new_context`` – ``{"storage_state": ...}`` nebo ``{}``."""
+        state = self._read()
+        if not state or not (state["cookies"] or state["origins"]):
+            return {}
+        log(f"[state] Načten uložený stav {self.path.name} ({len(state['cookies'])} cookies)")
+        return {"storage_state": state}
+
+    def attach(self, context, seed: dict):
+        """Zaznamená, že ``context`` vznikl s argumenty ``seed`` z ``kwargs()``."""
+        if seed:
+            _seeded[context] = self
+
+    async def save(self, context, log=print):
+        """Uloží stav kontextu; chyba uložení běh nepřeruší."""
+        try:
+            state = await context.storage_state()
+        except Exception as e:
+            log(f"[state] Stav nelze přečíst: {e}")
+            return
+        if context in _stale:
+            log(f"[state] {self.path.name}: kontext narazil na challenge, neukládám")
+            return
+        now = time.time()
+        # Sloučení se stavem jiného procesu – pro domény živého kontextu platí jen jeho cookies
+        # (cookie smazaná webem se tak nevrátí ze souboru), ostatní domény zůstanou
+        live = state.get("cookies", [])
+        live_domains = {c.get("domain") for c in live}
+        stored = self._read() or {"cookies": [], "origins": []}
+        merged = {}
+        for c in [c for c in stored["cookies"] if c.get("domain") not in live_domains] + live:
+            if _valid(c, now):
+                merged[_cookie_key(c)] = c
+        origins = {o.get("origin"): o for o in stored["origins"]}
+        origins.update({o.get("origin"): o for o in state.get("origins", [])})
+        out = {"cookies": list(merged.values()), "origins": list(origins.values())}
+
+        self.path.parent.mkdir(exist_ok=True)
+        tmp = self.path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(out, ensure_ascii=False), encoding='utf-8')
+        os.replace(tmp, self.path)
+        log(f"[state] Uložen stav {self.path.name} ({len(out['cookies'])} cookies)")
+
+    def discard(self):
+        """Smaže uložený stav (např. když s ním web vrací challenge)."""
+        try:
+            self.path.unlink()
+        except OSError:
+            pass
+
+
+def challenged(context, log=print):
+    """Kontext narazil na challenge – byl-li vytvořen z uloženého stavu, stav se smaže."""
+    state = _seeded.pop(context, None)
+    if state is None:
+        return
+    _stale.add(context)
+    state.discard()
+    log(f"[state] Challenge s uloženým stavem – {state.path.name} smazán")
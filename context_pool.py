@@ -0,0 +1,525 @@
+"""Recyklace a obnova dlouho žijícího ``BrowserContext``.
+
+``ManagedContext`` obaluje kontext (atributy deleguje, scrapery ho
+používají jako obyčejný ``context``), podle navigací a RSS Chromia nastaví
+``recycle_due`` a výměnu provede v ``checkpoint()`` mezi stranami listingu
+nebo dávkami URL. Po pádu browseru ``recover()`` spustí nový. Přepínání
+proxy (``ProxyFailover``) a rozložení workerů po exitech (``ProxyLanes``)
+staví na ``switch()`` a ``lane()``. Popis viz README, „Architektura scraperů“.
+"""
+
+import asyncio
+import os
+import time
+import weakref
+from pathlib import Path
+
+from http_client import cloudflare_verdict
+from proxy_pool import is_proxy_error
+from pw_tracer import TRACER
+
+RECYCLE_AFTER_NAVIGATIONS = 600
+RECYCLE_RSS_MB = 1500
+MIN_NAVIGATIONS_BETWEEN = 50   # po recyklaci paměť hned neklesne celá – nerecyklovat dokola
+SAMPLE_INTERVAL_S = 30
+DRAIN_TIMEOUT_S = 180
+MAX_RECOVERIES = 5             # víc pádů za běh = něco je zásadně špatně, běh skončí
+PROXY_PROBE_INTERVAL_S = 60
+BATCH_SIZE = 200               # URL na dávku ``supervised_batches`` (sitemapa, part numbery)
+
+_BROWSER_NAMES = ("chrome", "chromium", "headless_shell")
+
+# Kontexty s watchdogem v tomto procesu – v multi_site.py jeden na web nad společným browserem
+_roots = weakref.WeakSet()
+
+
+def browser_rss_mb():
+    """Součet RSS procesů Chromia spuštěných tímto procesem (MB), nebo None."""
+    proc = Path("/proc")
+    if not proc.exists():
+        return None
+    children = {}
+    for d in proc.iterdir():
+        if not d.name.isdigit():
+            continue
+        try:
+            ppid = int((d / "stat").read_text().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(d.name)
+
+    page_kb = os.sysconf("SC_PAGE_SIZE") // 1024
+    total_kb = 0
+    found = False
+    stack = list(children.get(os.getpid(), []))
+    while stack:
+        pid = stack.pop()
+        stack.extend(children.get(int(pid), []))
+        try:
+            name = (proc / pid / "comm").read_text().strip().lower()
+            if not any(n in name for n in _BROWSER_NAMES):
+                continue
+            total_kb += int((proc / pid / "statm").read_text().split()[1]) * page_kb
+            found = True
+        except (OSError, IndexError, ValueError):
+            continue
+    return total_kb / 1024 if found else None
+
+
+class BrowserCrashedError(RuntimeError):
+    """Browser spadl víckrát, než dovoluje ``MAX_RECOVERIES``."""
+
+
+class ManagedContext:
+    def __init__(self, browser, context, factory, launch=None, on_retire=None, log=print,
+                 max_navigations=RECYCLE_AFTER_NAVIGATIONS, max_rss_mb=RECYCLE_RSS_MB, parent=None):
+        self.browser = browser
+        self._ctx = context
+        self._factory = factory          # async (browser) -> nový BrowserContext
+        self._launch = launch            # async () -> nový browser (obnova po pádu)
+        self._on_retire = on_retire      # async (starý kontext) -> None
+        self._log = log
+        self.crashed = False
+        self.recoveries = 0
+        self.max_navigations = max_navigations
+        self.max_rss_mb = max_rss_mb
+        self.navigations = 0
+        self.recycled = 0
+        self.recycle_due = None          # důvod recyklace, nebo None
+        self._open_pages = set()
+        self._ready = asyncio.Event()
+        self._ready.set()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self.on_page = None              # (stránka) -> None, např. ProxyFailover sleduje odpovědi
+        self._lanes = []
+        self._parent = parent
+        self._nojs = None                # kontext bez JS (``nojs()``), vzniká líně
+        self._nojs_lock = asyncio.Lock()
+        # Lane sdílí browser rodiče – RSS i pád browseru hlídá rodič
+        self._watchdog = asyncio.create_task(self._watch()) if parent is None else None
+        if parent is None:
+            _roots.add(self)
+            self._watch_browser(browser)
+
+    def _watch_browser(self, browser):
+        def gone(_):
+            if browser is self.browser:
+                self.crashed = True
+        browser.on("disconnected", gone)
+
+    def __getattr__(self, name):
+        return getattr(self._ctx, name)
+
+    @property
+    def context(self):
+        return self._ctx
+
+    async def new_page(self):
+        await self._ready.wait()
+        page = TRACER.wrap(await self._ctx.new_page())  # --trace-calls: obal měřící volání API
+        pages = self._open_pages
+        pages.add(page)
+        self._idle.clear()
+        page.on("framenavigated", lambda frame: self._navigated(page, frame))
+        page.on("close", lambda _: self._closed(page, pages))
+        if self.on_page:
+            self.on_page(page)
+        return page
+
+    def _navigated(self, page, frame):
+        if frame is page.main_frame:
+            self.navigations += 1
+            if self.navigations >= self.max_navigations and not self.recycle_due:
+                self.recycle_due = f"{self.navigations} navigací"
+
+    def _closed(self, page, pages):
+        pages.discard(page)
+        if pages is self._open_pages and not pages:
+            self._idle.set()
+
+    def _busy(self) -> bool:
+        return bool(self._open_pages) or any(lane._open_pages for lane in self._lanes)
+
+    def _load(self) -> int:
+        return self.navigations + sum(lane.navigations for lane in self._lanes)
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(SAMPLE_INTERVAL_S)
+            rss = await asyncio.to_thread(browser_rss_mb)
+            if rss is None:
+                continue
+            # RSS je součet celého browseru: při víc webech v procesu se limit násobí počtem
+            # aktivních webů a recykluje jen ten s nejvíc navigacemi od poslední recyklace
+            active = [c for c in _roots if c._busy()] or [self]
+            if (self not in active or rss <= self.max_rss_mb * len(active)
+                    or any((c.recycle_due or "").startswith("RSS") for c in active)):
+                continue
+            if (max(active, key=lambda c: c._load()) is self and not self.recycle_due
+                    and self._load() >= MIN_NAVIGATIONS_BETWEEN):
+                self.recycle_due = f"RSS {rss:.0f} MB"
+
+    async def recycle(self):
+        """Vymění kontext za nový; volat v bodě, kde volající nedrží vlastní stránky."""
+        reason = self.recycle_due or "vynuceno"
+        self._ready.clear()  # nové stránky počkají na nový kontext
+        t0 = time.monotonic()
+        try:
+            try:
+                await asyncio.wait_for(self._idle.wait(), DRAIN_TIMEOUT_S)
+            except asyncio.TimeoutError:
+                self._log(f"[context] {len(self._open_pages)} stránek stále otevřeno po {DRAIN_TIMEOUT_S} s – zavírám")
+            old = self._ctx
+            if self._on_retire:
+                await self._on_retire(old)
+            self._ctx = await self._factory(self.browser)
+            self._open_pages = set()
+            self._idle.set()
+            self._drop_nojs()
+            try:
+                await old.close()
+            except Exception:
+                pass
+            self.recycled += 1
+            self._log(f"[context] Recyklace č. {self.recycled} ({reason}) za {time.monotonic() - t0:.1f} s")
+            self.navigations = 0
+            self.recycle_due = None
+        finally:
+            self._ready.set()
+
+    async def recover(self):
+        """Spustí nový browser po pádu a vytvoří v něm nový kontext."""
+        self.recoveries += 1
+        if self._launch is None or self.recoveries > MAX_RECOVERIES:
+            raise BrowserCrashedError(f"Browser spadl ({self.recoveries}×), obnova není možná")
+        t0 = time.monotonic()
+        self._ready.clear()
+        try:
+            try:
+                await self.browser.close()
+            except Exception:
+                pass
+            self.browser = await self._launch()
+            self._watch_browser(self.browser)
+            self._ctx = await self._factory(self.browser)
+            self._open_pages = set()
+            self._idle.set()
+            self._nojs = None  # zanikl se starým browserem
+            for lane in self._lanes:
+                lane.browser = self.browser
+                lane._ctx = await lane._factory(self.browser)
+                lane._open_pages = set()
+                lane._idle.set()
+                lane._nojs = None
+                lane.navigations = 0
+                lane.recycle_due = None
+            self.crashed = False
+            self.navigations = 0
+            self.recycle_due = None
+            self._log(f"[context] Browser obnoven po pádu č. {self.recoveries} za {time.monotonic() - t0:.1f} s")
+        finally:
+            self._ready.set()
+
+    async def checkpoint(self, page=None):
+        """Bod mezi stranami listingu / dávkami – obnova po pádu nebo recyklace; vrací platnou stránku."""
+        if self.crashed:
+            await self.recover()
+        elif self.recycle_due:
+            if page is not None:
+                await page.close()
+            rss = self.recycle_due.startswith("RSS")
+            await self.recycle()
+            for lane in self._lanes:
+                if rss and not lane.recycle_due:
+                    lane.recycle_due = "RSS browseru"
+        for lane in self._lanes:
+            if lane.recycle_due:
+                await lane.recycle()
+        if page is None:
+            return None
+        if page not in self._open_pages:
+            try:
+                await page.close()  # stránka ze starého kontextu (po switch)
+            except Exception:
+                pass
+            page = await self.new_page()
+        return page
+
+    async def switch(self, factory, on_retire=None, reason=""):
+        """Nové stránky půjdou do nového kontextu z ``factory``; starý se zavře, až doběhne."""
+        old, old_pages = self._ctx, self._open_pages
+        self._factory = factory
+        self._on_retire = on_retire
+        self._ctx = await factory(self.browser)
+        self._open_pages = set()
+        self._idle.set()
+        self._drop_nojs()
+        self._log(f"[context] Přepnuto na nový kontext ({reason})")
+        asyncio.create_task(self._retire_when_idle(old, old_pages))
+
+    async def nojs(self):
+        """Kontext bez JS přes stejnou factory (proxy, stav); vymění se spolu s tímto kontextem."""
+        async with self._nojs_lock:
+            if self._nojs is None:
+                self._nojs = await self._factory(self.browser, java_script_enabled=False)
+            return self._nojs
+
+    def _drop_nojs(self):
+        old, self._nojs = self._nojs, None
+        if old is not None:
+            asyncio.create_task(self._retire_when_idle(old))
+
+    async def _retire_when_idle(self, old, pages=None):
+        # bez ``pages`` (kontext bez JS) se čeká na stránky samotného kontextu
+        deadline = time.monotonic() + DRAIN_TIMEOUT_S
+        while (old.pages if pages is None else pages) and time.monotonic() < deadline:
+            await asyncio.sleep(1)
+        try:
+            await old.close()
+        except Exception:
+            pass
+
+    async def lane(self, factory, on_retire=None) -> "ManagedContext":
+        """Další kontext ve stejném browseru (jiná proxy); pád a RSS řídí tento kontext."""
+        child = ManagedContext(self.browser, await factory(self.browser), factory=factory,
+                               on_retire=on_retire, log=self._log, max_navigations=self.max_navigations,
+                               parent=self)
+        self._lanes.append(child)
+        return child
+
+    async def sibling(self, **overrides):
+        """Samostatný kontext se stejnou konfigurací (proxy, stav…) a úpravami, např. bez JS.
+
+        Nerecykluje se – volající ho zavírá sám.
+        """
+        return await self._factory(self.browser, **overrides)
+
+    async def save_state(self):
+        """Uloží stav aktuálního kontextu přes ``on_retire`` (bez výměny)."""
+        if self._on_retire:
+            await self._on_retire(self._ctx)
+        for lane in self._lanes:
+            await lane.save_state()
+
+    async def close(self):
+        _roots.discard(self)
+        if self._watchdog:
+            self._watchdog.cancel()
+        for lane in self._lanes:
+            await lane.close()
+        if self._nojs is not None:
+            await self._nojs.close()
+        await self._ctx.close()
+
+
+class ProxyFailover:
+    """Při výpadku nebo banu proxy přepne ``ManagedContext`` na jinou proxy z poolu (nebo přímo).
+
+    Stránky hlásí poolu výsledek navigací; po banu se přesunou všechny
+    kontexty skupiny (``group``) na té proxy. Vyžaduje per-context proxy
+    (``launch_browser(per_context_proxy=True)``).
+    """
+
+    def __init__(self, context: ManagedContext, context_for, pool, key: str, current, log=print,
+                 probe_interval=PROXY_PROBE_INTERVAL_S, group=None):
+        self.context = context
+        self._context_for = context_for  # (proxy URL | None) -> (factory, on_retire)
+        self.pool = pool
+        self.key = key
+        self.current = current           # proxy aktuálního kontextu, None = přímo
+        self._log = log
+        self.probe_interval = probe_interval
+        self.group = group if group is not None else []
+        self.group.append(self)
+        self.in_flight = 0
+        self._lock = asyncio.Lock()
+        self._probe_task = (asyncio.create_task(self._watch_pool())
+                            if pool.proxies and probe_interval else None)
+        context.on_page = self._attach
+
+    def pick(self, avoid=()):
+        """Proxy pro klíč – přednostně exit, který nepoužívá jiný kontext skupiny."""
+        busy = set(avoid) | {m.current for m in self.group if m is not self}
+        if any(u not in busy and self.pool.usable(u) for u in self.pool.proxies):
+            return self.pool.assign(self.key, exclude=busy)
+        return self.pool.assign(self.key, exclude=avoid)
+
+    async def _switch(self, proxy, reason):
+        await self.context.switch(*self._context_for(proxy), reason=f"{proxy or 'bez proxy'}, {reason}")
+        self.current = proxy
+
+    # === hlášení navigací do poolu ===
+
+    def _attach(self, page):
+        proxy = self.current  # proxy kontextu, ve kterém stránka vznikla
+        if proxy is None:
+            return
+        page.on("response", lambda resp: self._on_response(proxy, page, resp))
+        page.on("requestfailed", lambda req: self._on_failed(proxy, page, req))
+
+    def _on_response(self, proxy, page, resp):
+        req = resp.request
+        if not req.is_navigation_request() or resp.frame != page.main_frame:
+            return
+        try:
+            verdict = cloudflare_verdict(resp.status, resp.headers, resp.url)
+        except Exception:
+            verdict = None
+        if verdict or resp.status == 429:
+            if self.pool.usable(proxy):  # ban hned, ať další odpovědi téže vlny nebanují znovu
+                self.pool.ban(proxy, f"{'Cloudflare challenge' if verdict else 'HTTP 429'} na {resp.url}")
+                asyncio.create_task(self._move_off(proxy))
+            return
+        latency = (req.timing or {}).get("responseStart")
+        self.pool.report(proxy, True, latency if latency and latency > 0 else None)
+
+    def _on_failed(self, proxy, page, req):
+        if req.is_navigation_request() and req.frame == page.main_frame and is_proxy_error(req.failure):
+            self.pool.report(proxy, False)
+
+    # === přepnutí ===
+
+    async def ban(self, proxy, reason):
+        """Exit dostal ban – pauza v poolu a přesun všech kontextů skupiny, které ho používají."""
+        self.pool.ban(proxy, reason)
+        await self._move_off(proxy)
+
+    async def _move_off(self, proxy, reason="ban proxy"):
+        for member in self.group:
+            async with member._lock:
+                if member.current == proxy:
+                    await member._switch(member.pick((proxy,)), reason)
+
+    async def fail(self, err, proxy):
+        """Proxy ``proxy`` selhala (SOCKS, tunel…) – vyřadí se a přesunou se všechny kontexty skupiny.
+
+        Výpadek proxy není chyba jedné URL: bez přesunu by ostatní workery
+        na stejném exitu dál selhávaly a vyčerpaly své pokusy.
+        """
+        if proxy is None or proxy != self.current:
+            return  # chyba z už opuštěného kontextu
+        if self.pool.usable(proxy):
+            self.pool.mark_down(proxy, f"selhala ({err})")
+        await self._move_off(proxy, "výpadek proxy")
+
+    async def _watch_pool(self):
+        while True:
+            await asyncio.sleep(self.probe_interval)
+            await asyncio.to_thread(self.pool.probe_all)
+            for member in self.group:
+                async with member._lock:
+                    best = member.pick()
+                    if best != member.current:
+                        await member._switch(best, "změna v poolu proxy")
+
+    async def run(self, fn, errors):
+        """Zavolá ``fn()``; při chybě proxy (``errors``) přepne a zkusí to jednou znovu."""
+        proxy = self.current
+        try:
+            return await fn()
+        except errors as e:
+            await self.fail(e, proxy)
+            return await fn()
+
+    def stop(self):
+        if self._probe_task:
+            self._probe_task.cancel()
+
+
+class ProxyLanes:
+    """Workery rozložené po exitech poolu proxy.
+
+    Lane 0 je hlavní kontext (listing), další jsou ``ManagedContext.lane()``
+    s klíčem ``<web>#<lane>`` a vlastním ``ProxyFailover``; produkt dostane
+    nejméně vytížený lane.
+    """
+
+    def __init__(self, context: ManagedContext, context_for, pool, site: str, current, log=print):
+        self.pool = pool
+        self.site = site
+        self._context_for = context_for
+        self._log = log
+        self.group = []
+        self.primary = ProxyFailover(context, context_for, pool, f"{site}#0", current, log=log, group=self.group)
+
+    @staticmethod
+    def first_proxy(pool, site: str):
+        """Proxy hlavního kontextu (lane 0) – volat před jeho vytvořením."""
+        return pool.assign(f"{site}#0")
+
+    @property
+    def current(self):
+        """Proxy hlavního kontextu (listing)."""
+        return self.primary.current
+
+    async def fail(self, err, proxy):
+        await self.primary.fail(err, proxy)
+
+    async def start(self, workers: int):
+        """Otevře další lanes (celkem ``min(workers, počet proxy)``)."""
+        n = min(workers, len(self.pool.proxies))
+        for k in range(len(self.group), n):
+            key = f"{self.site}#{k}"
+            taken = {f.current for f in self.group}
+            free = any(u not in taken and self.pool.usable(u) for u in self.pool.proxies)
+            proxy = self.pool.assign(key, exclude=taken if free else ())
+            ctx = await self.primary.context.lane(*self._context_for(proxy))
+            ProxyFailover(ctx, self._context_for, self.pool, key, proxy, log=self._log,
+                          probe_interval=None, group=self.group)
+        if len(self.group) > 1:
+            self._log(f"[proxy] {len(self.group)} lanes: " + ", ".join(
+                f"{f.key} → {f.current or 'přímo'}" for f in self.group))
+
+    async def run(self, fn, errors=()):
+        """``fn(kontext)`` na nejméně vytíženém lane; při chybě proxy (``errors``) přepne a zopakuje."""
+        lane = min(self.group, key=lambda f: f.in_flight)
+        lane.in_flight += 1
+        try:
+            return await lane.run(lambda: fn(lane.context), errors)
+        finally:
+            lane.in_flight -= 1
+
+    def stop(self):
+        for f in self.group:
+            f.stop()
+
+
+async def supervised(context: ManagedContext, urls, scrape, log=print):
+    """Spustí ``scrape(url) -> (rows, url)`` pro všechny URL a vrací výsledky, jak doběhnou.
+
+    Produkty, které skončily bez řádků, zatímco browser spadl, se po
+    ``recover()`` zkusí znovu – ostatní výsledky (i prázdné) projdou beze změny.
+    """
+    scrape = TRACER.for_product(scrape)
+    pending = list(urls)
+    while pending:
+        tasks = [asyncio.create_task(scrape(u)) for u in pending]
+        requeue = []
+        try:
+            for task in asyncio.as_completed(tasks):
+                rows, url = await task
+                if not rows and context.crashed:
+                    requeue.append(url)
+                    continue
+                yield rows, url
+        finally:
+            for t in tasks:
+                t.cancel()
+        if requeue:
+            log(f"[context] Browser spadl – {len(requeue)} rozpracovaných produktů zpět do fronty")
+            await context.recover()
+        pending = requeue
+
+
+async def supervised_batches(context: ManagedContext, urls, scrape, batch_size=BATCH_SIZE, log=print):
+    """``supervised`` po dávkách; mezi dávkami ``checkpoint`` (obnova po pádu, recyklace kontextů).
+
+    Pro cesty bez stránkování listingu (sitemapa, part numbery) – jinak by
+    watchdog jen nastavil ``recycle_due`` a kontext by se nikdy nevyměnil.
+    """
+    urls = list(urls)
+    for i in range(0, len(urls), batch_size):
+        await context.checkpoint()
+        async for result in supervised(context, urls[i:i + batch_size], scrape, log=log):
+            yield result
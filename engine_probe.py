@@ -0,0 +1,168 @@
+"""Sonda, jaký „engine“ web potřebuje – per web a typ stránky.
+
+Část webů vykresluje data na serveru (detail smicro, listing it-planet),
+Playwright scrapery ale vždy platí plný render s JS. ``probe()`` vezme
+vzorek URL a stejné extrakční schéma (``extract_schema.py``) vyhodnotí
+třikrát: ve statickém HTML z HTTP, v browseru bez JS
+(``java_script_enabled=False``) a v plném renderu. Pole se porovnají
+s renderem a zvolí se nejlevnější engine, který dal ve všech vzorcích
+stejná data:
+
+    http    – stačí requests + BeautifulSoup
+    nojs    – stačí browser bez JS (pořád potřebuje cookies / proxy kontext)
+    render  – plný render (výchozí, pokud sonda neproběhla nebo je stará)
+
+Výsledek se ukládá do ``engine_profile.json`` (``{web: {typ: {...}}}``);
+``EngineChoice`` ho při dalším běhu načte a scraper použije nejlevnější
+engine. Když levný engine za běhu selže (Cloudflare, prázdná data),
+``demote()`` vrátí zbytek běhu na render.
+"""
+
+import asyncio
+import json
+import os
+import re
+import time
+from datetime import datetime
+from pathlib import Path
+
+from extract_schema import extract, extract_static
+
+ENGINES = ("http", "nojs", "render")   # od nejlevnějšího
+PROFILE_FILE = Path(__file__).resolve().parent / "engine_profile.json"
+PROFILE_TTL_DAYS = 7                   # starší výsledek se ignoruje (web se mohl změnit)
+SAMPLE_SIZE = 5
+
+
+def _norm(v):
+    # innerText vs get_text() se liší v bílých znacích – porovnává se bez nich
+    if isinstance(v, (list, tuple)):
+        return [_norm(x) for x in v]
+    if isinstance(v, dict):
+        return {k: _norm(x) for k, x in v.items()}
+    if isinstance(v, str):
+        return re.sub(r'\s+', '', v)
+    return v
+
+
+def _empty(v) -> bool:
+    return v is None or v == "" or v == []
+
+
+def diff_fields(reference: dict, candidate) -> list:
+    """Pole, ve kterých se kandidát liší od renderu (pole prázdná i v renderu se nepočítají)."""
+    if candidate is None:
+        return [k for k, v in reference.items() if not _empty(v)]
+    return [k for k, v in reference.items() if not _empty(v) and _norm(v) != _norm(candidate.get(k))]
+
+
+async def _browser_extract(context, url, schema):
+    page = await context.new_page()
+    try:
+        await page.goto(url, wait_until="domcontentloaded", timeout=60000)
+        try:
+            await page.wait_for_load_state("networkidle", timeout=10000)
+        except Exception:
+            pass  # trvalé long-polly apod. – extrahuje se, co je
+        return await extract(page, schema)
+    finally:
+        await page.close()
+
+
+async def probe(site: str, page_type: str, urls, schema: dict, context, nojs_context, fetch_html, log=print) -> dict:
+    """Porovná engines na vzorku URL a výsledek uloží do profilu.
+
+    ``fetch_html(url)`` (blokující, běží ve vlákně) vrací HTML nebo
+    BeautifulSoup; ``nojs_context`` je kontext s ``java_script_enabled=False``.
+    """
+    mismatch = {"http": {}, "nojs": {}}
+    ok = {"http": 0, "nojs": 0}
+    samples = 0
+    for url in list(urls)[:SAMPLE_SIZE]:
+        try:
+            reference = await _browser_extract(context, url, schema)
+        except Exception as e:
+            log(f"[engine] {site}/{page_type}: render {url} selhal ({e}) – vzorek vynechán")
+            continue
+        if all(_empty(v) for v in reference.values()):
+            log(f"[engine] {site}/{page_type}: render {url} bez dat – vzorek vynechán")
+            continue
+        samples += 1
+        candidates = {}
+        try:
+            candidates["http"] = extract_static(await asyncio.to_thread(fetch_html, url), schema)
+        except Exception as e:
+            log(f"[engine] {site}/{page_type}: HTTP {url} selhal ({e})")
+            candidates["http"] = None
+        try:
+            candidates["nojs"] = await _browser_extract(nojs_context, url, schema)
+        except Exception as e:
+            log(f"[engine] {site}/{page_type}: bez JS {url} selhal ({e})")
+            candidates["nojs"] = None
+        for engine, got in candidates.items():
+            fields = diff_fields(reference, got)
+            for f in fields:
+                mismatch[engine][f] = mismatch[engine].get(f, 0) + 1
+            if not fields:
+                ok[engine] += 1
+
+    engine = next((e for e in ENGINES[:-1] if samples and ok[e] == samples), "render")
+    result = {
+        "engine": engine,
+        "samples": samples,
+        "checked": datetime.now().isoformat(timespec="seconds"),
+        "mismatch": {e: m for e, m in mismatch.items() if m},
+    }
+    save_result(site, page_type, result)
+    detail = ", ".join(f"{e}: liší se {', '.join(m)}" for e, m in result["mismatch"].items())
+    log(f"[engine] {site}/{page_type}: {engine} ({samples} vzorků){' – ' + detail if detail else ''}")
+    return result
+
+
+def load_profile(path=PROFILE_FILE) -> dict:
+    try:
+        return json.loads(Path(path).read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return {}
+
+
+def save_result(site: str, page_type: str, result: dict, path=PROFILE_FILE):
+    path = Path(path)
+    profile = load_profile(path)
+    profile.setdefault(site, {})[page_type] = result
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(profile, ensure_ascii=False, indent=2), encoding='utf-8')
+    os.replace(tmp, path)
+
+
+class EngineChoice:
+    """Engine pro typ stránky v aktuálním běhu (z profilu, výchozí render)."""
+
+    def __init__(self, site: str, page_type: str, log=print):
+        self.site = site
+        self.page_type = page_type
+        self.engine = "render"
+        self._log = log
+
+    def load(self, path=PROFILE_FILE, ttl_days: float = PROFILE_TTL_DAYS) -> str:
+        entry = load_profile(path).get(self.site, {}).get(self.page_type)
+        self.engine = "render"
+        if not entry or entry.get("engine") not in ENGINES:
+            return self.engine
+        try:
+            age_s = time.time() - datetime.fromisoformat(entry["checked"]).timestamp()
+        except (KeyError, ValueError):
+            return self.engine
+        if age_s > ttl_days * 86400:
+            self._log(f"[engine] {self.site}/{self.page_type}: profil je starší než {ttl_days} dní – render")
+            return self.engine
+        self.engine = entry["engine"]
+        if self.engine != "render":
+            self._log(f"[engine] {self.site}/{self.page_type}: podle sondy stačí {self.engine}")
+        return self.engine
+
+    def demote(self, reason):
+        """Levný engine za běhu selhal – zbytek běhu plný render."""
+        if self.engine != "render":
+            self._log(f"[engine] {self.site}/{self.page_type}: {self.engine} selhal ({reason}) – přepínám na render")
+            self.engine = "render"
@@ -0,0 +1,156 @@
+"""Deklarativní extrakční schémata – jeden ``page.evaluate`` místo stovek awaitů.
+
+Schéma je dict ``{pole: spec}``; spec je JSON-serializovatelný dict:
+
+    {"sel": "h1"}                          text (innerText) prvního prvku, None pokud chybí
+    {"sel": "meta[itemprop=price]",
+     "attr": "content"}                    atribut; "attr" může být seznam (první neprázdný)
+    {"sel": "...", "all": True}            seznam textů/atributů všech prvků (prázdné vynechány)
+    {"sel": "...", "visible": True}        jen viditelné prvky (ve statickém HTML se ignoruje)
+    {"sel": "input:checked",
+     "label": True}                        místo prvku samotného jeho <label for=id>
+    {"count": "selektor"}                  počet prvků
+    {"rows": "table tr", "key": "th",
+     "value": "td", "prefer": "u"}         tabulka → [[klíč, hodnota, text_prefer|None], ...]
+                                           (řádky bez klíče nebo hodnoty se vynechají)
+    {"each": "selektor", "fields": {...}}  seznam záznamů; pole se hledají uvnitř prvku,
+                                           spec bez "sel" míří na prvek samotný
+    {"first": [spec, spec, ...]}           první neprázdný výsledek z fallbacků
+
+Stejné schéma umí ``extract_static`` vyhodnotit nad statickým HTML
+(BeautifulSoup) pro cesty bez browseru. Rozdíl: ``innerText`` vs
+``get_text()`` se liší v bílých znacích, volající proto hodnoty stejně
+čistí (clean_text / strip).
+"""
+
+EXTRACT_JS = """
+(schema) => {
+    const txt = el => ((el.innerText !== undefined ? el.innerText : el.textContent) || '').trim();
+    const visible = el => !!(el.offsetWidth || el.offsetHeight || el.getClientRects().length);
+    const empty = v => v === null || v === undefined || v === '' || (Array.isArray(v) && !v.length);
+    const val = (el, spec) => {
+        if (spec.label) {
+            el = (el.labels && el.labels[0]) || (el.id ? document.querySelector(`label[for="${CSS.escape(el.id)}"]`) : null);
+            if (!el) return null;
+        }
+        if (spec.attr) {
+            for (const a of [].concat(spec.attr)) {
+                const v = el.getAttribute(a);
+                if (v) return v;
+            }
+            return null;
+        }
+        return txt(el);
+    };
+    const run = (root, spec) => {
+        if (spec.first) {
+            for (const s of spec.first) {
+                const v = run(root, s);
+                if (!empty(v)) return v;
+            }
+            return spec.all ? [] : null;
+        }
+        if (spec.count) return root.querySelectorAll(spec.count).length;
+        if (spec.rows) {
+            const out = [];
+            for (const r of root.querySelectorAll(spec.rows)) {
+                const k = r.querySelector(spec.key), v = r.querySelector(spec.value);
+                if (!k || !v) continue;
+                const p = spec.prefer ? v.querySelector(spec.prefer) : null;
+                out.push([txt(k), txt(v), p ? txt(p) : null]);
+            }
+            return out;
+        }
+        if (spec.each) return [...root.querySelectorAll(spec.each)].map(el => extract(el, spec.fields));
+        let els = spec.sel ? [...root.querySelectorAll(spec.sel)] : [root];
+        if (spec.visible) els = els.filter(visible);
+        if (spec.all) return els.map(e => val(e, spec)).filter(v => !empty(v));
+        return els.length ? val(els[0], spec) : null;
+    };
+    const extract = (root, fields) => {
+        const out = {};
+        for (const [k, s] of Object.entries(fields)) {
+            try { out[k] = run(root, s); } catch (e) { out[k] = null; }
+        }
+        return out;
+    };
+    return extract(document, schema);
+}
+"""
+
+
+async def extract(page, schema: dict) -> dict:
+    """Vyhodnotí schéma v prohlížeči jediným round-tripem."""
+    return await page.evaluate(EXTRACT_JS, schema)
+
+
+# === STATICKÉ HTML (BeautifulSoup) ===
+
+def _txt(el) -> str:
+    return el.get_text().strip()
+
+
+def _empty(v) -> bool:
+    return v is None or v == "" or (isinstance(v, list) and not v)
+
+
+def _val(soup, el, spec):
+    if spec.get("label"):
+        el_id = el.get("id")
+        el = soup.select_one(f'label[for="{el_id}"]') if el_id else None
+        if el is None:
+            return None
+    if spec.get("attr"):
+        attrs = spec["attr"] if isinstance(spec["attr"], list) else [spec["attr"]]
+        for a in attrs:
+            v = el.get(a)
+            if isinstance(v, list):
+                v = " ".join(v)
+            if v:
+                return v
+        return None
+    return _txt(el)
+
+
+def _run(soup, root, spec):
+    if "first" in spec:
+        for s in spec["first"]:
+            v = _run(soup, root, s)
+            if not _empty(v):
+                return v
+        return [] if spec.get("all") else None
+    if "count" in spec:
+        return len(root.select(spec["count"]))
+    if "rows" in spec:
+        out = []
+        for r in root.select(spec["rows"]):
+            k, v = r.select_one(spec["key"]), r.select_one(spec["value"])
+            if k is None or v is None:
+                continue
+            p = v.select_one(spec["prefer"]) if spec.get("prefer") else None
+            out.append([_txt(k), _txt(v), _txt(p) if p is not None else None])
+        return out
+    if "each" in spec:
+        return [_extract(soup, el, spec["fields"]) for el in root.select(spec["each"])]
+    els = root.select(spec["sel"]) if spec.get("sel") else [root]
+    if spec.get("all"):
+        return [v for v in (_val(soup, e, spec) for e in els) if not _empty(v)]
+    return _val(soup, els[0], spec) if els else None
+
+
+def _extract(soup, root, fields: dict) -> dict:
+    out = {}
+    for k, s in fields.items():
+        try:
+            out[k] = _run(soup, root, s)
+        except Exception:
+            out[k] = None
+    return out
+
+
+def extract_static(html, schema: dict) -> dict:
+    """Vyhodnotí schéma nad statickým HTML (str nebo BeautifulSoup)."""
+    if isinstance(html, str):
+        from bs4 import BeautifulSoup
+        html = BeautifulSoup(html, "html.parser")
+    return _extract(html, html, schema)
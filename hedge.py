@@ -0,0 +1,113 @@
+"""Hedged navigace – druhý pokus, když načtení trvá déle než p95 webu.
+
+Pár zaseknutých ``page.goto`` (timeout 60–90 s) drží sloty semaforu
+a o tolik prodlužuje dokončení celé strany listingu (``as_completed``
+čeká na nejpomalejší produkt). ``NavHedger.goto`` měří dobu navigací
+a když aktuální trvá déle než pozorovaný p95, otevře novou stránku a
+načte URL znovu. Vyhrává první úspěšná navigace, druhá se zruší a její
+stránka zavře.
+
+Hedging je opt-in (``--hedge``); bez něj se jen sbírají časy. Objem
+hedgů je omezen globálně: nejvýš ``HEDGE_RATIO`` navigací a nejvýš
+``MAX_INFLIGHT_HEDGES`` současně.
+"""
+
+import asyncio
+import time
+from collections import deque
+
+import scrape_events as events
+
+MIN_SAMPLES = 20          # p95 z menšího vzorku nemá smysl
+HEDGE_RATIO = 0.1         # max. podíl navigací, které dostanou hedge
+MAX_INFLIGHT_HEDGES = 2
+MIN_HEDGE_DELAY_S = 2.0   # pod tuto hranici nehedgovat ani při rychlém webu
+
+
+async def _close(page):
+    try:
+        await page.close()
+    except Exception:
+        pass
+
+
+class NavHedger:
+    def __init__(self, site: str, enabled: bool = False, log=print):
+        self.site = site
+        self.enabled = enabled
+        self._log = log
+        self.samples = deque(maxlen=200)
+        self.navigations = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self._inflight = 0
+
+    def p95(self):
+        if len(self.samples) < MIN_SAMPLES:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[int(0.95 * (len(ordered) - 1))]
+
+    def _may_hedge(self) -> bool:
+        return (self.enabled and self._inflight < MAX_INFLIGHT_HEDGES
+                and self.hedged < max(1, HEDGE_RATIO * self.navigations))
+
+    async def goto(self, context, page, url, **kwargs):
+        """Jako ``page.goto``, vrací ``(stránka, response)`` – stránka může být nová (hedge vyhrál).
+
+        Volající dál pracuje s vrácenou stránkou a zavírá ji; poražená
+        stránka se zavře tady.
+        """
+        self.navigations += 1
+        t0 = time.monotonic()
+        delay = self.p95()
+        if delay is None or not self.enabled:
+            response = await page.goto(url, **kwargs)
+            self.samples.append(time.monotonic() - t0)
+            return page, response
+
+        primary = asyncio.create_task(page.goto(url, **kwargs))
+        done, _ = await asyncio.wait({primary}, timeout=max(delay, MIN_HEDGE_DELAY_S))
+        if done or not self._may_hedge():
+            response = await primary
+            self.samples.append(time.monotonic() - t0)
+            return page, response
+
+        # Primární navigace je v chvostu – paralelní pokus na nové stránce
+        self.hedged += 1
+        self._inflight += 1
+        events.emit("hedge", site=self.site, url=url, after_ms=round((time.monotonic() - t0) * 1000))
+        hedge_page = await context.new_page()
+        hedge = asyncio.create_task(hedge_page.goto(url, **kwargs))
+        pending = {primary, hedge}
+        winner_page = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        continue
+                    self.samples.append(time.monotonic() - t0)
+                    if task is hedge:
+                        self.hedge_wins += 1
+                        winner_page = hedge_page
+                        await _close(page)
+                    else:
+                        winner_page = page
+                    return winner_page, task.result()
+            # Oba pokusy selhaly – chybu primárního pokusu předat dál
+            raise primary.exception()
+        finally:
+            self._inflight -= 1
+            for task in (primary, hedge):
+                if not task.done():
+                    task.cancel()
+            if winner_page is not hedge_page:
+                await _close(hedge_page)
+
+    def report(self, log=None):
+        log = log or self._log
+        p95 = self.p95()
+        log(f"[hedge] {self.site}: {self.navigations} navigací, p95 "
+            f"{f'{p95:.1f} s' if p95 is not None else 'n/a'}, hedge {self.hedged}× "
+            f"(vyhrál {self.hedge_wins}×){'' if self.enabled else ' – vypnuto'}")
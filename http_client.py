@@ -0,0 +1,83 @@
+"""Sdílený HTTP klient (requests + BeautifulSoup) pro cesty bez browseru.
+
+Používá se pro rychlý test scraperů a všude, kde stránka nepotřebuje JS.
+Session drží pool spojení (keep-alive), takže opakované dotazy na stejný
+web neplatí znovu TCP/TLS handshake přes proxy.
+"""
+
+import requests
+from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+
+from proxy_pool import default_pool, requests_proxies
+
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.9",
+}
+
+# Signály Cloudflare challenge v těle odpovědi (shodné s check_cloudflare ve scraperech)
+CF_BODY_SIGNALS = ("cf-browser-verification", "challenge-platform", "cf_chl_opt")
+CF_BODY_SIGNALS_LOWER = ("checking your browser", "enable javascript and cookies")
+
+
+def make_session(use_proxy: bool = True, pool_size: int = 16, key: str = "session") -> requests.Session:
+    """Session s poolem spojení; proxy z poolu (lepivě podle ``key``), jen pokud je nějaká dostupná."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update(DEFAULT_HEADERS)
+    if use_proxy:
+        proxies = requests_proxies(default_pool().assign(key))
+        if proxies:
+            session.proxies = proxies
+    return session
+
+
+def is_cloudflare_challenge(status: int, headers, text: str = "") -> bool:
+    """True pokud odpověď vypadá jako Cloudflare challenge."""
+    if headers.get("cf-mitigated", "").lower() == "challenge":
+        return True
+    cf_server = "cloudflare" in headers.get("server", "").lower()
+    if status in (403, 503) and cf_server:
+        return True
+    snippet = text[:8000]
+    lower = snippet.lower()
+    if "<title>just a moment" in lower:
+        return True
+    return any(s in snippet for s in CF_BODY_SIGNALS) or any(s in lower for s in CF_BODY_SIGNALS_LOWER)
+
+
+CF_CHALLENGE_PATHS = ("/cdn-cgi/challenge-platform", "__cf_chl_", "/cdn-cgi/l/chk_")
+
+
+def cloudflare_verdict(status, headers, url: str = ""):
+    """Rozhodnutí jen z hlavičky odpovědi (bez čtení těla).
+
+    True = challenge, False = běžná stránka (2xx bez cf-mitigated),
+    None = nejednoznačné – volající má zkontrolovat obsah stránky.
+    """
+    if headers.get("cf-mitigated", "").lower() == "challenge":
+        return True
+    if any(p in url for p in CF_CHALLENGE_PATHS):
+        return True
+    if status in (403, 503) and "cloudflare" in headers.get("server", "").lower():
+        return True
+    if 200 <= status < 300:
+        return False
+    return None
+
+
+class CloudflareBlocked(RuntimeError):
+    """HTTP dotaz narazil na Cloudflare challenge – je třeba browser."""
+
+
+def get_soup(session: requests.Session, url: str, timeout: int = 15) -> BeautifulSoup:
+    """GET → BeautifulSoup; při Cloudflare challenge vyhodí CloudflareBlocked."""
+    r = session.get(url, timeout=timeout, allow_redirects=True)
+    if is_cloudflare_challenge(r.status_code, r.headers, r.text):
+        raise CloudflareBlocked(f"Cloudflare challenge ({r.status_code}) na {r.url}")
+    r.raise_for_status()
+    return BeautifulSoup(r.text, "html.parser")
@@ -29,7 +29,11 @@ import shutil
 from selenium.webdriver.chrome.service import Service as ChromeService
 from requests.exceptions import HTTPError, Timeout, ConnectionError as ReqConnError
 
-WARP_PROXY = {"http": "socks5h://127.0.0.1:40000", "https": "socks5h://127.0.0.1:40000"}
+from http_client import cloudflare_verdict
+from listing_pages import discover_page_size_sync, with_page_size
+from proxy_pool import default_pool, requests_proxies, is_requests_proxy_error
+
+PAGE_SIZE_PARAM = "limit"  # Shopware 6: počet produktů na stránku listingu
 
 
 def dbg(msg):
@@ -298,10 +302,11 @@ SCRIPT_DIR = Path(__file__).resolve().parent
 PROGRESS_FILE = SCRIPT_DIR / "it-marketScrapeLastProduct.json"
 
 
-def _save_progress(section: str, page: int, product_idx_on_page: int, url: str):
+def _save_progress(section: str, page: int, product_idx_on_page: int, url: str, page_size: int | None = None):
     data = {
         "section": section,
         "page": page,
+        "page_size": page_size,
         "product_idx_on_page": product_idx_on_page,
         "url": url,
         "ts": datetime.utcnow().isoformat() + "Z",
@@ -465,13 +470,28 @@ def _soup_get(url: str, timeout: int = 20, max_retries: int = 5, backoff_base: f
     attempt = 0
     while True:
         attempt += 1
+        # Každé vlákno má svou proxy z poolu (lepivě); ban nebo výpadek ji přesune jinam
+        pool = default_pool()
+        proxy = pool.assign(threading.current_thread().name)
+        t0 = time.monotonic()
         try:
-            r = requests.get(url, headers=HEADERS, timeout=timeout, allow_redirects=True, proxies=WARP_PROXY)
+            r = requests.get(url, headers=HEADERS, timeout=timeout, allow_redirects=True,
+                             proxies=requests_proxies(proxy))
+            latency_ms = (time.monotonic() - t0) * 1000
+            # Údržba webu není ban – proxy odpověď doručila (503 za Cloudflare má i jeho hlavičku)
             if r.url.endswith("/maintenance") or r.status_code == 503:
+                pool.report(proxy, True, latency_ms)
                 raise MaintenanceError(f"Maintenance mode ({r.status_code}) at {r.url}")
+            if r.status_code == 429 or cloudflare_verdict(r.status_code, r.headers, r.url):
+                pool.ban(proxy, f"HTTP {r.status_code}")
+            else:
+                pool.report(proxy, True, latency_ms)
             r.raise_for_status()
             return BeautifulSoup(r.text, "html.parser")
         except (Timeout, ReqConnError) as e:
+            # Do zdraví proxy se počítá jen selhání spojení s ní, ne pomalý web
+            if is_requests_proxy_error(e):
+                pool.report(proxy, False)
             if attempt > max_retries:
                 raise
         except HTTPError as e:
@@ -515,14 +535,28 @@ def _after_pipe_product_sections(homepage_url: str = HOMEPAGE):
     return sections
 
 
-def _iter_listing_pages(section_url: str, start_page: int = 1, max_pages: int | None = None):
+def _listing_page_url(section_url: str, page: int, page_size: int | None = None) -> str:
+    parsed = urlparse(section_url)
+    q = dict(parse_qsl(parsed.query))
+    q["p"] = str(page)
+    new_q = urlencode(q, doseq=True)
+    return with_page_size(urlunparse(parsed._replace(query=new_q)), PAGE_SIZE_PARAM, page_size)
+
+
+def _count_listing(section_url: str, page_size: int | None) -> int:
+    """Počet produktů na 1. straně listingu při dané velikosti stránky (pro discover_page_size_sync)."""
+    try:
+        return len(_extract_product_links(_soup_get(_listing_page_url(section_url, 1, page_size))))
+    except Exception as e:
+        dbg(f"[listing] Zjištění velikosti stránky selhalo: {e}")
+        return 0
+
+
+def _iter_listing_pages(section_url: str, start_page: int = 1, max_pages: int | None = None,
+                        page_size: int | None = None):
     page = max(1, start_page)
     while True:
-        parsed = urlparse(section_url)
-        q = dict(parse_qsl(parsed.query))
-        q["p"] = str(page)
-        new_q = urlencode(q, doseq=True)
-        page_url = urlunparse(parsed._replace(query=new_q))
+        page_url = _listing_page_url(section_url, page, page_size)
 
         try:
             soup = _soup_get(page_url)
@@ -666,6 +700,15 @@ def run_it_market_scraper():
         else:
             _clear_progress()
 
+    # Velikost stránky listingu: auto-resume použije uloženou, ruční start od bodu
+    # výchozí (čísla stránek zadává uživatel podle webu), jinak největší přijatou
+    if resume and "page_size" in resume:
+        page_size = resume["page_size"]
+    elif resume:
+        page_size = None
+    else:
+        page_size = discover_page_size_sync(lambda size: _count_listing(sections[picked[0]], size), log=dbg)
+
     seen_urls = set()
     output_path = _resolve_output_path(output_file)
 
@@ -681,7 +724,8 @@ def run_it_market_scraper():
                 start_page = max(1, int(resume.get("page", 1)))
                 start_product_idx = max(1, int(resume.get("product_idx_on_page", 1)))
 
-            page_iter = _iter_listing_pages(sec_url, start_page=start_page, max_pages=max_pages_per_section)
+            page_iter = _iter_listing_pages(sec_url, start_page=start_page, max_pages=max_pages_per_section,
+                                            page_size=page_size)
             future_to_url = {}
 
             for page_num, soup in page_iter:
@@ -703,7 +747,7 @@ def run_it_market_scraper():
                     seen_urls.add(url)
 
                     print(f"  → stránka: {page_num}")
-                    print(f"  → produkt: {idx_on_page}/24")
+                    print(f"  → produkt: {idx_on_page}/{len(product_links)}")
                     print(f"  → url: {url}")
 
                     future = executor.submit(
@@ -722,7 +766,7 @@ def run_it_market_scraper():
                         save_data_batch(rows, output_path, file_format)
 
                         with progress_lock:
-                            _save_progress(sec_name, page_num, idx_on_page, url)
+                            _save_progress(sec_name, page_num, idx_on_page, url, page_size)
 
                         total_products += 1
                         print(f"  ✓ Hotovo: {url}")
@@ -8,10 +8,29 @@ import sys
 import time
 from datetime import datetime, timezone
 from pathlib import Path
-from urllib.parse import urlparse, urlunparse, urlencode, parse_qsl
+from urllib.parse import urlparse, urlunparse, urlencode, parse_qsl, quote_plus
 
 from playwright.async_api import async_playwright, Page
 
+import scrape_events as events
+from shared_browser import launch_browser, context_kwargs
+from http_client import make_session, get_soup, cloudflare_verdict, CloudflareBlocked
+from resource_policy import ResourcePolicy
+from browser_state import BrowserState, challenged
+from context_pool import ManagedContext, ProxyLanes, supervised, supervised_batches
+from proxy_pool import ProxyPool, playwright_proxy, is_proxy_error
+from extract_schema import extract, extract_static
+from listing_pages import discover_page_size
+from hedge import NavHedger
+from pw_tracer import TRACER
+import sampling_profiler
+from worker_budget import worker_slots
+from retry_queue import RetryQueue
+from part_lookup import parts_arg, load_parts, browser_search, run_part_lookup, NegativeCache
+from sitemap_discovery import SitemapState, discover
+from shopware_api import (StoreApi, StoreApiError, read_storefront_config, translated, html_to_text,
+                          media_urls, price_parts)
+
 # UTF-8 výstup – oprava pro Windows terminál (cp1252 neumí česky)
 if hasattr(sys.stdout, 'buffer') and sys.stdout.encoding.lower().replace('-', '') not in ('utf8', 'utf8sig'):
     sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
@@ -43,11 +62,26 @@ HOMEPAGE = "https://it-market.com/en"
 SCRIPT_DIR = Path(__file__).resolve().parent
 PROGRESS_FILE = SCRIPT_DIR / "it-marketScrapeLastProduct.json"
 HTML_DUMP_DIR = SCRIPT_DIR / "html_dumps"
+SITEMAP_STATE_FILE = SCRIPT_DIR / "it-market_sitemap_state.json"
+
+# Selektory produktových odkazů na listingu (Shopware 6), v pořadí priority
+LISTING_LINK_SELECTORS = [
+    '.cms-listing-col a.product-name',
+    '.cms-listing-col a.btn-detail',
+    '.product-box a.product-name',
+    'a.product-name',
+    '.product-name-wrapper a',
+    'article.product-box a[href*="/en/"]',
+    '.card-body a[href*="/en/"]',
+]
+PAGE_SIZE_PARAM = "limit"  # Shopware 6: počet produktů na stránku listingu
+SEARCH_URL = f"{HOMEPAGE}/search?search={{}}"
+EXCLUDE_SECTION_PATHS = {'manufacturer-list', 'service', 'it-remarketing', 'blog', 'search', 'account', 'checkout', 'cart', 'wishlist'}
 
 
 # === VÝJIMKY ===
 class ProxyConnectionError(Exception):
-    """Proxy se odpojila – je třeba restartovat browser bez proxy."""
+    """Proxy se odpojila – práce se přesune do přímého kontextu (ProxyFailover)."""
     pass
 
 
@@ -71,8 +105,22 @@ async def dump_page_html(page, label: str):
         dbg(f"Nepodařilo se uložit HTML dump: {e}")
 
 
-async def check_cloudflare(page) -> bool:
-    """Vrátí True pokud je stránka blokována Cloudflare challenge."""
+async def check_cloudflare(page, response=None) -> bool:
+    """Vrátí True pokud je stránka blokována Cloudflare challenge.
+
+    Pokud je k dispozici odpověď z ``page.goto``, rozhoduje se podle statusu,
+    hlaviček a URL; obsah stránky se čte jen když jsou tyto signály nejednoznačné.
+    """
+    if response is not None:
+        try:
+            verdict = cloudflare_verdict(response.status, response.headers, response.url)
+        except Exception:
+            verdict = None
+        if verdict is not None:
+            if verdict:
+                dbg(f"CLOUDFLARE DETEKOVÁN: status={response.status}, url={response.url}")
+                challenged(page.context, dbg)
+            return verdict
     try:
         title = await page.title()
         html_snippet = await page.evaluate("() => document.body ? document.body.innerHTML.slice(0, 4000) : ''")
@@ -86,6 +134,7 @@ async def check_cloudflare(page) -> bool:
         ]
         if any(signals):
             dbg(f"CLOUDFLARE DETEKOVÁN: title={title!r}, url={page.url}")
+            challenged(page.context, dbg)
             return True
     except Exception:
         pass
@@ -93,9 +142,11 @@ async def check_cloudflare(page) -> bool:
 
 
 # === SPRÁVA PROGRESSU ===
-def save_progress(section, page, done_urls=None):
+def save_progress(section, page, done_urls=None, page_size=None, mode=None):
     try:
-        data = {"section": section, "page": page}
+        data = {"section": section, "page": page, "page_size": page_size}
+        if mode:
+            data["mode"] = mode  # "api" = strana Store API, jinak strana listingu
         if done_urls is not None:
             data["done_urls"] = list(done_urls)
         with open(PROGRESS_FILE, 'w', encoding='utf-8') as f:
@@ -136,51 +187,61 @@ def parse_price_block(text):
     return price, net_price
 
 
-async def get_description_and_properties(page: Page):
-    """Získá popis a vlastnosti podle poskytnutého HTML."""
-    full_text = []
-
-    try:
-        desc_pane = page.locator('#description-tab-pane').first
-
-        if await desc_pane.count() > 0:
-            is_visible = await desc_pane.is_visible()
-            if not is_visible:
-                btn = page.locator('button[aria-controls="description-tab-pane"]').first
-                if await btn.count() > 0:
-                    await btn.click(force=True)
-                    await page.wait_for_timeout(500)
-
-        desc_text_el = page.locator('.product-detail-description-text').first
-        if await desc_text_el.count() > 0:
-            text = await desc_text_el.inner_text()
-            if text:
-                full_text.append(text.strip())
+# Deklarativní schéma společných dat detailu – úprava webu = úprava schématu
+BASE_SCHEMA = {
+    "name": {"sel": ".product-detail-name"},
+    "crumbs": {"each": ".breadcrumb-item a.breadcrumb-link", "fields": {
+        "title": {"attr": "title"},
+        "text": {"sel": ".breadcrumb-title"},
+    }},
+    "desc": {"sel": ".product-detail-description-text"},
+    "props": {"rows": "#description-tab-pane .product-detail-properties-table .properties-row",
+              "key": ".properties-label", "value": ".properties-value"},
+}
 
-        rows = await desc_pane.locator('.product-detail-properties-table .properties-row').all()
 
-        properties_list = []
-        for row in rows:
-            label_el = row.locator('.properties-label')
-            val_el = row.locator('.properties-value')
+PRODUCT_PAGE_MARKER = ".product-detail-name"  # jen detail produktu (Shopware buy-box)
 
-            if await label_el.count() > 0 and await val_el.count() > 0:
-                label = await label_el.inner_text()
-                val = await val_el.inner_text()
 
-                label = label.strip().rstrip(':')
-                val = val.strip()
+async def open_description_tab(page: Page):
+    """Zobrazí záložku s popisem, pokud je skrytá."""
+    try:
+        desc_pane = page.locator('#description-tab-pane').first
+        if await desc_pane.count() > 0 and not await desc_pane.is_visible():
+            btn = page.locator('button[aria-controls="description-tab-pane"]').first
+            if await btn.count() > 0:
+                await btn.click(force=True)
+                await page.wait_for_timeout(500)
+    except Exception as e:
+        dbg(f"Chyba při otevírání popisu: {e}")
 
-                if label and val:
-                    properties_list.append(f"{label}: {val}")
 
-        if properties_list:
-            full_text.append(" | ".join(properties_list))
+def map_base_fields(raw):
+    """Výstup BASE_SCHEMA → šablona společných dat pro všechny varianty."""
+    base_name = raw['name'].strip() if raw.get('name') is not None else 'N/A'
 
-    except Exception as e:
-        dbg(f"Chyba při čtení popisu: {e}")
+    cats = [(c.get('text') or '').strip() for c in raw.get('crumbs') or []
+            if c.get('title') and 'home' not in c['title'].lower()]
 
-    return " ; ".join(full_text)
+    full_text = []
+    if raw.get('desc'):
+        full_text.append(raw['desc'].strip())
+
+    properties_list = []
+    for label, val, _ in raw.get('props') or []:
+        label = label.strip().rstrip(':')
+        val = val.strip()
+        if label and val:
+            properties_list.append(f"{label}: {val}")
+    if properties_list:
+        full_text.append(" | ".join(properties_list))
+
+    return {
+        'base_name': base_name,
+        'category_path': ' > '.join(cats),
+        'description_and_properties': " ; ".join(full_text),
+        'product_name': base_name
+    }
 
 
 async def extract_variant_data(page: Page, base_data: dict):
@@ -291,17 +352,19 @@ async def extract_variant_data(page: Page, base_data: dict):
 
 # === HLAVNÍ SCRAPOVACÍ LOGIKA ===
 
-async def scrape_product(context, url, semaphore):
-    """Zpracuje jeden produkt."""
+# Hedging pomalých navigací detailu (--hedge), časy se měří vždy
+NAV_HEDGE = NavHedger("it-market", log=dbg)
+
+async def scrape_product(context, url, semaphore, retries=None, fetched=None):
+    """Zpracuje jeden produkt; úspěšně načtené URL (i bez řádků) přidá do ``fetched``."""
     async with semaphore:
         page = await context.new_page()
         all_rows = []
+        t0 = time.monotonic()
 
         try:
-            await page.route("**/*.{png,jpg,jpeg,svg,css,woff,woff2}", lambda route: route.abort())
-
             dbg(f"Otevírám: {url}")
-            await page.goto(url, timeout=90000, wait_until="domcontentloaded")
+            page, response = await NAV_HEDGE.goto(context, page, url, timeout=90000, wait_until="domcontentloaded")
             await page.wait_for_timeout(1500)
 
             try:
@@ -312,33 +375,23 @@ async def scrape_product(context, url, semaphore):
             except Exception:
                 pass
 
-            if await check_cloudflare(page):
+            if await check_cloudflare(page, response):
                 await dump_page_html(page, f"cloudflare_{url.split('/')[-1]}")
                 raise RuntimeError("Cloudflare challenge – stránka zablokována")
 
             if "maintenance" in page.url or await page.locator("text=Maintenance mode").count() > 0:
                 raise RuntimeError("Maintenance Mode")
 
-            base_name_el = page.locator('.product-detail-name')
-            base_name = (await base_name_el.inner_text()).strip() if await base_name_el.count() > 0 else 'N/A'
+            # Sitemapa i strategie 2 listingu berou URL jen podle cesty – kategorie ani CMS stránka řádek nedá
+            if await page.locator(PRODUCT_PAGE_MARKER).count() == 0:
+                dbg(f"Není detail produktu, přeskakuji: {url}")
+                if fetched is not None:
+                    fetched.add(url)
+                return [], url
 
-            cats = []
-            crumbs = await page.locator('.breadcrumb-item a.breadcrumb-link').all()
-            for c in crumbs:
-                title = await c.get_attribute('title')
-                if title and 'home' not in title.lower():
-                    text = await c.locator('.breadcrumb-title').inner_text()
-                    cats.append(text.strip())
-            cat_path = ' > '.join(cats)
-
-            desc_props = await get_description_and_properties(page)
-
-            base_data_template = {
-                'base_name': base_name,
-                'category_path': cat_path,
-                'description_and_properties': desc_props,
-                'product_name': base_name
-            }
+            await open_description_tab(page)
+            base_data_template = map_base_fields(await extract(page, BASE_SCHEMA))
+            base_name = base_data_template['base_name']
 
             radios = page.locator('.product-detail-configurator-option input[type="radio"]')
             count = await radios.count()
@@ -394,15 +447,21 @@ async def scrape_product(context, url, semaphore):
                     d.get('category_path', '')
                 ])
 
+            events.timing("product", t0)
+            if fetched is not None:
+                fetched.add(url)
             return final_rows, url
 
         except ProxyConnectionError:
             raise
         except Exception as e:
             err_str = str(e)
-            if "ERR_PROXY_CONNECTION_FAILED" in err_str or "ERR_PROXY" in err_str:
+            if is_proxy_error(e):
                 raise ProxyConnectionError(f"Proxy selhala při scraping produktu {url}: {e}") from e
-            dbg(f"CHYBA při zpracování {url}: {e}")
+            # Opakování se naplánuje do fronty (bez čekání ve slotu); po vyčerpání pokusů je to chyba
+            if retries is None or not retries.defer(url, f"chyba: {e}"):
+                dbg(f"CHYBA při zpracování {url}: {e}")
+                events.error(url, e)
             try:
                 if not page.is_closed():
                     is_cf = await check_cloudflare(page)
@@ -418,113 +477,422 @@ async def scrape_product(context, url, semaphore):
                 pass
 
 
-async def get_listing_urls(page: Page, section_url, page_num):
+# Karty produktů na listingu – pro režim --listing-only (bez otevírání detailů)
+CARD_SCHEMA = {
+    "cards": {"each": ".product-box", "fields": {
+        "href": {"first": [{"sel": "a.product-name", "attr": "href"},
+                           {"sel": "a.btn-detail", "attr": "href"}]},
+        "name": {"first": [{"sel": ".product-name", "attr": "title"}, {"sel": ".product-name"}]},
+        "price": {"first": [{"sel": ".product-price-info .product-price"}, {"sel": ".product-price"}]},
+        "stock": {"first": [{"sel": ".product-availability"}, {"sel": ".delivery-information"}]},
+        "number": {"sel": ".product-number"},
+    }},
+}
+
+
+async def listing_card_rows(page: Page, sec_name):
+    """Řádky CSV z karet aktuálně načteného listingu (jeden evaluate).
+
+    Vrací seznam ``(url, row)``; pole, která karta neukazuje, jsou N/A.
+    """
+    raw = await extract(page, CARD_SCHEMA)
+    out = []
+    for c in raw.get('cards') or []:
+        href = c.get('href')
+        if not href:
+            continue
+        if '/de/' in href:
+            href = href.replace('/de/', '/en/')
+        price, net_price = parse_price_block(c.get('price'))
+        out.append((href, [
+            (c.get('name') or '').strip() or 'N/A',
+            'N/A',
+            price,
+            net_price,
+            (c.get('stock') or '').strip() or 'N/A',
+            'N/A',
+            'N/A',
+            (c.get('number') or '').strip() or 'N/A',
+            'N/A',
+            'N/A',
+            sec_name
+        ]))
+    return out
+
+
+# Listing je "připravený", jakmile je v DOM mřížka produktů, hláška (prázdno/chyba)
+# nebo Cloudflare challenge – nečekáme na networkidle trackerů ani fixní sleep
+LISTING_READY_SELECTOR = ", ".join([
+    ".cms-listing-row .product-box",
+    ".product-box",
+    "div.alert",
+    "#challenge-form",
+    "#cf-challenge-running",
+    'iframe[src*="challenges.cloudflare.com"]',
+])
+
+# Sběr kandidátních odkazů všech strategií jedním evaluate
+LISTING_HARVEST_JS = """
+({selectors, basePath}) => {
+    const hrefs = sel => [...document.querySelectorAll(sel)].map(a => a.getAttribute('href')).filter(Boolean);
+    const alert = document.querySelector('div.alert.alert-danger .alert-content');
+    const bySelector = [];
+    for (const sel of selectors) {
+        const found = hrefs(sel);
+        bySelector.push(found);
+        if (found.length) break;
+    }
+    return {
+        title: document.title,
+        alert: alert ? alert.innerText : null,
+        totalEn: document.querySelectorAll('a[href*="/en/"]').length,
+        bySelector,
+        byPath: bySelector.some(x => x.length) ? [] : hrefs(`a[href*="${basePath}/"]`),
+    };
+}
+"""
+
+
+def is_product_path(href, base_path=None):
+    """Kandidát na detail = min. 3 segmenty za /en/ (kategorie/subkat/vyrobce nebo /kategorie/vyrobce/model).
+
+    Jen hrubý filtr – stejný tvar má i hluboká kategorie; detail se ověří
+    na stránce (``PRODUCT_PAGE_MARKER`` ve ``scrape_product``).
+    """
+    # Ořízni query string pro počítání segmentů
+    path_only = href.split('?')[0].split('#')[0]
+    if base_path and f"{base_path}/" not in path_only:
+        return False
+    # Segmenty za /en/
+    en_suffix = path_only.split('/en/')[-1] if '/en/' in path_only else ''
+    parts = [p for p in en_suffix.split('/') if p]
+    return len(parts) >= 3
+
+
+async def scrape_from_sitemap(context, sections, selected_sections, writer, scrape, retries):
+    """Režim --sitemap: produktové URL ze sitemap místo stránkování listingů.
+
+    Produkty jdou stejnou cestou jako z listingu: ``scrape`` (lanes
+    a přesun při výpadku proxy), ``supervised`` (obnova po pádu browseru)
+    a odložené opakování v ``retries``. Filtr cesty je jen hrubý výběr –
+    stránku, která není detail produktu, vyřadí ``scrape_product``.
+    Produkty beze změny od minulého běhu (lastmod) se přeskočí; ``lastmod``
+    se ukládá u každé úspěšně načtené URL, i když nedala řádek (není
+    detail, varianty bez ceny i skladu). Vrátí počet
+    zpracovaných produktů, nebo None pokud sitemapu nelze použít – pak se
+    pokračuje listingy.
+    """
+    state = SitemapState(SITEMAP_STATE_FILE)
+    matchers = {
+        name: (lambda u, bp=urlparse(sections[name]).path.rstrip('/'): is_product_path(u, bp))
+        for name in selected_sections
+    }
+    try:
+        found, stats = await asyncio.to_thread(discover, HOMEPAGE, matchers, state, None, dbg)
+    except Exception as e:
+        dbg(f"[sitemap] Sitemapu nelze použít ({e}) – pokračuji přes listingy")
+        return None
+    if not stats["matched"]:
+        dbg("[sitemap] Žádné produktové URL vybraných sekcí – pokračuji přes listingy")
+        return None
+
+    total_processed = marked = 0
+    lastmods = {}
+    fetched = set()
+
+    def fetch(u):
+        return scrape(u, fetched)
+
+    def done(rows, url_done):
+        nonlocal total_processed, marked
+        if rows:
+            retries.discard(url_done)
+            writer.write(rows)
+            total_processed += 1
+            events.rows(len(rows), url_done)
+        if rows or url_done in fetched:
+            fetched.discard(url_done)
+            state.mark(url_done, lastmods.get(url_done))
+            marked += 1
+            if marked % 50 == 0:
+                state.save()
+
+    try:
+        for i, sec_name in enumerate(selected_sections):
+            items = found[sec_name]
+            print(f"\n>>> Sekce {sec_name}: {len(items)} produktů ze sitemapy")
+            if not items:
+                continue
+            lastmods.update(items)
+            urls = [u for u, _ in items]
+            # K sekci se přidají odložené produkty, které už jsou na řadě
+            due = retries.pop_due()
+            finished = 0
+            events.progress(sec_name, 1, 0, len(urls), i, len(selected_sections))
+            # Po dávkách – mezi nimi checkpoint (recyklace kontextu podle RSS/navigací, obnova po pádu)
+            async for rows, url_done in supervised_batches(context, urls + due, fetch, log=dbg):
+                if url_done not in due:
+                    finished += 1
+                done(rows, url_done)
+                events.progress(sec_name, 1, finished, len(urls), i, len(selected_sections))
+
+        if retries:
+            print(f"\n>>> Opakuji {len(retries)} odložených produktů...")
+            async for rows, url_done in retries.drain(lambda urls: supervised_batches(context, urls, fetch, log=dbg)):
+                done(rows, url_done)
+    finally:
+        state.save()
+    return total_processed
+
+
+API_PAGE_LIMIT = 100  # produktů na jednu stranu Store API listingu
+
+
+def format_eur(value):
+    return f"€{value:,.2f}" if value is not None else 'N/A'
+
+
+def api_product_row(product, sec_name):
+    """Produkt/varianta ze Store API → řádek DataWriter (stejné sloupce jako browser cesta)."""
+    base_name = (translated(product, 'name') or 'N/A').strip()
+    condition = ", ".join(n for n in (translated(o, 'name') for o in product.get('options') or []) if n)
+    gross, net = price_parts(product)
+
+    stock = product.get('availableStock')
+    delivery = translated(product.get('deliveryTime'), 'name') or 'N/A'
+    if product.get('available') and (stock or 0) > 0:
+        stock_status = 'In stock'
+    elif product.get('available'):
+        stock_status = 'With delivery'
+    else:
+        stock_status = 'N/A'
+
+    full_text = []
+    desc = html_to_text(translated(product, 'description'))
+    if desc:
+        full_text.append(desc)
+    props = {}
+    for prop in product.get('properties') or []:
+        group = translated(prop.get('group'), 'name') or ''
+        props.setdefault(group, []).append(translated(prop, 'name') or '')
+    properties_list = [f"{g}: {', '.join(v)}" for g, v in props.items() if g and any(v)]
+    if properties_list:
+        full_text.append(" | ".join(properties_list))
+
+    breadcrumb = translated(product.get('seoCategory'), 'breadcrumb') or []
+    cat_path = ' > '.join(b for b in breadcrumb[1:] if b) if len(breadcrumb) > 1 else sec_name
+
+    images = media_urls(product)
+    return [
+        base_name,
+        condition or 'Check Description',
+        format_eur(gross),
+        format_eur(net),
+        stock_status,
+        str(stock) if stock is not None else 'N/A',
+        delivery,
+        product.get('productNumber') or 'N/A',
+        '; '.join(images) if images else 'N/A',
+        " ; ".join(full_text),
+        cat_path
+    ]
+
+
+async def scrape_via_api(context, sections, selected_sections, writer, concurrency, resume=None):
+    """Režim --api: listingy a varianty jako JSON ze Shopware 6 Store API.
+
+    Z každé sekce se v browseru načte jen první strana (ID kategorie, poprvé
+    i přístupový klíč), dál se stránkuje přes ``context.request``. Po každé
+    straně se uloží progress (``mode: api``), ``resume`` z něj naváže.
+    Vrátí počet zapsaných produktů, nebo None pokud API nefunguje – pak se
+    pokračuje browserem. Selhání API uprostřed běhu se hlásí jako chyba
+    a běh skončí (další běh naváže od uložené strany).
+    """
+    start_section, start_page = None, 1
+    if resume and resume.get('section') in selected_sections:
+        start_section, start_page = resume['section'], resume['page']
+    page = await context.new_page()
+    api = None
+    api_working = False
+    total_processed = 0
+    try:
+        for i, sec_name in enumerate(selected_sections):
+            if start_section is not None and i < selected_sections.index(start_section):
+                continue
+            try:
+                response = await page.goto(sections[sec_name], timeout=60000, wait_until="domcontentloaded")
+                if await check_cloudflare(page, response):
+                    raise RuntimeError("Cloudflare challenge")
+                cfg = await read_storefront_config(page)
+            except Exception as e:
+                dbg(f"[api] {sec_name}: storefront nenačten ({e})")
+                if not api_working:
+                    return None
+                events.error(sec_name, e)
+                continue
+
+            if api is None:
+                if not cfg.get('accessKey'):
+                    dbg("[api] Přístupový klíč Store API ve storefrontu nenalezen – pokračuji browserem")
+                    return None
+                origin = f"{urlparse(HOMEPAGE).scheme}://{urlparse(HOMEPAGE).netloc}"
+                api = StoreApi(context.request, origin, cfg['accessKey'], concurrency=concurrency)
+                try:
+                    if not await api.use_language("en"):
+                        dbg("[api] Anglický jazyk nenalezen – používám výchozí jazyk sales channelu")
+                except StoreApiError as e:
+                    dbg(f"[api] Store API nedostupné ({e}) – pokračuji browserem")
+                    return None
+
+            category_id = cfg.get('navigationId')
+            if not category_id:
+                dbg(f"[api] {sec_name}: ID kategorie nenalezeno, přeskakuji")
+                continue
+
+            print(f"\n>>> [API] Zpracovávám sekci: {sec_name}")
+            seen_parents = set()
+
+            async def rows_for(product):
+                parent_id = product.get('parentId') or (product['id'] if product.get('childCount') else None)
+                if parent_id is None:
+                    return [api_product_row(product, sec_name)]
+                if parent_id in seen_parents:
+                    return []
+                seen_parents.add(parent_id)
+                variants = await api.variants(parent_id)
+                return [api_product_row(v, sec_name) for v in variants] or [api_product_row(product, sec_name)]
+
+            p_num = start_page if sec_name == start_section else 1
+            while True:
+                t_listing = time.monotonic()
+                try:
+                    elements, total = await api.listing(category_id, p_num, API_PAGE_LIMIT)
+                except StoreApiError as e:
+                    dbg(f"[api] {sec_name} str {p_num}: {e}")
+                    if not api_working:
+                        return None
+                    # Sekce by se tiše zkrátila – chyba a konec běhu, progress ukazuje na tuto stranu
+                    events.error(f"{sec_name} str {p_num}", e)
+                    save_progress(sec_name, p_num, page_size=API_PAGE_LIMIT, mode="api")
+                    raise RuntimeError(f"Store API selhalo v sekci {sec_name} na straně {p_num}: {e} "
+                                       f"– další běh naváže od této strany") from e
+                api_working = True
+                events.timing("listing", t_listing)
+                if not elements:
+                    break
+
+                results = await asyncio.gather(*(rows_for(el) for el in elements), return_exceptions=True)
+                page_rows = 0
+                for product, res in zip(elements, results):
+                    if isinstance(res, Exception):
+                        dbg(f"[api] Varianty {product.get('productNumber')}: {res}")
+                        events.error(product.get('productNumber') or product.get('id'), res)
+                        continue
+                    rows = [r for r in res if not (r[2] in ('N/A', '') and r[4] in ('N/A', ''))]
+                    if rows:
+                        writer.write(rows)
+                        total_processed += 1
+                        page_rows += len(rows)
+                events.rows(page_rows)
+                events.progress(sec_name, p_num, len(elements), len(elements), i, len(selected_sections))
+                print(f"    > [API] Strana {p_num}: {len(elements)} produktů, {page_rows} řádků (celkem v sekci {total})")
+                save_progress(sec_name, p_num + 1, page_size=API_PAGE_LIMIT, mode="api")
+
+                if p_num * API_PAGE_LIMIT >= total:
+                    break
+                p_num += 1
+    finally:
+        await page.close()
+    if not api_working:
+        return None
+    clear_progress()
+    return total_processed
+
+
+async def _count_listing(page: Page, section_url, page_size):
+    """Počet produktů na 1. straně listingu při dané velikosti stránky (pro discover_page_size)."""
+    return len(await get_listing_urls(page, section_url, 1, page_size))
+
+
+async def get_listing_urls(page: Page, section_url, page_num, page_size=None):
     parsed = urlparse(section_url)
     q = dict(parse_qsl(parsed.query))
     q["p"] = str(page_num)
+    if page_size:
+        q[PAGE_SIZE_PARAM] = str(page_size)
     new_q = urlencode(q, doseq=True)
     target_url = urlunparse(parsed._replace(query=new_q))
 
     dbg(f"Listing URL: {target_url}")
+    response = None
     try:
-        await page.goto(target_url, timeout=60000, wait_until="networkidle")
+        response = await page.goto(target_url, timeout=60000, wait_until="domcontentloaded")
     except Exception as e:
         err_str = str(e)
-        if "ERR_PROXY_CONNECTION_FAILED" in err_str or "ERR_PROXY" in err_str or "PROXY" in err_str.upper():
+        if is_proxy_error(e) or "PROXY" in err_str.upper():
             raise ProxyConnectionError(f"Proxy selhala při načítání listingu: {e}") from e
         dbg(f"Listing load warning (pokračuji): {e}")
-    await page.wait_for_timeout(2000)
+    try:
+        await page.wait_for_selector(LISTING_READY_SELECTOR, state="attached", timeout=15000)
+    except Exception:
+        dbg("Listing: mřížka ani hláška se neobjevila do 15 s (pokračuji)")
 
     dbg(f"Načteno: {page.url}")
 
-    if await check_cloudflare(page):
+    if await check_cloudflare(page, response):
         await dump_page_html(page, f"cloudflare_listing_p{page_num}")
         dbg("FATAL: Listing stránka blokována Cloudflare")
         return []
 
-    title = await page.title()
-    dbg(f"Titulek stránky: {title}")
+    base_path = parsed.path.rstrip('/')  # např. /en/switches
+    found = await page.evaluate(LISTING_HARVEST_JS, {"selectors": LISTING_LINK_SELECTORS, "basePath": base_path})
+    dbg(f"Titulek stránky: {found['title']}")
 
-    alert = page.locator("div.alert.alert-danger .alert-content")
-    if await alert.count() > 0:
-        txt = await alert.inner_text()
-        if "Unfortunately, something went wrong" in txt:
-            dbg(f"Shopware chyba na listing stránce: {txt[:100]}")
-            return []
+    if found['alert'] and "Unfortunately, something went wrong" in found['alert']:
+        dbg(f"Shopware chyba na listing stránce: {found['alert'][:100]}")
+        return []
 
-    total_en_links = await page.locator('a[href*="/en/"]').count()
-    dbg(f"Celkem /en/ linků: {total_en_links}")
+    dbg(f"Celkem /en/ linků: {found['totalEn']}")
 
     links = set()
 
-    # Strategie 1: původní třídy (Shopware 6 standard)
-    for selector in [
-        '.cms-listing-col a.product-name',
-        '.cms-listing-col a.btn-detail',
-        '.product-box a.product-name',
-        'a.product-name',
-        '.product-name-wrapper a',
-        'article.product-box a[href*="/en/"]',
-        '.card-body a[href*="/en/"]',
-    ]:
-        cards = await page.locator(selector).all()
-        for card in cards:
-            href = await card.get_attribute('href')
-            if href:
-                if '/de/' in href:
-                    href = href.replace('/de/', '/en/')
-                links.add(href)
-        if links:
-            break
+    # Strategie 1: původní třídy (Shopware 6 standard) – první selektor, který něco našel
+    for hrefs in found['bySelector']:
+        for href in hrefs:
+            if '/de/' in href:
+                href = href.replace('/de/', '/en/')
+            links.add(href)
 
     # Strategie 2: všechny /en/ linky s alespoň 3 segmenty za /en/ = produktový detail
     # Vzor: /en/[kategorie]/[subkategorie]/[vyrobce]/[model]
     if not links:
-        base_path = parsed.path.rstrip('/')  # např. /en/switches
-        dbg(f"Strategie 2: hledám a[href*=\"{base_path}/\"]")
-        all_anchors = await page.locator(f'a[href*="{base_path}/"]').all()
-        dbg(f"Strategie 2: nalezeno {len(all_anchors)} kotev s touto cestou")
-        for a in all_anchors:
-            href = await a.get_attribute('href')
-            if not href:
-                continue
+        dbg(f"Strategie 2: nalezeno {len(found['byPath'])} kotev s cestou {base_path}/")
+        for href in found['byPath']:
             if '/de/' in href:
                 href = href.replace('/de/', '/en/')
-            # Ořízni query string pro počítání segmentů
-            path_only = href.split('?')[0].split('#')[0]
-            # Segmenty za /en/
-            en_suffix = path_only.split('/en/')[-1] if '/en/' in path_only else ''
-            parts = [p for p in en_suffix.split('/') if p]
-            # Produkt = min 3 segmenty za /en/ (kategorie/subkat/vyrobce nebo /kategorie/vyrobce/model)
-            if len(parts) >= 3:
+            if is_product_path(href):
                 links.add(href)
         dbg(f"Strategie 2: po filtraci {len(links)} produktových linků")
 
     if not links:
         dbg("VAROVÁNÍ: Žádné produktové linky nenalezeny. Zkontroluj URL a strukturu stránky.")
 
-    seen = set()
-    unique_links = []
-    for l in sorted(links):  # sort pro konzistentní pořadí
-        if l not in seen:
-            unique_links.append(l)
-            seen.add(l)
-
-    return unique_links
+    return sorted(links)  # sort pro konzistentní pořadí
 
 
 async def get_sections(context):
     # Cesty, které nejsou produktové sekce (výrobci, servis, blog, atd.)
-    EXCLUDE_PATHS = {'manufacturer-list', 'service', 'it-remarketing', 'blog', 'search', 'account', 'checkout', 'cart', 'wishlist'}
+    EXCLUDE_PATHS = EXCLUDE_SECTION_PATHS
 
     page = await context.new_page()
+    response = None
     try:
-        await page.goto(HOMEPAGE, wait_until="domcontentloaded", timeout=60000)
+        response = await page.goto(HOMEPAGE, wait_until="domcontentloaded", timeout=60000)
     except Exception as e:
         dbg(f"Homepage load warning (pokračuji): {e}")
     await page.wait_for_timeout(2000)
 
-    if await check_cloudflare(page):
+    if await check_cloudflare(page, response):
         await dump_page_html(page, "cloudflare_homepage")
         dbg("FATAL: Homepage blokována Cloudflare – nelze načíst sekce, používám zálohu")
         await page.close()
@@ -636,41 +1004,76 @@ class DataWriter:
             writer.writerows(rows)
 
 
-async def test_proxy(proxy_url: str) -> bool:
-    """Otestuje dostupnost SOCKS5 proxy jednoduchým TCP spojením."""
-    import socket
-    try:
-        host, port = proxy_url.replace("socks5://", "").split(":")
-        s = socket.create_connection((host, int(port)), timeout=3)
-        s.close()
-        return True
-    except Exception:
-        return False
+# === TEST MODE ===
+def run_http_test() -> bool:
+    """Rychlý test bez browseru: menu sekcí + produktové linky na 1. straně listingu.
+
+    Vrátí True při úspěchu. Při Cloudflare challenge vyhodí CloudflareBlocked
+    a volající pokračuje browser testem (run_test).
+    """
+    print("=== IT-Market Test (HTTP) ===")
+    session = make_session()
+    soup = get_soup(session, HOMEPAGE)
+
+    sections = {}
+    for link in soup.select("a.main-navigation-link"):
+        txt = link.get_text(strip=True)
+        href = link.get("href")
+        if not (txt and href and '/en/' in href):
+            continue
+        path = href.rstrip('/').split('/en/')[-1]
+        if '/' in path or path in EXCLUDE_SECTION_PATHS:
+            continue
+        sections[txt] = href
+    if not sections:
+        raise RuntimeError("Menu sekcí nenalezeno (a.main-navigation-link)")
+
+    sec_name, sec_url = next(iter(sections.items()))
+    parsed = urlparse(sec_url)
+    q = dict(parse_qsl(parsed.query))
+    q["p"] = "1"
+    listing = get_soup(session, urlunparse(parsed._replace(query=urlencode(q, doseq=True))))
+
+    links = set()
+    for selector in LISTING_LINK_SELECTORS:
+        links.update(a.get("href") for a in listing.select(selector) if a.get("href"))
+        if links:
+            break
+    if not links:
+        raise RuntimeError(f"Žádné produktové linky na listingu '{sec_name}' – změnily se selektory?")
+
+    prod_url = sorted(links)[0]
+    base = map_base_fields(extract_static(get_soup(session, prod_url), BASE_SCHEMA))
+    if base['base_name'] == 'N/A':
+        raise RuntimeError(f"Detail produktu bez .product-detail-name: {prod_url}")
+    print(f"TEST OK: {len(sections)} sekcí načteno, '{sec_name}': {len(links)} produktů na straně 1, "
+          f"produkt '{base['base_name']}' ({base['category_path'] or '-'}) (HTTP)")
+    return True
 
 
-# === TEST MODE ===
 async def run_test():
     print("=== IT-Market Test ===")
     try:
-        PROXY_URL = "socks5://127.0.0.1:40000"
-        proxy_ok = await test_proxy(PROXY_URL)
-        proxy_cfg = {"server": PROXY_URL} if proxy_ok else None
-        if not proxy_ok:
+        pool = ProxyPool.from_env(log=dbg)
+        await asyncio.to_thread(pool.probe_all)
+        proxy_cfg = playwright_proxy(pool.assign("test"))
+        if not proxy_cfg:
             print("[test] Proxy nedostupná – připojuji přímo")
 
         async with async_playwright() as p:
-            launch_kw = dict(
+            browser, ctx_proxy = await launch_browser(
+                p,
                 headless=True,
                 args=["--disable-gpu", "--disable-blink-features=AutomationControlled", "--no-sandbox"],
+                proxy_cfg=proxy_cfg,
             )
-            if proxy_cfg:
-                launch_kw["proxy"] = proxy_cfg
-            browser = await p.chromium.launch(**launch_kw)
-            context = await browser.new_context(
+            context = await browser.new_context(**context_kwargs(
+                ctx_proxy,
                 viewport={"width": 1600, "height": 1200},
                 user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36",
-            )
+            ))
             await context.add_init_script(STEALTH_JS)
+            await ResourcePolicy("it-market").install(context)
 
             sections = await get_sections(context)
             if not sections:
@@ -695,11 +1098,36 @@ async def run_test():
 
 # === HLAVNÍ FUNKCE ===
 async def main():
+    sampling_profiler.watch(dbg)
     if '--test' in sys.argv:
+        if '--browser' not in sys.argv:
+            try:
+                if await asyncio.to_thread(run_http_test):
+                    sys.exit(0)
+            except CloudflareBlocked as e:
+                print(f"[test] {e} – zkouším browser")
+            except Exception as e:
+                print(f"TEST ERROR: {e}")
+                sys.exit(1)
         await run_test()
         return
 
     print("=== IT-Market Scraper (Playwright) ===")
+    listing_only = '--listing-only' in sys.argv
+    NAV_HEDGE.enabled = '--hedge' in sys.argv
+    if '--trace-calls' in sys.argv:
+        TRACER.enable("it-market")
+    parts_file = parts_arg(sys.argv)
+    if parts_file:
+        print(f"Režim: vyhledání part numberů ze souboru {parts_file}")
+    use_api = '--api' in sys.argv and not listing_only
+    use_sitemap = '--sitemap' in sys.argv and not listing_only and not use_api
+    if listing_only:
+        print("Režim: jen listing (karty produktů, bez detailů)")
+    elif use_api:
+        print("Režim: Shopware Store API (JSON), browser jen jako záloha")
+    elif use_sitemap:
+        print("Režim: produkty ze sitemapy (jen změněné od minulého běhu)")
 
     out_name = "it-market.csv"
     print(f"Výstup nastaven na: {out_name} (oddělovač: ';', uvozovky: vše)")
@@ -712,53 +1140,108 @@ async def main():
     max_pages_input = input("Max stránek na sekci (enter=vše): ").strip()
     max_pages = int(max_pages_input) if max_pages_input.isdigit() else None
 
-    PROXY_URL = "socks5://127.0.0.1:40000"
-    proxy_ok = await test_proxy(PROXY_URL)
-    if proxy_ok:
-        print(f"Proxy {PROXY_URL} dostupná – používám.")
-        proxy_cfg = {"server": PROXY_URL}
+    # Proxy z poolu (SCRAPER_PROXIES); žádná použitelná = přímé připojení
+    pool = ProxyPool.from_env(log=dbg)
+    await asyncio.to_thread(pool.probe_all)
+    proxy_url = ProxyLanes.first_proxy(pool, "it-market")
+    if proxy_url:
+        print(f"Proxy {proxy_url} dostupná – používám.")
     else:
-        print(f"Proxy {PROXY_URL} nedostupna - pripojuji primo.")
-        proxy_cfg = None
+        print("Žádná proxy nedostupná - pripojuji primo.")
+    proxy_cfg = playwright_proxy(proxy_url)
+
+    policy = ResourcePolicy("it-market")
+
+    def context_for(proxy):
+        """``(factory, on_retire)`` kontextu přes danou proxy (URL, None = přímo)."""
+        cfg = playwright_proxy(proxy)
+        return (lambda b, **extra: new_scrape_context(b, cfg, **extra),
+                lambda old: BrowserState("it-market", cfg).save(old, dbg))
 
     async def create_context(playwright_instance, cfg):
-        lk = dict(
-            headless=headless,
-            args=[
-                "--disable-gpu",
-                "--disable-blink-features=AutomationControlled",
-                "--no-sandbox",
-                "--disable-dev-shm-usage",
-            ],
-        )
-        if cfg:
-            lk["proxy"] = cfg
-        br = await playwright_instance.chromium.launch(**lk)
-        ctx = await br.new_context(
+        async def launch():
+            br, _ = await launch_browser(
+                playwright_instance,
+                headless=headless,
+                args=[
+                    "--disable-gpu",
+                    "--disable-blink-features=AutomationControlled",
+                    "--no-sandbox",
+                    "--disable-dev-shm-usage",
+                ],
+                proxy_cfg=cfg,
+                per_context_proxy=True,  # při výpadku proxy jen nový kontext vedle, ne nový browser
+                log=dbg,
+            )
+            return br
+
+        br = await launch()
+        factory, on_retire = context_for(cfg["server"] if cfg else None)
+        ctx = ManagedContext(br, await factory(br), factory=factory, launch=launch,
+                             on_retire=on_retire, log=dbg)
+        if STEALTH_AVAILABLE:
+            dbg("playwright-stealth k dispozici, aplikuji na kontext")
+        else:
+            dbg("playwright-stealth není nainstalován, používám manuální stealth")
+        return br, ctx
+
+    async def new_scrape_context(br, cfg, **extra):
+        state = BrowserState("it-market", cfg)
+        seed = state.kwargs(dbg)
+        ctx = await br.new_context(**context_kwargs(
+            cfg,
             viewport={"width": 1600, "height": 1200},
             user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36",
             extra_http_headers={
                 "Accept-Language": "en-US,en;q=0.9",
                 "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8",
             },
-            java_script_enabled=True,
-        )
+            **seed,
+            **{"java_script_enabled": True, **extra},
+        ))
+        state.attach(ctx, seed)
         await ctx.add_init_script(STEALTH_JS)
-        if STEALTH_AVAILABLE:
-            dbg("playwright-stealth k dispozici, aplikuji na kontext")
-        else:
-            dbg("playwright-stealth není nainstalován, používám manuální stealth")
-        return br, ctx
+        await policy.install(ctx)
+        return ctx
 
     async with async_playwright() as p:
         browser, context = await create_context(p, proxy_cfg)
+        # Workery rozložené po exitech poolu; ban (Cloudflare, 429) / výpadek přesune jen dotčené kontexty
+        lanes = ProxyLanes(context, context_for, pool, "it-market", proxy_url, log=dbg)
+        await lanes.start(max_concurrent)
+
+        if parts_file:
+            semaphore = worker_slots("it-market", max_concurrent)
+
+            async def scrape_part(u):
+                try:
+                    return await lanes.run(lambda ctx: scrape_product(ctx, u, semaphore), ProxyConnectionError)
+                except ProxyConnectionError as e:
+                    dbg(f"Proxy selhala u {u}: {e}")
+                    return [], u
+
+            await run_part_lookup(
+                load_parts(parts_file),
+                lambda pn: browser_search(context, SEARCH_URL.format(quote_plus(pn)),
+                                          ", ".join(LISTING_LINK_SELECTORS[:3]), '.product-detail-name'),
+                lambda urls: supervised_batches(context, urls, scrape_part, log=dbg),
+                DataWriter(out_name), NegativeCache("it-market"), concurrency=max_concurrent, log=dbg,
+            )
+            await context.save_state()
+            policy.report(dbg)
+            NAV_HEDGE.report(dbg)
+            TRACER.report(dbg)
+            lanes.stop()
+            await context.browser.close()
+            return
 
         print("Načítám sekce...")
         try:
             sections = await get_sections(context)
         except Exception as e:
             print(f"Chyba při načítání sekcí: {e}")
-            await browser.close()
+            lanes.stop()
+            await context.browser.close()
             return
 
         names = list(sections.keys())
@@ -783,33 +1266,97 @@ async def main():
 
         if not selected_sections:
             print("Nic nevybráno.")
-            await browser.close()
+            lanes.stop()
+            await context.browser.close()
             return
 
+        # Progress listingu i Store API ("mode": "api") – dotaz jen jednou, ať sedí odpovědi ze stdin
         progress = load_progress()
+        if progress:
+            print(f"Nalezen progress: {progress['section']} - str {progress['page']}"
+                  f"{' (Store API)' if progress.get('mode') == 'api' else ''}")
+            if input("Pokračovat? (ano/ne): ").lower() != 'ano':
+                clear_progress()
+                progress = None
+
+        if use_api:
+            api_resume = progress if progress and progress.get('mode') == 'api' else None
+            total = await scrape_via_api(context, sections, selected_sections, DataWriter(out_name),
+                                         max_concurrent * 2, api_resume)
+            if total is not None:
+                print("\n=== Hotovo ===")
+                print(f"Celkem zpracováno produktů: {total}")
+                await context.save_state()
+                policy.report(dbg)
+                NAV_HEDGE.report(dbg)
+                TRACER.report(dbg)
+                lanes.stop()
+                await context.browser.close()
+                return
+            print("[api] Store API nelze použít – pokračuji browserem.")
+
+        semaphore = worker_slots("it-market", max_concurrent)
+        retries = RetryQueue("it-market", log=dbg)
+
+        async def scrape_safe(p_url, fetched=None):
+            # Při chybě proxy se produkt zopakuje v novém kontextu, ostatní běží dál
+            try:
+                return await lanes.run(lambda ctx: scrape_product(ctx, p_url, semaphore, retries, fetched),
+                                       ProxyConnectionError)
+            except Exception as e:
+                print(f"CHYBA v tasku: {e}")
+                if not retries.defer(p_url, f"chyba: {e}"):
+                    events.error(p_url, e)
+                return [], p_url
+
+        if use_sitemap:
+            total = await scrape_from_sitemap(context, sections, selected_sections, DataWriter(out_name),
+                                              scrape_safe, retries)
+            if total is not None:
+                lanes.stop()
+                print("\n=== Hotovo ===")
+                print(f"Celkem zpracováno produktů: {total}")
+                await context.save_state()
+                policy.report(dbg)
+                NAV_HEDGE.report(dbg)
+                TRACER.report(dbg)
+                retries.report(dbg)
+                await context.browser.close()
+                return
+
+        if progress and progress.get('mode') == 'api':
+            progress = None  # strany API nejsou strany listingu
         start_sec_idx = 0
         start_page = 1
 
         if progress:
-            print(f"Nalezen progress: {progress['section']} - str {progress['page']}")
-            if input("Pokračovat? (ano/ne): ").lower() == 'ano':
-                if progress['section'] in selected_sections:
-                    if len(selected_sections) > 1:
-                        try:
-                            start_sec_idx = selected_sections.index(progress['section'])
-                        except ValueError:
-                            pass
-                    start_page = progress['page']
-            else:
-                clear_progress()
-                progress = None
+            if progress['section'] in selected_sections:
+                if len(selected_sections) > 1:
+                    try:
+                        start_sec_idx = selected_sections.index(progress['section'])
+                    except ValueError:
+                        pass
+                start_page = progress['page']
 
         resume_done_urls = set(progress.get('done_urls', [])) if progress else set()
         is_on_resume_page = bool(progress)
 
-        writer = DataWriter(out_name)
-        semaphore = asyncio.Semaphore(max_concurrent)
+        # Velikost stránky listingu: při resume ta uložená (čísla stránek na ní závisí),
+        # jinak největší, kterou web přijme
+        if progress:
+            page_size = progress.get('page_size')
+        else:
+            probe_page = await context.new_page()
+            try:
+                first_url = sections[selected_sections[start_sec_idx]]
+                page_size = await discover_page_size(
+                    lambda size: _count_listing(probe_page, first_url, size), log=dbg)
+            except ProxyConnectionError:
+                page_size = None
+            finally:
+                await probe_page.close()
 
+        writer = DataWriter(out_name)
         total_processed = 0
         i = start_sec_idx
 
@@ -821,7 +1368,6 @@ async def main():
             current_page = start_page if i == start_sec_idx else 1
 
             listing_page_obj = await context.new_page()
-            proxy_failed = False
             done_urls_page = set()
 
             try:
@@ -830,13 +1376,25 @@ async def main():
                         print("Dosažen limit stránek.")
                         break
 
+                    # Obnova po pádu / recyklace kontextu jen mezi stranami – produkty předchozí strany jsou hotové
+                    listing_page_obj = await context.checkpoint(listing_page_obj)
+                    listing_proxy = lanes.current
+
                     print(f"  > Načítám listing stranu {current_page}...")
+                    t_listing = time.monotonic()
                     try:
-                        urls = await get_listing_urls(listing_page_obj, sec_url, current_page)
+                        urls = await get_listing_urls(listing_page_obj, sec_url, current_page, page_size)
                     except ProxyConnectionError as e:
-                        print(f"\n!!! PROXY SELHALA: {e}")
-                        proxy_failed = True
-                        break
+                        # Nový kontext (jiná proxy / přímo) vedle stávajícího; checkpoint otevře listing v něm
+                        await lanes.fail(e, listing_proxy)
+                        continue
+                    except Exception:
+                        if not context.crashed:
+                            raise
+                        print("\n!!! Browser spadl při načítání listingu – obnovuji a opakuji stranu...")
+                        continue
+
+                    events.timing("listing", t_listing)
 
                     if not urls:
                         print("  > Žádné další produkty, konec sekce.")
@@ -855,35 +1413,39 @@ async def main():
                     else:
                         print(f"    > Nalezeno {len(urls)} produktů. Zpracovávám...")
 
-                    if filtered:
-                        pending_tasks = []
-                        for p_url in filtered:
-                            pending_tasks.append(asyncio.create_task(scrape_product(context, p_url, semaphore)))
-
-                        page_proxy_failed = False
-                        for completed_task in asyncio.as_completed(pending_tasks):
-                            try:
-                                rows, url_done = await completed_task
-                                if rows:
-                                    writer.write(rows)
-                                    total_processed += 1
-                                    done_urls_page.add(url_done)
-                                    save_progress(sec_name, current_page, done_urls_page)
-                                    dbg(f"Hotovo ({total_processed}): {url_done}")
-                            except ProxyConnectionError as e:
-                                print(f"\n!!! PROXY SELHALA v produktovém tasku: {e}")
-                                page_proxy_failed = True
-                                for t in pending_tasks:
-                                    t.cancel()
-                                break
-                            except Exception as e:
-                                print(f"CHYBA v tasku: {e}")
-
-                        if page_proxy_failed:
-                            proxy_failed = True
-                            break
-
-                    save_progress(sec_name, current_page + 1)
+                    page_done = skipped
+
+                    if listing_only:
+                        card_rows = [(u, r) for u, r in await listing_card_rows(listing_page_obj, sec_name)
+                                     if u not in done_urls_page]
+                        writer.write([r for _, r in card_rows])
+                        total_processed += len(card_rows)
+                        events.rows(len(card_rows))
+                        events.progress(sec_name, current_page, len(urls), len(urls), i, len(selected_sections))
+                        save_progress(sec_name, current_page + 1, page_size=page_size)
+                        current_page += 1
+                        continue
+
+                    events.progress(sec_name, current_page, page_done, len(urls), i, len(selected_sections))
+
+                    # K dávce se přidají odložené produkty, které už jsou na řadě
+                    due = retries.pop_due()
+                    if filtered or due:
+                        # Produkty rozpracované při pádu browseru se po obnově zkusí znovu
+                        async for rows, url_done in supervised(context, filtered + due, scrape_safe, log=dbg):
+                            if url_done not in due:
+                                page_done += 1
+                            if rows:
+                                retries.discard(url_done)
+                                writer.write(rows)
+                                total_processed += 1
+                                done_urls_page.add(url_done)
+                                save_progress(sec_name, current_page, done_urls_page, page_size)
+                                dbg(f"Hotovo ({total_processed}): {url_done}")
+                                events.rows(len(rows), url_done)
+                            events.progress(sec_name, current_page, page_done, len(urls), i, len(selected_sections))
+
+                    save_progress(sec_name, current_page + 1, page_size=page_size)
                     current_page += 1
 
             finally:
@@ -892,30 +1454,28 @@ async def main():
                 except Exception:
                     pass
 
-            if proxy_failed:
-                print("\n>>> Proxy se odpojila – restartuji browser bez proxy a pokračuji...")
-                save_progress(sec_name, current_page, done_urls_page)
-                try:
-                    await browser.close()
-                except Exception:
-                    pass
-                proxy_cfg = None
-                browser, context = await create_context(p, proxy_cfg)
-                semaphore = asyncio.Semaphore(max_concurrent)
-                # Pokračuj od aktuální sekce a stránky (nezvedáme i)
-                start_sec_idx = i
-                start_page = current_page
-                is_on_resume_page = True
-                resume_done_urls = done_urls_page
-                continue
-
+            await context.save_state()
             start_page = 1
             i += 1
 
+        if retries:
+            print(f"\n>>> Opakuji {len(retries)} odložených produktů...")
+            async for rows, url_done in retries.drain(lambda urls: supervised(context, urls, scrape_safe, log=dbg)):
+                if rows:
+                    writer.write(rows)
+                    total_processed += 1
+                    events.rows(len(rows), url_done)
+
+        lanes.stop()
         print("\n=== Hotovo ===")
         print(f"Celkem zpracováno produktů: {total_processed}")
+        await context.save_state()
+        policy.report(dbg)
+        NAV_HEDGE.report(dbg)
+        TRACER.report(dbg)
+        retries.report(dbg)
         clear_progress()
-        await browser.close()
+        await context.browser.close()
 
 
 if __name__ == "__main__":
@@ -1,6 +1,7 @@
 import csv
 import json
 import re
+import threading
 import time
 from datetime import datetime
 from pathlib import Path
@@ -27,7 +28,8 @@ import platform
 import shutil
 from requests.exceptions import HTTPError, Timeout, ConnectionError as ReqConnError
 
-WARP_PROXY = {"http": "socks5h://127.0.0.1:40000", "https": "socks5h://127.0.0.1:40000"}
+from http_client import cloudflare_verdict
+from proxy_pool import default_pool, requests_proxies, is_requests_proxy_error
 
 
 def dbg(msg):
@@ -151,13 +153,28 @@ def _soup_get(url: str, timeout: int = 20, max_retries: int = 5, backoff_base: f
     attempt = 0
     while True:
         attempt += 1
+        # Každé vlákno má svou proxy z poolu (lepivě); ban nebo výpadek ji přesune jinam
+        pool = default_pool()
+        proxy = pool.assign(threading.current_thread().name)
+        t0 = time.monotonic()
         try:
-            r = requests.get(url, headers=HEADERS, timeout=timeout, allow_redirects=True, proxies=WARP_PROXY)
+            r = requests.get(url, headers=HEADERS, timeout=timeout, allow_redirects=True,
+                             proxies=requests_proxies(proxy))
+            latency_ms = (time.monotonic() - t0) * 1000
+            # Údržba webu není ban – proxy odpověď doručila (503 za Cloudflare má i jeho hlavičku)
             if r.url.endswith("/maintenance") or r.status_code == 503:
+                pool.report(proxy, True, latency_ms)
                 raise MaintenanceError(f"Maintenance mode ({r.status_code}) at {r.url}")
+            if r.status_code == 429 or cloudflare_verdict(r.status_code, r.headers, r.url):
+                pool.ban(proxy, f"HTTP {r.status_code}")
+            else:
+                pool.report(proxy, True, latency_ms)
             r.raise_for_status()
             return BeautifulSoup(r.text, "html.parser")
         except (Timeout, ReqConnError) as e:
+            # Do zdraví proxy se počítá jen selhání spojení s ní, ne pomalý web
+            if is_requests_proxy_error(e):
+                pool.report(proxy, False)
             if attempt > max_retries:
                 raise
         except HTTPError as e:
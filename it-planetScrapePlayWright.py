@@ -7,10 +7,27 @@ import sys
 import time
 from datetime import datetime, timezone
 from pathlib import Path
-from urllib.parse import urlparse, urlunparse, urlencode, parse_qsl, urljoin
+from urllib.parse import urlparse, urlunparse, urlencode, parse_qsl, urljoin, quote_plus
 
 from playwright.async_api import async_playwright, Page
 
+import scrape_events as events
+from shared_browser import launch_browser, context_kwargs
+from http_client import make_session, get_soup, cloudflare_verdict, is_cloudflare_challenge, CloudflareBlocked
+from resource_policy import ResourcePolicy
+from browser_state import BrowserState, challenged
+from context_pool import ManagedContext, ProxyLanes, supervised, supervised_batches
+from proxy_pool import ProxyPool, playwright_proxy, is_proxy_error
+from extract_schema import extract, extract_static
+from listing_pages import discover_page_size, with_page_size
+from hedge import NavHedger
+from pw_tracer import TRACER
+import sampling_profiler
+from engine_probe import EngineChoice, probe, SAMPLE_SIZE
+from worker_budget import worker_slots
+from retry_queue import RetryQueue
+from part_lookup import parts_arg, load_parts, browser_search, run_part_lookup, NegativeCache
+
 # UTF-8 výstup – oprava pro Windows terminál (cp1252 neumí česky)
 if hasattr(sys.stdout, 'buffer') and sys.stdout.encoding.lower().replace('-', '') not in ('utf8', 'utf8sig'):
     sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
@@ -22,6 +39,8 @@ START_URL = "https://it-planet.com/en"
 SCRIPT_DIR = Path(__file__).resolve().parent
 PROGRESS_FILE = SCRIPT_DIR / "it-planet_progress_v6.json"
 HTML_DUMP_DIR = SCRIPT_DIR / "html_dumps"
+PAGE_SIZE_PARAM = "n"  # Shopware 5: počet produktů na stránku listingu
+SEARCH_URL = f"{BASE_URL}/en/search?sSearch={{}}"
 
 STEALTH_JS = """
 () => {
@@ -39,9 +58,9 @@ STEALTH_JS = """
 
 
 # === SPRÁVA PROGRESSU ===
-def save_progress(section, page, done_urls=None):
+def save_progress(section, page, done_urls=None, page_size=None):
     try:
-        data = {"section": section, "page": page}
+        data = {"section": section, "page": page, "page_size": page_size}
         if done_urls is not None:
             data["done_urls"] = list(done_urls)
         with open(PROGRESS_FILE, 'w', encoding='utf-8') as f:
@@ -67,6 +86,12 @@ def clear_progress():
         pass
 
 
+# === VÝJIMKY ===
+class ProxyConnectionError(Exception):
+    """Proxy selhala – produkt se zopakuje v kontextu s jinou proxy (ProxyLanes)."""
+    pass
+
+
 # === POMOCNÉ FUNKCE ===
 def dbg(msg):
     ts = time.strftime("%H:%M:%S")
@@ -87,8 +112,22 @@ async def dump_page_html(page, label: str):
         dbg(f"Nepodařilo se uložit HTML dump: {e}")
 
 
-async def check_cloudflare(page) -> bool:
-    """Vrátí True pokud je stránka blokována Cloudflare challenge."""
+async def check_cloudflare(page, response=None) -> bool:
+    """Vrátí True pokud je stránka blokována Cloudflare challenge.
+
+    Pokud je k dispozici odpověď z ``page.goto``, rozhoduje se podle statusu,
+    hlaviček a URL; obsah stránky se čte jen když jsou tyto signály nejednoznačné.
+    """
+    if response is not None:
+        try:
+            verdict = cloudflare_verdict(response.status, response.headers, response.url)
+        except Exception:
+            verdict = None
+        if verdict is not None:
+            if verdict:
+                dbg(f"CLOUDFLARE DETEKOVÁN: status={response.status}, url={response.url}")
+                challenged(page.context, dbg)
+            return verdict
     try:
         title = await page.title()
         html_snippet = await page.evaluate("() => document.body ? document.body.innerHTML.slice(0, 4000) : ''")
@@ -102,6 +141,7 @@ async def check_cloudflare(page) -> bool:
         ]
         if any(signals):
             dbg(f"CLOUDFLARE DETEKOVÁN: title={title!r}, url={page.url}")
+            challenged(page.context, dbg)
             return True
     except Exception:
         pass
@@ -151,167 +191,209 @@ class CsvWriter:
 
 # === VYLEPŠENÁ EXTRAKCE DAT ===
 
-async def extract_current_variant_data(page: Page, base_data: dict):
-    """Vytáhne data z aktuálně viditelné stránky."""
+# Deklarativní schémata detailu (Shopware 5) – úprava webu = úprava schématu
+BASE_SCHEMA = {
+    "name": {"sel": "h1.product--title"},
+    "desc": {"sel": ".product--description"},
+    "specs": {"rows": ".product--description .table.d-table tr", "key": "td", "value": "td + td"},
+    "crumbs": {"sel": ".breadcrumb--entry span", "all": True},
+}
+
+VARIANT_SCHEMA = {
+    "checked": {"count": '.configurator--form input[type="radio"]:checked'},
+    "cond_title": {"sel": '.configurator--form input[type="radio"]:checked', "attr": "title"},
+    "cond_label": {"sel": '.configurator--form input[type="radio"]:checked', "label": True},
+    "price_text": {"sel": ".product--price .price--content"},
+    "price_meta": {"sel": 'meta[itemprop="price"]', "attr": "content"},
+    "has_price_meta": {"count": 'meta[itemprop="price"]'},
+    "delivery": {"sel": ".delivery--text"},
+    "sku": {"sel": ".entry--sku .entry--content"},
+    "sku_item": {"first": [{"sel": '[itemprop="sku"]', "attr": "content"}, {"sel": '[itemprop="sku"]'}]},
+    "images": {"each": ".image--element", "fields": {
+        "orig": {"attr": ["data-img-original", "data-img-large"]},
+        "srcset": {"sel": "img", "attr": "srcset"},
+        "src": {"sel": "img", "attr": "src"},
+    }},
+    "supplier": {"sel": ".entry--suppliernumber .entry--content"},
+}
+
+
+def map_base_fields(raw, url):
+    """Výstup BASE_SCHEMA → společná data produktu (šablona pro varianty)."""
+    name = clean_text(raw['name']) if raw.get('name') is not None else 'N/A'
+
+    desc_parts = []
+    if raw.get('desc') is not None:
+        desc_parts.append(clean_text(raw['desc']))
+    specs = [f"{clean_text(k)}: {clean_text(v)}" for k, v, _ in raw.get('specs') or []]
+    if specs:
+        desc_parts.append("SPECS: " + " | ".join(specs))
+
+    cats = [clean_text(t) for t in raw.get('crumbs') or []]
+    return {
+        'product_name': name,
+        'category_path': " > ".join(cats) if cats else "N/A",
+        'description': " ; ".join(desc_parts),
+        'url': url
+    }
+
+
+def map_variant_fields(raw, base_data: dict):
+    """Výstup VARIANT_SCHEMA → řádek varianty (doplní šablonu base_data)."""
     data = base_data.copy()
 
     # 1. STAV (Condition)
-    try:
-        checked_input = page.locator('.configurator--form input[type="radio"]:checked')
-        if await checked_input.count() > 0:
-            cond = await checked_input.get_attribute("title")
-            if not cond:
-                cid = await checked_input.get_attribute("id")
-                cond = await page.locator(f'label[for="{cid}"]').inner_text()
-            data['condition'] = clean_text(cond)
-        else:
-            data['condition'] = "Standard"
-    except:
-        data['condition'] = "N/A"
+    if raw.get('checked'):
+        data['condition'] = clean_text(raw.get('cond_title') or raw.get('cond_label') or "")
+    else:
+        data['condition'] = "Standard"
 
     # 2. CENA
-    try:
-        price_el = page.locator('.product--price .price--content')
-        if await price_el.count() > 0:
-            raw_text = await price_el.first.inner_text()
-            data['price'] = parse_price(raw_text)
-        else:
-            meta = page.locator('meta[itemprop="price"]')
-            if await meta.count() > 0:
-                meta_val = await meta.get_attribute("content") or ""
-                data['price'] = parse_price(meta_val)
-            else:
-                data['price'] = "On Request"
-    except:
-        data['price'] = "N/A"
+    if raw.get('price_text') is not None:
+        data['price'] = parse_price(raw['price_text'])
+    elif raw.get('has_price_meta'):
+        data['price'] = parse_price(raw.get('price_meta') or "")
+    else:
+        data['price'] = "On Request"
 
     # 3. DODACÍ LHŮTA
-    try:
-        del_el = page.locator('.delivery--text')
-        if await del_el.count() > 0:
-            data['delivery_time'] = clean_text(await del_el.inner_text())
-        else:
-            data['delivery_time'] = "N/A"
-    except:
-        data['delivery_time'] = "N/A"
+    data['delivery_time'] = clean_text(raw['delivery']) if raw.get('delivery') is not None else "N/A"
 
     # 4. SKU (Order number)
-    try:
-        sku_li = page.locator('.entry--sku .entry--content')
-        if await sku_li.count() > 0:
-            data['sku'] = clean_text(await sku_li.inner_text())
-        else:
-            sku_el = page.locator('[itemprop="sku"]')
-            if await sku_el.count() > 0:
-                sku = await sku_el.get_attribute("content")
-                if not sku: sku = await sku_el.inner_text()
-                data['sku'] = clean_text(sku)
-            else:
-                data['sku'] = "N/A"
-    except:
+    if raw.get('sku') is not None:
+        data['sku'] = clean_text(raw['sku'])
+    elif raw.get('sku_item') is not None:
+        data['sku'] = clean_text(raw['sku_item'])
+    else:
         data['sku'] = "N/A"
 
-    # 5. OBRÁZKY (OPRAVENO: Cílíme na data-img-original)
-    try:
-        srcs = []
-        # Hledáme elementy, které obsahují data o obrázcích
-        # Shopware používá třídu .image--element na wrapperu
-        elements = await page.locator('.image--element').all()
-
-        for el in elements:
-            # Zkusíme získat URL z data atributu (nejspolehlivější)
-            url = await el.get_attribute('data-img-original')
-            if not url:
-                url = await el.get_attribute('data-img-large')
-
-            # Fallback: pokud data atribut chybí, zkusíme najít img tag uvnitř
-            if not url:
-                img_tag = el.locator('img').first
-                if await img_tag.count() > 0:
-                    srcset = await img_tag.get_attribute('srcset')
-                    if srcset:
-                        url = srcset.split(',')[-1].strip().split(' ')[0]
-                    else:
-                        url = await img_tag.get_attribute('src')
-
-            if url:
-                # Relativní URL doplníme na absolutní
-                if url.startswith('/'):
-                    url = BASE_URL + url
-                if url not in srcs:
-                    srcs.append(url)
-
-        data['images'] = ' | '.join(srcs) if srcs else "N/A"
-    except Exception as e:
-        # dbg(f"Chyba obrázků: {e}")
-        data['images'] = "N/A"
+    # 5. OBRÁZKY – data-img-original, fallback na největší srcset / src
+    srcs = []
+    for img in raw.get('images') or []:
+        url = img.get('orig')
+        if not url and img.get('srcset'):
+            url = img['srcset'].split(',')[-1].strip().split(' ')[0]
+        if not url:
+            url = img.get('src')
+        if url:
+            # Relativní URL doplníme na absolutní
+            if url.startswith('/'):
+                url = BASE_URL + url
+            if url not in srcs:
+                srcs.append(url)
+    data['images'] = ' | '.join(srcs) if srcs else "N/A"
 
     # 6. Supplier Number
-    try:
-        sup_el = page.locator('.entry--suppliernumber .entry--content')
-        if await sup_el.count() > 0:
-            data['supplier_number'] = clean_text(await sup_el.inner_text())
-        else:
-            data['supplier_number'] = "N/A"
-    except:
-        data['supplier_number'] = "N/A"
+    data['supplier_number'] = clean_text(raw['supplier']) if raw.get('supplier') is not None else "N/A"
 
     return data
 
 
-async def scrape_product(context, url, semaphore):
+async def extract_current_variant_data(page: Page, base_data: dict):
+    """Vytáhne data z aktuálně viditelné stránky (jeden evaluate)."""
+    try:
+        raw = await extract(page, VARIANT_SCHEMA)
+    except Exception as e:
+        dbg(f"Chyba extrakce varianty: {e}")
+        data = base_data.copy()
+        for key in ('condition', 'price', 'delivery_time', 'sku', 'images', 'supplier_number'):
+            data[key] = "N/A"
+        return data
+    return map_variant_fields(raw, base_data)
+
+
+VARIANT_REQUESTS = 4  # max. souběžných HTTP dotazů na varianty jednoho produktu
+
+
+def variant_url(product_url, number):
+    """URL konkrétní varianty přes parametr ?number= (viz build_product_url v it-planetScrape.py)."""
+    parsed = urlparse(product_url)
+    q = dict(parse_qsl(parsed.query))
+    q["number"] = number
+    return urlunparse(parsed._replace(query=urlencode(q)))
+
+
+async def fetch_variants_direct(context, page: Page, url, base_template, count):
+    """Načte všechny varianty přes ``?number=<základ>[.k]`` místo klikání.
+
+    Aktuální stránka už zobrazuje jednu variantu – její objednací číslo dá
+    základ, ostatní čísla se stáhnou přes ``context.request`` (sdílí proxy
+    i cookies s browserem) a vyhodnotí se stejným schématem nad statickým
+    HTML. Neotevírají se další stránky, varianty tak běží ve slotu
+    produktu a nepřekročí rozpočet workerů. Každá varianta se ověří podle
+    SKU. Vrátí řádky v pořadí čísel, nebo None pokud některá varianta
+    nesedí (pak se kliká). Cloudflare challenge u kterékoli varianty
+    zruší ostatní dotazy a vyhodí ``CloudflareBlocked``.
+    """
+    current = await extract_current_variant_data(page, base_template)
+    sku = current.get('sku', 'N/A')
+    if sku == 'N/A':
+        return None
+    base = re.sub(r'\.\d+$', '', sku)
+    numbers = [base] + [f"{base}.{k}" for k in range(1, count)]
+    if sku not in numbers:
+        return None
+
+    found = {sku: current}
+    limit = asyncio.Semaphore(VARIANT_REQUESTS)
+
+    async def fetch(number):
+        async with limit:
+            try:
+                resp = await context.request.get(variant_url(url, number), timeout=60000)
+                html = await resp.text()
+            except Exception as e:
+                if is_proxy_error(e):
+                    raise
+                dbg(f"  Varianta {number} nenačtena: {e}")
+                return
+        if is_cloudflare_challenge(resp.status, resp.headers, html):
+            raise CloudflareBlocked(f"Cloudflare challenge ({resp.status}) u varianty {number}")
+        row = map_variant_fields(extract_static(html, VARIANT_SCHEMA), base_template)
+        if row.get('sku') == number:
+            found[number] = row
+
+    tasks = [asyncio.create_task(fetch(n)) for n in numbers if n != sku]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        # první challenge/výpadek proxy ukončí i ostatní rozběhnuté dotazy
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    if len(found) != count:
+        return None
+    return [found[n] for n in numbers]
+
+
+# Hedging pomalých navigací detailu (--hedge), časy se měří vždy
+NAV_HEDGE = NavHedger("it-planet", log=dbg)
+
+async def scrape_product(context, url, semaphore, retries=None):
     async with semaphore:
         page = await context.new_page()
         all_rows = []
+        t0 = time.monotonic()
 
         try:
-            await page.goto(url, timeout=60000, wait_until="domcontentloaded")
+            page, response = await NAV_HEDGE.goto(context, page, url, timeout=60000, wait_until="domcontentloaded")
             await page.wait_for_timeout(1000)
 
-            if await check_cloudflare(page):
+            if await check_cloudflare(page, response):
                 await dump_page_html(page, f"cloudflare_{url.split('/')[-1].split('?')[0]}")
                 raise RuntimeError("Cloudflare challenge – stránka zablokována")
 
             # SPOLEČNÁ DATA
             try:
-                h1 = page.locator('h1.product--title')
-                name = clean_text(await h1.inner_text()) if await h1.count() > 0 else 'N/A'
-
-                desc_parts = []
-                desc_txt = page.locator('.product--description').first
-                if await desc_txt.count() > 0:
-                    desc_parts.append(clean_text(await desc_txt.inner_text()))
-
-                rows = await page.locator('.product--description .table.d-table tr').all()
-                specs = []
-                for r in rows:
-                    cols = await r.locator('td').all()
-                    if len(cols) >= 2:
-                        k = await cols[0].inner_text()
-                        v = await cols[1].inner_text()
-                        specs.append(f"{clean_text(k)}: {clean_text(v)}")
-                if specs:
-                    desc_parts.append("SPECS: " + " | ".join(specs))
-
-                full_desc = " ; ".join(desc_parts)
-
-                cats = []
-                crumbs = await page.locator('.breadcrumb--entry span').all()
-                for c in crumbs:
-                    t = await c.inner_text()
-                    if t: cats.append(clean_text(t))
-                cat_path = " > ".join(cats) if cats else "N/A"
-
+                base_template = map_base_fields(await extract(page, BASE_SCHEMA), url)
             except Exception as e:
                 dbg(f"Chyba základu: {e}")
-                name, full_desc, cat_path = "N/A", "N/A", "N/A"
-
-            base_template = {
-                'product_name': name,
-                'category_path': cat_path,
-                'description': full_desc,
-                'url': url
-            }
+                base_template = {
+                    'product_name': "N/A",
+                    'category_path': "N/A",
+                    'description': "N/A",
+                    'url': url
+                }
 
             # VARIANTY
             # Hledáme radio inputy
@@ -322,25 +404,31 @@ async def scrape_product(context, url, semaphore):
                 row = await extract_current_variant_data(page, base_template)
                 all_rows.append(row)
             else:
-                # Seznam ID pro klikání
-                input_ids = []
-                for i in range(count):
-                    i_id = await variant_inputs.nth(i).get_attribute("id")
-                    if i_id: input_ids.append(i_id)
-
-                for i_id in input_ids:
-                    label = page.locator(f'label[for="{i_id}"]')
-                    if await label.count() > 0:
-                        try:
-                            # 1. Klik
-                            await label.click(force=True)
-                            # 2. Čekání na AJAX
-                            await page.wait_for_timeout(2000)
-                            # 3. Extrakce
-                            row = await extract_current_variant_data(page, base_template)
-                            all_rows.append(row)
-                        except:
-                            pass
+                # Nejdřív varianty přímo přes ?number=, klikání jen jako záloha
+                direct = await fetch_variants_direct(context, page, url, base_template, count)
+                if direct is not None:
+                    all_rows.extend(direct)
+                else:
+                    dbg(f"  Přímé načtení variant nevyšlo, klikám na konfigurátor: {url}")
+                    # Seznam ID pro klikání
+                    input_ids = []
+                    for i in range(count):
+                        i_id = await variant_inputs.nth(i).get_attribute("id")
+                        if i_id: input_ids.append(i_id)
+
+                    for i_id in input_ids:
+                        label = page.locator(f'label[for="{i_id}"]')
+                        if await label.count() > 0:
+                            try:
+                                # 1. Klik
+                                await label.click(force=True)
+                                # 2. Čekání na AJAX
+                                await page.wait_for_timeout(2000)
+                                # 3. Extrakce
+                                row = await extract_current_variant_data(page, base_template)
+                                all_rows.append(row)
+                            except:
+                                pass
 
             # Zápis
             final_rows = []
@@ -358,10 +446,16 @@ async def scrape_product(context, url, semaphore):
                     d.get('url', 'N/A')
                 ])
 
+            events.timing("product", t0)
             return final_rows, url
 
         except Exception as e:
-            dbg(f"CHYBA při zpracování {url}: {e}")
+            if is_proxy_error(e):
+                raise ProxyConnectionError(f"Proxy selhala u produktu {url}: {e}") from e
+            # Opakování se naplánuje do fronty (bez čekání ve slotu); po vyčerpání pokusů je to chyba
+            if retries is None or not retries.defer(url, f"chyba: {e}"):
+                dbg(f"CHYBA při zpracování {url}: {e}")
+                events.error(url, e)
             try:
                 if not page.is_closed():
                     is_cf = await check_cloudflare(page)
@@ -386,28 +480,32 @@ FALLBACK_SECTIONS = {
     "Power Supply":  f"{BASE_URL}/en/c/power-supply.html",
 }
 
+SECTION_IGNORED = {"blog", "service", "inquiry", "home", "brands", "manufacturer",
+                   "about", "contact", "career", "imprint", "privacy", "terms",
+                   "shipping", "warranty", "returns", "disposal", "safety",
+                   "declaration", "partner", "right-of", "data-protection",
+                   "general-terms", "inquiry-form"}
+
+
 async def get_sections(context):
     page = await context.new_page()
     dbg("Načítám menu...")
     sections = {}
 
     try:
+        response = None
         try:
-            await page.goto(START_URL, wait_until="domcontentloaded", timeout=60000)
+            response = await page.goto(START_URL, wait_until="domcontentloaded", timeout=60000)
         except Exception as e:
             dbg(f"Homepage load warning (pokračuji): {e}")
         await page.wait_for_timeout(2000)
 
-        if await check_cloudflare(page):
+        if await check_cloudflare(page, response):
             await dump_page_html(page, "cloudflare_homepage")
             dbg("FATAL: Homepage blokována Cloudflare – používám záložní sekce")
             return FALLBACK_SECTIONS
 
-        ignored = {"blog", "service", "inquiry", "home", "brands", "manufacturer",
-                   "about", "contact", "career", "imprint", "privacy", "terms",
-                   "shipping", "warranty", "returns", "disposal", "safety",
-                   "declaration", "partner", "right-of", "data-protection",
-                   "general-terms", "inquiry-form"}
+        ignored = SECTION_IGNORED
 
         menu_items = await page.locator('.navigation--list .navigation--entry .navigation--link').all()
 
@@ -448,7 +546,50 @@ async def get_sections(context):
     return sections
 
 
-async def get_listing_urls(page: Page, section_url, page_num):
+# Karty produktů na listingu – pro režim --listing-only (bez otevírání detailů)
+CARD_SCHEMA = {
+    "cards": {"each": ".product--box", "fields": {
+        "href": {"first": [{"sel": ".product--detail-btn a", "attr": "href"},
+                           {"sel": ".product--title", "attr": "href"}]},
+        "name": {"first": [{"sel": ".product--title", "attr": "title"}, {"sel": ".product--title"}]},
+        "price": {"first": [{"sel": ".price--default"}, {"sel": ".product--price"}]},
+        "delivery": {"sel": ".delivery--text"},
+    }},
+}
+
+
+async def listing_card_rows(page: Page, sec_name):
+    """Řádky CSV z karet aktuálně načteného listingu (jeden evaluate).
+
+    Vrací seznam ``(url, row)``; pole, která karta neukazuje, jsou N/A.
+    """
+    raw = await extract(page, CARD_SCHEMA)
+    out = []
+    for c in raw.get('cards') or []:
+        if not c.get('href'):
+            continue
+        url = urljoin(BASE_URL, c['href'])
+        out.append((url, [
+            clean_text(c.get('name') or '') or 'N/A',
+            'N/A',
+            parse_price(c['price']) if c.get('price') else 'On Request',
+            clean_text(c['delivery']) if c.get('delivery') else 'N/A',
+            'N/A',
+            'N/A',
+            'N/A',
+            'N/A',
+            sec_name,
+            url
+        ]))
+    return out
+
+
+async def _count_listing(page: Page, section_url, page_size):
+    """Počet produktů na 1. straně listingu při dané velikosti stránky (pro discover_page_size)."""
+    return len(await get_listing_urls(page, section_url, 1, page_size))
+
+
+def listing_page_url(section_url, page_num, page_size=None):
     target_url = section_url
     if page_num > 1:
         parsed = urlparse(section_url)
@@ -456,16 +597,53 @@ async def get_listing_urls(page: Page, section_url, page_num):
         q["p"] = str(page_num)
         new_q = urlencode(q, doseq=True)
         target_url = urlunparse(parsed._replace(query=new_q))
+    return with_page_size(target_url, PAGE_SIZE_PARAM, page_size)
+
+
+# Engine listingu podle engine_profile.json (--probe-engine); listing it-planet je vykreslený serverem
+LISTING_ENGINE = EngineChoice("it-planet", "listing", log=dbg)
+
+
+def get_listing_urls_static(session, section_url, page_num, page_size=None):
+    """URL produktů ze strany listingu přes HTTP (engine "http").
+
+    Vrací None, pokud stránka produkty ve statickém HTML nemá nebo HTTP
+    selže – volající pak stranu načte browserem (ten rozhodne i o konci sekce).
+    """
+    target_url = listing_page_url(section_url, page_num, page_size)
+    dbg(f"  > Listing str {page_num} (HTTP): {target_url}")
+    try:
+        soup = get_soup(session, target_url, timeout=30)
+    except CloudflareBlocked as e:
+        LISTING_ENGINE.demote(e)
+        return None
+    except Exception as e:
+        dbg(f"  HTTP listing selhal ({e}) – zkouším browser")
+        return None
+    if soup.select_one(".alert.is--info:not(.is--hidden)"):
+        return []
+    links = [a.get("href") for a in soup.select('.product--box .product--detail-btn a') if a.get("href")]
+    if not links:
+        links = [a.get("href") for a in soup.select('.product--box .product--title') if a.get("href")]
+    if not links:
+        return None
+    dbg(f"  Nalezenych produktu: {len(set(links))}")
+    return list(set(links))
+
+
+async def get_listing_urls(page: Page, section_url, page_num, page_size=None):
+    target_url = listing_page_url(section_url, page_num, page_size)
 
     dbg(f"  > Listing str {page_num}: {target_url}")
 
     try:
+        response = None
         try:
-            await page.goto(target_url, timeout=60000, wait_until="domcontentloaded")
+            response = await page.goto(target_url, timeout=60000, wait_until="domcontentloaded")
         except Exception as e:
             dbg(f"Listing load warning (pokračuji): {e}")
 
-        if await check_cloudflare(page):
+        if await check_cloudflare(page, response):
             await dump_page_html(page, f"cloudflare_listing_p{page_num}")
             dbg("FATAL: Listing stránka blokována Cloudflare")
             return []
@@ -516,28 +694,72 @@ async def get_listing_urls(page: Page, section_url, page_num):
         return []
 
 
+def run_http_test() -> bool:
+    """Rychlý test bez browseru: menu sekcí + produktové boxy na 1. straně listingu.
+
+    Vrátí True při úspěchu, False pokud listing nemá produkty ve statickém HTML
+    (vykreslí je až JS) – pak se pokračuje browser testem. Při Cloudflare
+    challenge vyhodí CloudflareBlocked.
+    """
+    print("=== IT-Planet Test (HTTP) ===")
+    session = make_session()
+    soup = get_soup(session, START_URL)
+
+    sections = {}
+    for item in soup.select('.navigation--list .navigation--entry .navigation--link'):
+        title = (item.get("title") or "").strip()
+        href = item.get("href")
+        if not (title and href) or "SupplierModified" in href or "/en/c/" not in href:
+            continue
+        if any(ign in title.lower() for ign in SECTION_IGNORED):
+            continue
+        sections[title] = urljoin(BASE_URL, href)
+    if not sections:
+        raise RuntimeError("Menu sekcí nenalezeno (.navigation--list .navigation--link)")
+
+    sec_name, sec_url = next(iter(sections.items()))
+    listing = get_soup(session, sec_url)
+    links = {a.get("href") for a in listing.select('.product--box .product--detail-btn a') if a.get("href")}
+    if not links:
+        links = {a.get("href") for a in listing.select('.product--box .product--title') if a.get("href")}
+    if not links:
+        print(f"[test] HTTP: listing '{sec_name}' bez produktů ve statickém HTML – zkouším browser")
+        return False
+
+    prod_url = urljoin(BASE_URL, sorted(links)[0])
+    product = get_soup(session, prod_url)
+    row = map_variant_fields(extract_static(product, VARIANT_SCHEMA),
+                             map_base_fields(extract_static(product, BASE_SCHEMA), prod_url))
+    if row['product_name'] == 'N/A':
+        raise RuntimeError(f"Detail produktu bez h1.product--title: {prod_url}")
+    print(f"TEST OK: {len(sections)} sekcí načteno, '{sec_name}': {len(links)} produktů na straně 1, "
+          f"produkt '{row['product_name']}' (SKU: {row['sku']}, cena: {row['price']}) (HTTP)")
+    return True
+
+
 async def run_test():
     print("=== IT-Planet Test ===")
     try:
-        PROXY_URL = "socks5://127.0.0.1:40000"
-        proxy_ok = await test_proxy(PROXY_URL)
-        proxy_cfg = {"server": PROXY_URL} if proxy_ok else None
-        if not proxy_ok:
+        pool = ProxyPool.from_env(log=dbg)
+        await asyncio.to_thread(pool.probe_all)
+        proxy_cfg = playwright_proxy(pool.assign("test"))
+        if not proxy_cfg:
             print("[test] Proxy nedostupná – připojuji přímo")
 
         async with async_playwright() as p:
-            launch_kw = dict(
+            browser, ctx_proxy = await launch_browser(
+                p,
                 headless=True,
                 args=["--disable-gpu", "--disable-blink-features=AutomationControlled", "--no-sandbox"],
+                proxy_cfg=proxy_cfg,
             )
-            if proxy_cfg:
-                launch_kw["proxy"] = proxy_cfg
-            browser = await p.chromium.launch(**launch_kw)
-            context = await browser.new_context(
+            context = await browser.new_context(**context_kwargs(
+                ctx_proxy,
                 viewport={"width": 1600, "height": 1000},
                 user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36",
-            )
+            ))
             await context.add_init_script(STEALTH_JS)
+            await ResourcePolicy("it-planet").install(context)
 
             sections = await get_sections(context)
             if not sections:
@@ -560,25 +782,48 @@ async def run_test():
         sys.exit(1)
 
 
-async def test_proxy(proxy_url: str) -> bool:
-    """Otestuje dostupnost SOCKS5 proxy jednoduchým TCP spojením."""
-    import socket
+# === SONDA ENGINE (--probe-engine) ===
+async def run_engine_probe(context, sections):
+    """Porovná HTTP / browser bez JS / plný render na vzorku listingů (engine_profile.json).
+
+    Detail se nesonduje – varianty potřebují browser (?number=, klikání).
+    """
+    session = await asyncio.to_thread(make_session, True, 4, "it-planet")
+    nojs = await context.sibling(java_script_enabled=False)
     try:
-        host, port = proxy_url.replace("socks5://", "").split(":")
-        s = socket.create_connection((host, int(port)), timeout=3)
-        s.close()
-        return True
-    except Exception:
-        return False
+        sec_urls = list(sections.values())[:SAMPLE_SIZE]
+        await probe("it-planet", "listing", sec_urls, CARD_SCHEMA, context, nojs,
+                    lambda u: get_soup(session, u, timeout=30), log=dbg)
+    finally:
+        await nojs.close()
 
 
 # === MAIN ===
 async def main():
+    sampling_profiler.watch(dbg)
     if '--test' in sys.argv:
+        if '--browser' not in sys.argv:
+            try:
+                if await asyncio.to_thread(run_http_test):
+                    sys.exit(0)
+            except CloudflareBlocked as e:
+                print(f"[test] {e} – zkouším browser")
+            except Exception as e:
+                print(f"TEST ERROR: {e}")
+                sys.exit(1)
         await run_test()
         return
 
     print("=== IT-Planet Scraper ===")
+    listing_only = '--listing-only' in sys.argv
+    NAV_HEDGE.enabled = '--hedge' in sys.argv
+    if '--trace-calls' in sys.argv:
+        TRACER.enable("it-planet")
+    parts_file = parts_arg(sys.argv)
+    if parts_file:
+        print(f"Režim: vyhledání part numberů ze souboru {parts_file}")
+    elif listing_only:
+        print("Režim: jen listing (karty produktů, bez detailů)")
 
     out_name = "it-planet_data.csv"
 
@@ -588,44 +833,113 @@ async def main():
     headless_input = input("Headless režim? (ano/ne, enter=ano): ").strip().lower()
     headless = headless_input != "ne"
 
-    PROXY_URL = "socks5://127.0.0.1:40000"
-    proxy_ok = await test_proxy(PROXY_URL)
-    if proxy_ok:
-        print(f"Proxy {PROXY_URL} dostupná – používám.")
-        proxy_cfg = {"server": PROXY_URL}
+    # Proxy z poolu (SCRAPER_PROXIES); žádná použitelná = přímé připojení
+    pool = ProxyPool.from_env(log=dbg)
+    await asyncio.to_thread(pool.probe_all)
+    proxy_url = ProxyLanes.first_proxy(pool, "it-planet")
+    if proxy_url:
+        print(f"Proxy {proxy_url} dostupná – používám.")
     else:
-        print(f"Proxy {PROXY_URL} nedostupna - pripojuji primo.")
-        proxy_cfg = None
+        print("Žádná proxy nedostupná - pripojuji primo.")
 
     async with async_playwright() as p:
-        launch_kwargs = dict(
-            headless=headless,
-            args=[
-                "--disable-gpu",
-                "--disable-blink-features=AutomationControlled",
-                "--no-sandbox",
-                "--disable-dev-shm-usage",
-            ],
-        )
-        if proxy_cfg:
-            launch_kwargs["proxy"] = proxy_cfg
-
-        browser = await p.chromium.launch(**launch_kwargs)
-        context = await browser.new_context(
-            viewport={"width": 1600, "height": 1000},
-            user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36",
-            extra_http_headers={
-                "Accept-Language": "en-US,en;q=0.9",
-                "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8",
-            },
+        async def launch():
+            br, _ = await launch_browser(
+                p,
+                headless=headless,
+                args=[
+                    "--disable-gpu",
+                    "--disable-blink-features=AutomationControlled",
+                    "--no-sandbox",
+                    "--disable-dev-shm-usage",
+                ],
+                proxy_cfg=playwright_proxy(proxy_url),
+                per_context_proxy=True,  # proxy per kontext – lanes a failover bez restartu browseru
+                log=dbg,
+            )
+            return br
+
+        browser = await launch()
+        policy = ResourcePolicy("it-planet")
+
+        def context_for(proxy):
+            """``(factory, on_retire)`` kontextu přes danou proxy (URL, None = přímo)."""
+            cfg = playwright_proxy(proxy)
+
+            async def new_scrape_context(br, **extra):
+                state = BrowserState("it-planet", cfg)
+                seed = state.kwargs(dbg)
+                ctx = await br.new_context(**context_kwargs(
+                    cfg,
+                    viewport={"width": 1600, "height": 1000},
+                    user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36",
+                    extra_http_headers={
+                        "Accept-Language": "en-US,en;q=0.9",
+                        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8",
+                    },
+                    **seed,
+                    **extra,
+                ))
+                state.attach(ctx, seed)
+                await ctx.add_init_script(STEALTH_JS)
+                await policy.install(ctx)
+                return ctx
+
+            return new_scrape_context, lambda old: BrowserState("it-planet", cfg).save(old, dbg)
+
+        factory, on_retire = context_for(proxy_url)
+        context = ManagedContext(
+            browser,
+            await factory(browser),
+            factory=factory,
+            launch=launch,
+            on_retire=on_retire,
+            log=dbg,
         )
-        await context.add_init_script(STEALTH_JS)
+        # Workery rozložené po exitech poolu; ban (Cloudflare, 429) / výpadek přesune jen dotčené kontexty
+        lanes = ProxyLanes(context, context_for, pool, "it-planet", proxy_url, log=dbg)
+        await lanes.start(max_concurrent)
+
+        async def scrape_lane(u, semaphore, retries=None):
+            # Při chybě proxy se produkt zopakuje v kontextu s jinou proxy, pak se odloží do fronty
+            try:
+                return await lanes.run(lambda ctx: scrape_product(ctx, u, semaphore, retries),
+                                       ProxyConnectionError)
+            except ProxyConnectionError as e:
+                if retries is None or not retries.defer(u, str(e)):
+                    dbg(f"CHYBA: {e}")
+                    events.error(u, e)
+                return [], u
+
+        if parts_file:
+            semaphore = worker_slots("it-planet", max_concurrent)
+            await run_part_lookup(
+                load_parts(parts_file),
+                lambda pn: browser_search(context, SEARCH_URL.format(quote_plus(pn)),
+                                          '.product--box a.product--title', 'h1.product--title'),
+                lambda urls: supervised_batches(context, urls, lambda u: scrape_lane(u, semaphore), log=dbg),
+                CsvWriter(out_name), NegativeCache("it-planet"), concurrency=max_concurrent, log=dbg,
+            )
+            await context.save_state()
+            policy.report(dbg)
+            NAV_HEDGE.report(dbg)
+            TRACER.report(dbg)
+            lanes.stop()
+            await context.browser.close()
+            return
 
         try:
             sections = await get_sections(context)
         except Exception as e:
             print(f"Chyba menu: {e}")
-            await browser.close()
+            lanes.stop()
+            await context.browser.close()
+            return
+
+        if '--probe-engine' in sys.argv:
+            await run_engine_probe(context, sections)
+            lanes.stop()
+            await context.browser.close()
             return
 
         names = list(sections.keys())
@@ -649,7 +963,8 @@ async def main():
 
         if not selected:
             print("Nic nevybráno.")
-            await browser.close()
+            lanes.stop()
+            await context.browser.close()
             return
 
         # Načtení progressu
@@ -669,8 +984,30 @@ async def main():
         resume_done_urls = set(progress.get('done_urls', [])) if progress and start_sec_name else set()
         is_on_resume_page = start_sec_name is not None
 
+        # Velikost stránky listingu: při resume ta uložená (čísla stránek na ní závisí),
+        # jinak největší, kterou web přijme
+        if start_sec_name is not None:
+            page_size = progress.get('page_size')
+        else:
+            probe_page = await context.new_page()
+            try:
+                first_url = sections[selected[0]]
+                page_size = await discover_page_size(
+                    lambda size: _count_listing(probe_page, first_url, size), log=dbg)
+            finally:
+                await probe_page.close()
+
         writer = CsvWriter(out_name)
-        semaphore = asyncio.Semaphore(max_concurrent)
+        semaphore = worker_slots("it-planet", max_concurrent)
+        retries = RetryQueue("it-planet", log=dbg)
+
+        # Listing přes HTTP, pokud sonda (--probe-engine) ověřila, že stačí; karty (--listing-only) vždy browserem
+        listing_session = None
+        if LISTING_ENGINE.load() == "http" and not listing_only:
+            listing_session = await asyncio.to_thread(make_session, True, 4, "it-planet")
+
+        def scrape(u):
+            return scrape_lane(u, semaphore, retries)
 
         total_cnt = 0
         skip_to_sec = start_sec_name is not None
@@ -691,7 +1028,23 @@ async def main():
             start_page = 1
 
             while True:
-                urls = await get_listing_urls(page_obj, sec_url, curr_page)
+                # Obnova po pádu / recyklace kontextu jen mezi stranami – produkty předchozí strany jsou hotové
+                page_obj = await context.checkpoint(page_obj)
+
+                t_listing = time.monotonic()
+                try:
+                    urls = None
+                    if listing_session is not None and LISTING_ENGINE.engine == "http":
+                        urls = await asyncio.to_thread(get_listing_urls_static, listing_session,
+                                                       sec_url, curr_page, page_size)
+                    if urls is None:
+                        urls = await get_listing_urls(page_obj, sec_url, curr_page, page_size)
+                except Exception:
+                    if not context.crashed:
+                        raise
+                    print("  > Browser spadl při načítání listingu – obnovuji a opakuji stranu...")
+                    continue
+                events.timing("listing", t_listing)
                 if not urls:
                     print(f"  > Konec {sec_name} (str {curr_page} bez produktů)")
                     break
@@ -709,28 +1062,61 @@ async def main():
                 else:
                     print(f"  > Strana {curr_page}: {len(urls)} produktů. Zpracovávám...")
 
-                if filtered:
-                    tasks = []
-                    for u in filtered:
-                        tasks.append(asyncio.create_task(scrape_product(context, u, semaphore)))
+                page_done = skipped
+                sec_idx = selected.index(sec_name)
+
+                if listing_only:
+                    card_rows = [(u, r) for u, r in await listing_card_rows(page_obj, sec_name) if u not in done_urls_page]
+                    writer.write([r for _, r in card_rows])
+                    total_cnt += len(card_rows)
+                    events.rows(len(card_rows))
+                    events.progress(sec_name, curr_page, len(urls), len(urls), sec_idx, len(selected))
+                    save_progress(sec_name, curr_page + 1, page_size=page_size)
+                    curr_page += 1
+                    continue
+
+                events.progress(sec_name, curr_page, page_done, len(urls), sec_idx, len(selected))
 
-                    for res in asyncio.as_completed(tasks):
-                        rows, url = await res
+                # K dávce se přidají odložené produkty, které už jsou na řadě
+                due = retries.pop_due()
+                if filtered or due:
+                    # Produkty rozpracované při pádu browseru se po obnově zkusí znovu
+                    async for rows, url in supervised(context, filtered + due, scrape, log=dbg):
+                        if url not in due:
+                            page_done += 1
                         if rows:
+                            retries.discard(url)
                             writer.write(rows)
                             total_cnt += 1
                             done_urls_page.add(url)
-                            save_progress(sec_name, curr_page, done_urls_page)
+                            save_progress(sec_name, curr_page, done_urls_page, page_size)
+                            events.rows(len(rows), url)
+                        events.progress(sec_name, curr_page, page_done, len(urls), sec_idx, len(selected))
 
-                save_progress(sec_name, curr_page + 1)
+                save_progress(sec_name, curr_page + 1, page_size=page_size)
                 curr_page += 1
 
             await page_obj.close()
+            await context.save_state()
             clear_progress()
 
+        if retries:
+            print(f"\n>>> Opakuji {len(retries)} odložených produktů...")
+            async for rows, url in retries.drain(lambda urls: supervised(context, urls, scrape, log=dbg)):
+                if rows:
+                    writer.write(rows)
+                    total_cnt += 1
+                    events.rows(len(rows), url)
+
         print(f"\nHOTOVO. Celkem: {total_cnt}")
+        await context.save_state()
+        policy.report(dbg)
+        NAV_HEDGE.report(dbg)
+        TRACER.report(dbg)
+        retries.report(dbg)
         clear_progress()
-        await browser.close()
+        lanes.stop()
+        await context.browser.close()
 
 
 if __name__ == "__main__":
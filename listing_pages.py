@@ -0,0 +1,63 @@
+"""Největší přijatá velikost stránky listingu.
+
+Shopware umí delší stránky listingu parametrem (``limit`` v SW6, ``n`` v SW5).
+Objevení: 1. strana s výchozí velikostí → počet produktů, pak kandidáti
+sestupně – první, který vrátí víc produktů než výchozí stránka, vyhrává.
+Když žádný neprojde (web parametr ignoruje), zůstává výchozí velikost (None).
+
+Čísla stránek v progress souborech platí jen pro stejnou velikost, proto
+se ukládá i ``page_size`` a při resume se znovu neobjevuje.
+"""
+
+from urllib.parse import urlparse, urlunparse, urlencode, parse_qsl
+
+PAGE_SIZE_CANDIDATES = (96, 72, 48)
+
+
+def with_page_size(url: str, param: str, size) -> str:
+    """Doplní do URL parametr velikosti stránky (None = výchozí velikost webu)."""
+    if not size:
+        return url
+    parsed = urlparse(url)
+    q = dict(parse_qsl(parsed.query))
+    q[param] = str(size)
+    return urlunparse(parsed._replace(query=urlencode(q, doseq=True)))
+
+
+def _discover(candidates, log):
+    """Logika objevení bez I/O: vydává velikosti k otestování (None = výchozí),
+    přes ``send()`` dostává počty produktů na 1. straně a vrátí vybranou velikost."""
+    default = yield None
+    if not default:
+        return None
+    for size in candidates:
+        if size <= default:
+            break
+        n = yield size
+        if n and n > default:
+            log(f"[listing] Velikost stránky {size} přijata ({n} produktů místo {default})")
+            return size
+    log(f"[listing] Větší stránky nepodporovány – výchozí velikost ({default} produktů)")
+    return None
+
+
+async def discover_page_size(count_items, candidates=PAGE_SIZE_CANDIDATES, log=print):
+    """``count_items(size)`` vrátí počet produktů na 1. straně (size None = výchozí)."""
+    steps = _discover(candidates, log)
+    size = next(steps)
+    try:
+        while True:
+            size = steps.send(await count_items(size))
+    except StopIteration as done:
+        return done.value
+
+
+def discover_page_size_sync(count_items, candidates=PAGE_SIZE_CANDIDATES, log=print):
+    """Synchronní varianta ``discover_page_size`` pro requests scrapery."""
+    steps = _discover(candidates, log)
+    size = next(steps)
+    try:
+        while True:
+            size = steps.send(count_items(size))
+    except StopIteration as done:
+        return done.value
@@ -0,0 +1,138 @@
+"""Víc Playwright scraperů v jednom procesu nad jedním browserem.
+
+Každý web jako samostatný proces má vlastní Chromium, interpret
+a event loop (tři Chromia ≈ o 1 GB víc než jedno se třemi kontexty).
+Tento runner načte scrapery jako moduly a spustí jejich ``main()``
+souběžně v jednom event loopu:
+
+- jeden headless Chromium bez proxy (``shared_browser.share_in_process``),
+  každý web si v něm otevírá vlastní kontexty s vlastní proxy,
+- společný rozpočet workerů s férovým přidělováním slotů mezi weby
+  (``worker_budget.py``); počet workerů ze vstupu webu je jeho strop,
+- odpovědi na ``input()`` se berou ze seznamu per web (jako stdin
+  z Manageru), výpisy mají prefix ``[web]``.
+
+Použití::
+
+    python multi_site.py smicro it-planet it-market --budget 6
+    python multi_site.py smicro="3;vse;ne" it-market="ano;4;;vše;ne" --listing-only
+
+Přepínače scraperů (``--listing-only``, ``--hedge``, ``--parts``…) platí
+pro všechny weby. Headful běh (odpověď ``ne`` na headless) si spustí
+vlastní browser jako dřív.
+"""
+
+import asyncio
+import builtins
+import importlib.util
+import os
+import sys
+import time
+from pathlib import Path
+
+from playwright.async_api import async_playwright
+
+import shared_browser
+import worker_budget
+
+BASE_DIR = Path(__file__).resolve().parent
+
+# web -> (skript, výchozí odpovědi na input() v pořadí dotazů – stejné jako výchozí hodnoty Manageru)
+SITES = {
+    "smicro": ("smicroScrapePlayWright.py", ["2", "vse", "ne"]),
+    "it-planet": ("it-planetScrapePlayWright.py", ["3", "ano", "vse", "ne"]),
+    "it-market": ("it-marketScrapePlayWright.py", ["ano", "5", "", "vše", "ne"]),
+}
+DEFAULT_BUDGET = int(os.environ.get("SCRAPER_WORKER_BUDGET", "6"))
+
+
+def load_site(site: str, answers):
+    """Načte skript scraperu jako modul s vlastním ``input()`` a ``print()``."""
+    script, _ = SITES[site]
+    spec = importlib.util.spec_from_file_location(f"site_{site.replace('-', '_')}", BASE_DIR / script)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    queue = list(answers)
+
+    def site_print(*args, **kwargs):
+        builtins.print(f"[{site}]", *args, **kwargs)
+
+    def site_input(prompt=""):
+        answer = queue.pop(0) if queue else ""
+        site_print(f"{prompt.strip()} {answer}")
+        return answer
+
+    # Globály modulu mají přednost před builtins – dbg() i input() v main() použijí tyto
+    module.print = site_print
+    module.input = site_input
+    return module
+
+
+def parse_args(argv):
+    """``(weby s odpověďmi, rozpočet)`` z argumentů; ostatní přepínače zůstávají scraperům."""
+    sites, budget = {}, DEFAULT_BUDGET
+    i = 0
+    while i < len(argv):
+        arg = argv[i]
+        if arg == "--budget" and i + 1 < len(argv):
+            budget = int(argv[i + 1])
+            i += 2
+            continue
+        name, _, answers = arg.partition("=")
+        if name in SITES:
+            sites[name] = answers.split(";") if answers else SITES[name][1]
+        i += 1
+    return sites, budget
+
+
+async def run_site(site, module):
+    t0 = time.monotonic()
+    try:
+        await module.main()
+        return f"OK za {time.monotonic() - t0:.0f} s"
+    except SystemExit as e:
+        return f"ukončen (kód {e.code})"
+    except Exception as e:
+        return f"CHYBA: {e}"
+
+
+async def report_budget(shared, interval=300):
+    while True:
+        await asyncio.sleep(interval)
+        print(f"[multi] Obsazené sloty: {shared.summary()}")
+
+
+async def main():
+    if "--test" in sys.argv:
+        print("--test spouštějte pro každý scraper zvlášť.")
+        sys.exit(1)
+    sites, budget = parse_args(sys.argv[1:])
+    if not sites:
+        print(f"Použití: python multi_site.py {' '.join(SITES)} [--budget N]")
+        sys.exit(1)
+
+    modules = {site: load_site(site, answers) for site, answers in sites.items()}
+    shared = worker_budget.install(budget)
+    print(f"=== Multi-site: {', '.join(modules)} – rozpočet {budget} workerů, jeden browser ===")
+
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=True, args=["--disable-blink-features=AutomationControlled"])
+        shared_browser.share_in_process(browser)
+        monitor = asyncio.create_task(report_budget(shared))
+        try:
+            results = await asyncio.gather(*(run_site(s, m) for s, m in modules.items()))
+        finally:
+            monitor.cancel()
+            shared_browser.share_in_process(None)
+            await browser.close()
+
+    print("\n=== Multi-site hotovo ===")
+    for site, result in zip(modules, results):
+        print(f"  {site}: {result}")
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        print("\nUkončeno.")
@@ -0,0 +1,196 @@
+"""Režim vyhledání konkrétních part numberů / SKU.
+
+Místo procházení celých sekcí se každý part number dohledá vyhledáváním
+e-shopu, stáhnou se jen nalezené detaily a zapíšou se řádky, které part
+number opravdu obsahují. Part numbery bez výsledku se ukládají do
+negativní cache s platností ``NEGATIVE_TTL_H`` hodin, takže opakované
+kontroly stejného seznamu je znovu nehledají.
+"""
+
+import asyncio
+import json
+import os
+import re
+import time
+from pathlib import Path
+
+import scrape_events as events
+
+NEGATIVE_TTL_H = 24
+MAX_HITS_PER_PART = 3   # kolik výsledků vyhledávání se na jeden part number otevře
+CACHE_FILE = Path(__file__).resolve().parent / "part_lookup_cache.json"
+
+
+def normalize(pn: str) -> str:
+    return re.sub(r'[^0-9A-Z]', '', str(pn).upper())
+
+
+def load_parts(path) -> list:
+    """Part numbery ze souboru – jeden na řádek (nebo oddělené , ; mezerou), # = komentář."""
+    parts = []
+    for line in Path(path).read_text(encoding='utf-8-sig').splitlines():
+        line = line.split('#', 1)[0]
+        for pn in re.split(r'[,;\s]+', line):
+            if pn and pn not in parts:
+                parts.append(pn)
+    return parts
+
+
+def parts_arg(argv):
+    """Cesta ze ``--parts SOUBOR`` v argumentech, nebo None."""
+    if '--parts' in argv:
+        i = argv.index('--parts')
+        if i + 1 < len(argv):
+            return argv[i + 1]
+    return None
+
+
+# Odkazy výsledků vyhledávání; pokud e-shop přesměruje rovnou na detail, vrátí se jeho URL
+SEARCH_RESULTS_JS = """
+([linkSel, detailSel]) => ({
+    hrefs: [...document.querySelectorAll(linkSel)].map(a => a.href).filter(Boolean),
+    detail: !!document.querySelector(detailSel),
+})
+"""
+
+
+async def browser_search(context, search_url: str, link_selector: str, detail_selector: str):
+    """Načte stránku vyhledávání v browseru a vrátí URL nalezených produktů."""
+    page = await context.new_page()
+    try:
+        await page.goto(search_url, wait_until="domcontentloaded", timeout=60000)
+        try:
+            await page.wait_for_selector(f"{link_selector}, {detail_selector}", state="attached", timeout=10000)
+        except Exception:
+            pass  # žádný výsledek
+        found = await page.evaluate(SEARCH_RESULTS_JS, [link_selector, detail_selector])
+        if not found["hrefs"] and found["detail"]:
+            return [page.url]
+        return list(dict.fromkeys(found["hrefs"]))
+    finally:
+        await page.close()
+
+
+def row_matches(row, pn: str) -> bool:
+    """True pokud řádek CSV obsahuje part number (porovnání bez mezer, pomlček a velikosti písmen)."""
+    target = normalize(pn)
+    return bool(target) and any(target in normalize(cell) for cell in row if cell)
+
+
+class NegativeCache:
+    """Part numbery bez výsledku per web (JSON ``{web: {pn: čas}}``)."""
+
+    def __init__(self, site: str, path=CACHE_FILE, ttl_h: float = NEGATIVE_TTL_H):
+        self.site = site
+        self.path = Path(path)
+        self.ttl = ttl_h * 3600
+        self.data = {}
+        if self.path.exists():
+            try:
+                self.data = json.loads(self.path.read_text(encoding='utf-8'))
+            except Exception:
+                self.data = {}
+        self.entries = self.data.setdefault(site, {})
+
+    def is_negative(self, pn: str) -> bool:
+        ts = self.entries.get(normalize(pn))
+        return ts is not None and time.time() - ts < self.ttl
+
+    def add(self, pn: str):
+        self.entries[normalize(pn)] = time.time()
+
+    def discard(self, pn: str):
+        self.entries.pop(normalize(pn), None)
+
+    def save(self):
+        now = time.time()
+        self.data[self.site] = {k: v for k, v in self.entries.items() if now - v < self.ttl}
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        tmp.write_text(json.dumps(self.data, ensure_ascii=False), encoding='utf-8')
+        os.replace(tmp, self.path)
+
+
+async def run_part_lookup(parts, search, run, writer, cache: NegativeCache, concurrency=4, log=print):
+    """Dohledá part numbery a zapíše odpovídající řádky.
+
+    Řádky part numberu se zapíšou, jakmile jsou hotové všechny jeho
+    detaily – přerušený běh o již nalezené nepřijde.
+
+    ``search(pn)`` vrací seznam URL výsledků (nejlepší první),
+    ``run(urls)`` vrací async iterátor ``(rows, url)`` – ``supervised``
+    nad ``scrape_product`` scraperu, takže detaily rozpracované při pádu
+    browseru se po obnově zopakují.
+    Vrací ``(nalezené, nenalezené)`` seznamy part numberů.
+    """
+    todo = [pn for pn in parts if not cache.is_negative(pn)]
+    cached = len(parts) - len(todo)
+    log(f"[parts] {len(parts)} part numberů, {cached} v negativní cache (<{NEGATIVE_TTL_H} h) přeskočeno")
+
+    sem = asyncio.Semaphore(concurrency)
+
+    async def resolve(pn):
+        async with sem:
+            try:
+                return pn, (await search(pn))[:MAX_HITS_PER_PART]
+            except Exception as e:
+                log(f"[parts] Vyhledání {pn} selhalo: {e}")
+                events.error(pn, e)
+                return pn, None
+
+    hits = dict(await asyncio.gather(*(resolve(pn) for pn in todo)))
+
+    # Každý detail se stáhne jen jednou, i když ho najde víc part numberů
+    urls = list(dict.fromkeys(u for found in hits.values() if found for u in found))
+    log(f"[parts] Vyhledávání hotovo – {len(urls)} detailů ke stažení")
+    scraped = {}
+    pending = {pn: set(found) for pn, found in hits.items() if found}
+    written = set()   # (URL, řádek) – řádek odpovídající víc part numberům (varianty) se zapíše jednou
+    found, missing = [], []
+
+    def finish(pn):
+        """Part number má hotové všechny detaily – zapíše jeho řádky hned."""
+        if hits.get(pn) is None:
+            missing.append(pn)  # chyba vyhledávání – necachovat
+            return
+        rows = []
+        for u in hits[pn]:
+            for r in scraped.get(u, []):
+                key = (u, tuple(r))
+                if row_matches(r, pn) and key not in written:
+                    written.add(key)
+                    rows.append(r)
+        matched = any(row_matches(r, pn) for u in hits[pn] for r in scraped.get(u, []))
+        if rows:
+            writer.write(rows)
+            events.rows(len(rows), pn)
+        if matched:
+            cache.discard(pn)
+            found.append(pn)
+        else:
+            # Do cache jen jistý negativní výsledek – ne když detail selhal
+            if all(scraped.get(u) for u in hits[pn]):
+                cache.add(pn)
+            missing.append(pn)
+
+    try:
+        for pn in todo:
+            if pn not in pending:
+                finish(pn)  # bez výsledku / chyba vyhledávání
+        done = 0
+        events.progress("Part numbers", 1, 0, len(urls), 0, 1)
+        async for rows, url in run(urls):
+            scraped[url] = rows or []
+            done += 1
+            events.progress("Part numbers", 1, done, len(urls), 0, 1)
+            for pn in [pn for pn, left in pending.items() if url in left]:
+                pending[pn].discard(url)
+                if not pending[pn]:
+                    del pending[pn]
+                    finish(pn)
+    finally:
+        cache.save()
+    missing.extend(pn for pn in parts if pn not in todo)
+    log(f"[parts] Nalezeno {len(found)}, nenalezeno {len(missing)}")
+    if missing:
+        log(f"[parts] Nenalezené: {', '.join(missing)}")
+    return found, missing
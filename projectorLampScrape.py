@@ -9,7 +9,9 @@ import time
 from urllib.parse import urljoin
 from pathlib import Path
 
-WARP_PROXY = {"http": "socks5h://127.0.0.1:40000", "https": "socks5h://127.0.0.1:40000"}
+import scrape_events as events
+from http_client import cloudflare_verdict
+from proxy_pool import default_pool, requests_proxies, is_requests_proxy_error
 SCRIPT_DIR = Path(__file__).resolve().parent
 PROGRESS_FILE = SCRIPT_DIR / "projectorLampProgress.json"
 
@@ -40,10 +42,28 @@ def clear_progress():
         pass
 
 
+def _get(url):
+    """GET přes proxy z poolu (``SCRAPER_PROXIES``); poolu hlásí latenci, výpadek proxy i ban."""
+    pool = default_pool()
+    proxy = pool.assign("projector-lamps")
+    t0 = time.monotonic()
+    try:
+        r = requests.get(url, proxies=requests_proxies(proxy), timeout=30)
+    except requests.exceptions.RequestException as e:
+        if is_requests_proxy_error(e):
+            pool.report(proxy, False)
+        raise
+    if r.status_code == 429 or cloudflare_verdict(r.status_code, r.headers, r.url):
+        pool.ban(proxy, f"HTTP {r.status_code}")
+    else:
+        pool.report(proxy, True, (time.monotonic() - t0) * 1000)
+    return r
+
+
 def ziskej_vyrobce():
     """Získá seznam všech výrobců z hlavní stránky"""
     url = "https://www.myprojectorlamps.eu"
-    response = requests.get(url, proxies=WARP_PROXY)
+    response = _get(url)
     soup = BeautifulSoup(response.content, 'html.parser')
 
     select = soup.find('select', {'id': 'brands-select'})
@@ -61,7 +81,7 @@ def ziskej_vyrobce():
 def ziskej_produkty_vyrobce(vyrobce_nazev):
     """Získá všechny produkty konkrétního výrobce"""
     url = f"https://www.myprojectorlamps.eu/projectors/{vyrobce_nazev}"
-    response = requests.get(url, proxies=WARP_PROXY)
+    response = _get(url)
     soup = BeautifulSoup(response.content, 'html.parser')
 
     select = soup.find('select', {'id': 'lamps-select'})
@@ -78,7 +98,7 @@ def ziskej_produkty_vyrobce(vyrobce_nazev):
 
 def zpracuj_produkt(url, soubor):
     """Zpracuje detail produktu a zapíše data do CSV"""
-    response = requests.get(url, proxies=WARP_PROXY)
+    response = _get(url)
     soup = BeautifulSoup(response.content, 'html.parser')
 
     tech_info = soup.find('div', class_='product-table-tech-info')
@@ -190,7 +210,7 @@ def main():
     skip_to_brand = start_brand is not None
 
     # Zpracování vybraných výrobců
-    for vyrobce in vybrani_vyrobci:
+    for brand_idx, vyrobce in enumerate(vybrani_vyrobci):
         if skip_to_brand:
             if vyrobce['nazev'] != start_brand:
                 print(f"  (přeskakuji: {vyrobce['nazev']})")
@@ -208,14 +228,26 @@ def main():
         if skipped:
             print(f"  ({skipped} produktů přeskočeno – již hotovo)")
 
+        brand_done = skipped
+        events.progress(vyrobce['nazev'], 1, brand_done, len(produkty), brand_idx, len(vybrani_vyrobci))
         for produkt_url in produkty:
             if produkt_url in done_urls:
                 continue
             print(f"  Zpracovávám {produkt_url}")
-            uspech = zpracuj_produkt(produkt_url, soubor)
+            t0 = time.monotonic()
+            try:
+                uspech = zpracuj_produkt(produkt_url, soubor)
+            except Exception as e:
+                events.error(produkt_url, e)
+                raise
+            events.timing("product", t0)
+            brand_done += 1
             if uspech:
                 done_urls.add(produkt_url)
                 save_progress(vyrobce['nazev'], done_urls)
+                events.rows(1, produkt_url)
+            events.progress(vyrobce['nazev'], 1, brand_done, len(produkty), brand_idx, len(vybrani_vyrobci))
+            if uspech:
                 time.sleep(1)
 
     clear_progress()
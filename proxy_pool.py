@@ -0,0 +1,230 @@
+"""Pool proxy (SOCKS/HTTP) se skóre zdraví a latence a lepivým přiřazením.
+
+Seznam proxy bere z ``SCRAPER_PROXIES`` (výchozí lokální WARP), klíč
+dostane proxy váženým rendezvous hashováním; žádná použitelná proxy =
+None = přímé připojení. Popis viz README, „Proxy / WARP“.
+"""
+
+import hashlib
+import math
+import os
+import threading
+import time
+
+PROXIES_ENV = "SCRAPER_PROXIES"
+DEFAULT_PROXIES = "socks5://127.0.0.1:40000"
+MAX_FAIL_STREAK = 3        # tolik selhání po sobě = proxy mimo hru do další sondy
+REPROBE_INTERVAL_S = 60    # líná sonda vyřazených proxy nejvýš jednou za tuto dobu
+PROBE_URL = os.environ.get("SCRAPER_PROXY_PROBE_URL", "http://www.gstatic.com/generate_204")
+PROBE_TIMEOUT_S = 5.0
+BAN_COOLDOWN_S = 15 * 60   # ban (Cloudflare, 403/429) = proxy se na tuto dobu nepoužije
+LATENCY_ALPHA = 0.2        # váha nového měření v klouzavém průměru latence
+DEFAULT_LATENCY_MS = 500.0
+SLOW_FACTOR = 3.0          # lepivá proxy se opustí, je-li tolikrát pomalejší než nejlepší
+# Chyby, za které může proxy (ne cílový web) – jen ty se počítají do zdraví proxy
+PROXY_ERROR_MARKERS = ("ERR_PROXY", "ERR_SOCKS", "ERR_TUNNEL_CONNECTION_FAILED")
+
+
+class _Proxy:
+    def __init__(self, url: str):
+        self.url = url
+        self.healthy = True
+        self.latency_ms = DEFAULT_LATENCY_MS
+        self.fail_streak = 0
+        self.cooldown_until = 0.0
+        self.ok = 0
+        self.failed = 0
+
+    def usable(self, now) -> bool:
+        return self.healthy and now >= self.cooldown_until
+
+    def weight(self) -> float:
+        return 1.0 / (max(self.latency_ms, 1.0) * (1 + self.fail_streak))
+
+
+def _probe_latency_ms(url: str, timeout: float = PROBE_TIMEOUT_S):
+    """Latence skutečného HTTP dotazu přes proxy (ms), nebo None pokud neprojde.
+
+    Samotné TCP spojení nestačí – WARP naslouchá, i když je tunel mrtvý.
+    """
+    import requests
+    t0 = time.monotonic()
+    try:
+        r = requests.get(PROBE_URL, proxies=requests_proxies(url), timeout=timeout, allow_redirects=False)
+    except requests.exceptions.RequestException:
+        return None
+    if r.status_code >= 500:
+        return None
+    return (time.monotonic() - t0) * 1000
+
+
+def _hash_unit(key: str, url: str) -> float:
+    h = hashlib.blake2b(f"{key}|{url}".encode(), digest_size=8).digest()
+    return (int.from_bytes(h, "big") + 1) / (2 ** 64 + 2)
+
+
+class ProxyPool:
+    def __init__(self, urls, log=print):
+        self._log = log
+        self._lock = threading.Lock()
+        self.proxies = {u: _Proxy(u) for u in urls}
+        self.assignments = {}
+        self._probed_at = 0.0
+
+    @classmethod
+    def from_env(cls, log=print):
+        raw = os.environ.get(PROXIES_ENV) or DEFAULT_PROXIES
+        return cls([u.strip() for u in raw.split(",") if u.strip()], log=log)
+
+    # === zdraví ===
+
+    def probe_all(self, proxies=None):
+        """Sonda všech (nebo zadaných) proxy dotazem přes ně – obnoví zdraví a latenci (blokující)."""
+        self._probed_at = time.monotonic()
+        for p in self.proxies.values() if proxies is None else proxies:
+            ms = _probe_latency_ms(p.url)
+            with self._lock:
+                if ms is None:
+                    p.healthy = False
+                else:
+                    p.healthy = True
+                    p.fail_streak = 0
+                    p.latency_ms = ms if p.ok + p.failed == 0 else \
+                        (1 - LATENCY_ALPHA) * p.latency_ms + LATENCY_ALPHA * ms
+        self._log(f"[proxy] {self.summary()}")
+
+    def reprobe_due(self, interval: float = REPROBE_INTERVAL_S):
+        """Líná sonda: vyřazené proxy se znovu otestují, nejvýš jednou za ``interval`` s."""
+        now = time.monotonic()
+        with self._lock:
+            down = [p for p in self.proxies.values() if not p.healthy]
+            if not down or now - self._probed_at < interval:
+                return
+            self._probed_at = now  # ostatní vlákna mezitím sondu nespouštějí
+        self.probe_all(down)
+
+    def report(self, url, ok: bool, latency_ms: float = None):
+        """Výsledek požadavku přes proxy; ``url`` None (přímo) se ignoruje."""
+        p = self.proxies.get(url)
+        if p is None:
+            return
+        with self._lock:
+            if ok:
+                p.ok += 1
+                p.fail_streak = 0
+                if latency_ms is not None:
+                    p.latency_ms = (1 - LATENCY_ALPHA) * p.latency_ms + LATENCY_ALPHA * latency_ms
+            else:
+                p.failed += 1
+                p.fail_streak += 1
+                if p.fail_streak >= MAX_FAIL_STREAK and p.healthy:
+                    p.healthy = False
+                    self._log(f"[proxy] {url} vyřazena po {p.fail_streak} selháních")
+
+    def mark_down(self, url, reason: str = "nedostupná"):
+        """Proxy neodpovídá – mimo hru do další úspěšné sondy (``probe_all``)."""
+        p = self.proxies.get(url)
+        if p is None:
+            return
+        with self._lock:
+            p.failed += 1
+            p.healthy = False
+        self._log(f"[proxy] {url} {reason} – vyřazena do další sondy")
+
+    def usable(self, url) -> bool:
+        """Proxy je zdravá a bez banu (``None`` = přímo, vždy použitelné)."""
+        p = self.proxies.get(url)
+        return p is None or p.usable(time.time())
+
+    def ban(self, url, reason: str = "ban"):
+        """Exit dostal ban / challenge – na ``BAN_COOLDOWN_S`` se nepoužije."""
+        p = self.proxies.get(url)
+        if p is None:
+            return
+        with self._lock:
+            p.cooldown_until = time.time() + BAN_COOLDOWN_S
+        self._log(f"[proxy] {url}: {reason} – pauza {BAN_COOLDOWN_S // 60} min")
+
+    # === přiřazení ===
+
+    def assign(self, key: str, exclude=()):
+        """Proxy URL pro klíč (lepivě); None = přímé připojení (žádná použitelná proxy)."""
+        now = time.time()
+        with self._lock:
+            current = self.assignments.get(key)
+            candidates = [p for p in self.proxies.values() if p.url not in exclude and p.usable(now)]
+            if current in self.proxies and self.proxies[current] in candidates:
+                fastest = min(p.latency_ms for p in candidates)
+                if self.proxies[current].latency_ms <= SLOW_FACTOR * fastest:
+                    return current
+            best, best_score = None, -1.0
+            for p in candidates:
+                # vážené rendezvous hashování: stejný klíč → stejná proxy, rychlejší proxy víc klíčů
+                score = p.weight() / -math.log(_hash_unit(key, p.url))
+                if score > best_score:
+                    best, best_score = p.url, score
+            self.assignments[key] = best
+        if best != current and current is not None:
+            self._log(f"[proxy] {key}: {current} → {best or 'přímo'}")
+        return best
+
+    def summary(self) -> str:
+        now = time.time()
+        parts = []
+        for p in self.proxies.values():
+            state = "OK" if p.usable(now) else ("ban" if p.healthy else "mimo")
+            parts.append(f"{p.url} {state} {p.latency_ms:.0f} ms")
+        return ", ".join(parts) or "žádné proxy"
+
+
+def is_proxy_error(err) -> bool:
+    """True pokud chyba navigace ukazuje na proxy (spojení, SOCKS, tunel), ne na web."""
+    text = str(err)
+    return any(m in text for m in PROXY_ERROR_MARKERS)
+
+
+def is_requests_proxy_error(err) -> bool:
+    """True pokud chyba ``requests`` vznikla na spojení s proxy, ne na pomalém/padajícím webu.
+
+    Timeout čtení nebo přerušená odpověď jde za cílovým webem a zdraví
+    proxy nesnižuje.
+    """
+    from requests.exceptions import ConnectionError, ConnectTimeout, ProxyError
+    if isinstance(err, (ProxyError, ConnectTimeout)):
+        return True
+    # SOCKS: nedostupná proxy i selhaný handshake končí jako NewConnectionError
+    return isinstance(err, ConnectionError) and "Failed to establish a new connection" in str(err)
+
+
+def playwright_proxy(url):
+    """``{"server": url}`` pro Playwright, None pro přímé připojení."""
+    return {"server": url} if url else None
+
+
+def requests_proxies(url):
+    """Slovník proxies pro requests; u SOCKS5 se DNS řeší přes proxy (socks5h)."""
+    if not url:
+        return None
+    if url.startswith("socks5://"):
+        url = "socks5h://" + url[len("socks5://"):]
+    return {"http": url, "https": url}
+
+
+_default_pool = None
+_default_lock = threading.Lock()
+
+
+def default_pool(log=print) -> ProxyPool:
+    """Sdílený pool procesu (z ``SCRAPER_PROXIES``).
+
+    Při prvním použití se otestuje celý, pak se vyřazené proxy líně
+    sondují znovu (``reprobe_due``), aby se po výpadku vrátily do hry.
+    """
+    global _default_pool
+    with _default_lock:
+        if _default_pool is None:
+            _default_pool = ProxyPool.from_env(log=log)
+            _default_pool.probe_all()
+            return _default_pool
+    _default_pool.reprobe_due()
+    return _default_pool
@@ -0,0 +1,213 @@
+"""Trasování volání Playwright API – kolik volání a kolik času, odkud a nad čím.
+
+Opt-in (``--trace-calls``): ``ManagedContext.new_page`` vrací ``TracedPage``,
+který měří každé awaitované volání stránky a jejích lokátorů; ``report()``
+na konci běhu vypíše nejdražší volání a rozpis uloží do ``pw_trace/``.
+"""
+
+import contextvars
+import inspect
+import json
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent
+TRACE_DIR = BASE_DIR / "pw_trace"
+# Sdílené moduly – původ volání se doplní o funkci scraperu, která je volala
+HELPER_MODULES = {"extract_schema.py", "hedge.py", "part_lookup.py", "listing_pages.py",
+                  "context_pool.py", "engine_probe.py", "shopware_api.py"}
+NO_SELECTOR = {"goto", "wait_for_timeout", "reload", "go_back", "title", "content", "close",
+               "wait_for_load_state", "screenshot", "set_content", "route", "unroute"}
+REPORT_TOP = 15
+
+_current = contextvars.ContextVar("pw_trace_product", default=None)
+_site = contextvars.ContextVar("pw_trace_site", default=None)
+
+
+def _origin() -> str:
+    """Funkce scraperu, ze které volání přišlo (u sdílených modulů ``volající>funkce``)."""
+    inner = None
+    f = sys._getframe(1)
+    while f is not None:
+        path = Path(f.f_code.co_filename)
+        if path.parent == BASE_DIR and path.name != "pw_tracer.py":
+            if inner is None:
+                inner = f.f_code.co_name
+                if path.name not in HELPER_MODULES:
+                    return inner
+            elif path.name not in HELPER_MODULES:
+                return f"{f.f_code.co_name}>{inner}"
+        f = f.f_back
+    return inner or "?"
+
+
+def _is_locator(obj) -> bool:
+    return type(obj).__name__ == "Locator"
+
+
+def _describe(name, args) -> str:
+    if name == "locator" and args:
+        return str(args[0])
+    if name == "nth":
+        return "nth=*"  # prvky seznamu se sčítají dohromady
+    first = f"({args[0]!r})" if args else ""
+    return f"{name}{first}"
+
+
+class _Traced:
+    def __init__(self, tracer, raw, selector=None, trace=None):
+        self._tracer = tracer
+        self._raw = raw
+        self._sel = selector
+        self._trace = trace    # _SiteTrace webu, který stránku otevřel
+
+    def _selector_for(self, name, args):
+        if self._sel is not None:
+            return self._sel
+        if name == "evaluate" and args:
+            return "js:" + " ".join(str(args[0]).split())[:40]
+        if name not in NO_SELECTOR and args and isinstance(args[0], str):
+            return args[0]
+        return None
+
+    def _child(self, part):
+        return f"{self._sel} >> {part}" if self._sel else part
+
+    def _wrap_result(self, name, args, result):
+        if _is_locator(result):
+            return TracedLocator(self._tracer, result, self._child(_describe(name, args)), self._trace)
+        if isinstance(result, list) and result and all(_is_locator(r) for r in result):
+            return [TracedLocator(self._tracer, r, self._child("nth=*"), self._trace) for r in result]
+        return result
+
+    async def _call(self, origin, name, attr, args, kwargs):
+        t0 = time.perf_counter()
+        try:
+            result = await attr(*args, **kwargs)
+        finally:
+            self._tracer.record(self._trace, origin, name, self._selector_for(name, args), time.perf_counter() - t0)
+        return self._wrap_result(name, args, result)
+
+    def __getattr__(self, name):
+        attr = getattr(self._raw, name)
+        if _is_locator(attr):  # .first / .last
+            return TracedLocator(self._tracer, attr, self._child(name), self._trace)
+        if inspect.iscoroutinefunction(attr):
+            def traced(*args, **kwargs):
+                # Původ se určí hned při volání – coroutina může běžet až v jiném tasku (hedge)
+                return self._call(_origin(), name, attr, args, kwargs)
+            return traced
+        if callable(attr):
+            def passthrough(*args, **kwargs):
+                return self._wrap_result(name, args, attr(*args, **kwargs))
+            return passthrough
+        return attr
+
+
+class TracedPage(_Traced):
+    """Obal ``Page`` – identita stránky pro volajícího je tento objekt."""
+
+
+class TracedLocator(_Traced):
+    pass
+
+
+class _SiteTrace:
+    def __init__(self):
+        self.totals = {}       # (původ, metoda, selektor) -> [počet, s, max s]
+        self.products = []     # (url, wall s, trasované s, počet volání, nejdražší klíč)
+
+
+class CallTracer:
+    """Jeden tracer na proces, agregace per web.
+
+    Web se bere z ``contextvars`` nastavené v ``enable()`` – scraper ji
+    volá v ``main()``, takže pod ``multi_site.py`` (každý ``main()``
+    vlastní task) se volání webů nemíchají.
+    """
+
+    def __init__(self):
+        self.sites = {}        # web -> _SiteTrace
+
+    def _trace(self):
+        return self.sites.get(_site.get())
+
+    @property
+    def enabled(self) -> bool:
+        return self._trace() is not None
+
+    def enable(self, site: str):
+        _site.set(site)
+        self.sites.setdefault(site, _SiteTrace())
+
+    def wrap(self, page):
+        trace = self._trace()
+        return TracedPage(self, page, trace=trace) if trace is not None else page
+
+    def record(self, trace, origin, method, selector, dt):
+        key = (origin, method, selector)
+        for stats in (trace.totals, _current.get()):
+            if stats is None:
+                continue
+            s = stats.get(key)
+            if s is None:
+                stats[key] = [1, dt, dt]
+            else:
+                s[0] += 1
+                s[1] += dt
+                s[2] = max(s[2], dt)
+
+    def for_product(self, scrape):
+        """Obalí ``scrape(url)`` tak, aby se volání sčítala i per produkt."""
+        trace = self._trace()
+        if trace is None:
+            return scrape
+
+        async def run(url):
+            token = _current.set({})
+            t0 = time.perf_counter()
+            try:
+                return await scrape(url)
+            finally:
+                stats = _current.get()
+                _current.reset(token)
+                top = max(stats.items(), key=lambda kv: kv[1][1], default=(None, None))[0]
+                trace.products.append((url, time.perf_counter() - t0, sum(s[1] for s in stats.values()),
+                                       sum(s[0] for s in stats.values()), top))
+        return run
+
+    def report(self, log=print):
+        site = _site.get()
+        trace = self.sites.get(site)
+        if trace is None:
+            return
+        n = max(len(trace.products), 1)
+        total_s = sum(s[1] for s in trace.totals.values())
+        log(f"[trace] {site}: {sum(s[0] for s in trace.totals.values())} volání, {total_s:.1f} s, "
+            f"{len(trace.products)} produktů")
+        ranked = sorted(trace.totals.items(), key=lambda kv: kv[1][1], reverse=True)
+        for (origin, method, selector), (count, secs, worst) in ranked[:REPORT_TOP]:
+            log(f"[trace]   {secs / total_s * 100 if total_s else 0:5.1f} %  {secs / n * 1000:8.0f} ms/produkt  "
+                f"{count / n:6.1f}×/produkt  max {worst * 1000:6.0f} ms  {origin}: {method}({selector or ''})")
+        for url, wall, traced, calls, top in sorted(trace.products, key=lambda p: p[1], reverse=True)[:5]:
+            log(f"[trace]   pomalý produkt {wall:.1f} s ({calls} volání, {traced:.1f} s v API, "
+                f"nejvíc {top[0]}: {top[1]}) {url}" if top else f"[trace]   pomalý produkt {wall:.1f} s {url}")
+        self._save(site, trace)
+
+    def _save(self, site, trace):
+        TRACE_DIR.mkdir(exist_ok=True)
+        path = TRACE_DIR / f"{site}-{time.strftime('%Y%m%d-%H%M%S')}.json"
+        out = {
+            "site": site,
+            "products": len(trace.products),
+            "calls": [{"origin": o, "method": m, "selector": s, "count": c, "total_ms": round(t * 1000, 1),
+                       "max_ms": round(w * 1000, 1)}
+                      for (o, m, s), (c, t, w) in sorted(trace.totals.items(), key=lambda kv: kv[1][1], reverse=True)],
+            "slowest_products": [{"url": u, "wall_ms": round(w * 1000), "api_ms": round(t * 1000), "calls": c}
+                                 for u, w, t, c, _ in sorted(trace.products, key=lambda p: p[1], reverse=True)[:50]],
+        }
+        path.write_text(json.dumps(out, ensure_ascii=False, indent=1), encoding='utf-8')
+
+
+TRACER = CallTracer()
@@ -0,0 +1,137 @@
+"""Sdílená politika blokování zdrojů pro Playwright kontexty.
+
+Pravidla se instalují jednou na celý ``BrowserContext`` (``context.route``),
+ne na každou stránku zvlášť. Každý web má vlastní sadu pravidel v ``RULESETS``:
+
+    domains       – first-party domény webu
+    block_types   – typy zdrojů (Playwright resource_type), které se blokují
+                    vždy, i z first-party domény (image, font, media, stylesheet…)
+    third_party   – "block" = z cizích domén se nestahuje nic (kromě ALWAYS_ALLOW),
+                    "allow" = cizí zdroje projdou, pokud nejsou tracker/consent
+
+Trackery, analytika a consent manažeři (usercentrics…) se blokují vždy.
+Na konci běhu ``report()`` vypíše počty blokovaných požadavků a odhad
+ušetřených bajtů (blokovaný požadavek se nestáhne, takže jeho velikost
+neznáme – počítá se s typickou velikostí podle typu).
+"""
+
+from collections import Counter
+from urllib.parse import urlsplit
+
+import scrape_events as events
+
+RULESETS = {
+    # smicro hlídá fingerprint – cizí zdroje necháváme, blokujeme jen obrázky a trackery
+    "smicro": {
+        "domains": ("smicro.cz",),
+        "block_types": {"image", "media"},
+        "third_party": "allow",
+    },
+    "it-market": {
+        "domains": ("it-market.com",),
+        "block_types": {"image", "media", "font", "stylesheet"},
+        "third_party": "block",
+    },
+    # CSS necháváme – inner_text závisí na viditelnosti prvků
+    "it-planet": {
+        "domains": ("it-planet.com",),
+        "block_types": {"image", "media", "font"},
+        "third_party": "block",
+    },
+}
+
+TRACKER_HOSTS = (
+    "google-analytics.com", "googletagmanager.com", "doubleclick.net", "googleadservices.com",
+    "googlesyndication.com", "facebook.net", "facebook.com", "hotjar.com", "clarity.ms",
+    "bat.bing.com", "criteo.com", "criteo.net", "taboola.com",
+    "heureka.cz", "sklik.cz", "linkedin.com", "licdn.com", "tiktok.com", "pinterest.com",
+    "matomo.cloud", "newrelic.com", "nr-data.net", "sentry.io", "trustedshops.com",
+)
+CONSENT_HOSTS = ("usercentrics.eu", "usercentrics.com", "cookiebot.com", "consensu.org", "onetrust.com")
+# Cloudflare challenge musí projít, jinak se stránka nikdy neodblokuje
+ALWAYS_ALLOW = ("challenges.cloudflare.com",)
+
+# Typická velikost blokovaného zdroje (bajty) pro odhad úspory
+TYPICAL_BYTES = {
+    "image": 45_000, "media": 250_000, "font": 35_000, "stylesheet": 30_000,
+    "script": 40_000, "xhr": 3_000, "fetch": 3_000, "document": 60_000,
+}
+DEFAULT_BYTES = 5_000
+
+
+def _host_matches(host: str, patterns) -> bool:
+    return any(host == dom or host.endswith("." + dom) for dom in patterns)
+
+
+class ResourcePolicy:
+    """Routovací politika jednoho webu; jedna instance může obsloužit více kontextů."""
+
+    def __init__(self, site: str):
+        self.site = site
+        self.rules = RULESETS[site]
+        self.blocked = Counter()      # kategorie -> počet
+        self.blocked_bytes = 0
+        self.allowed = 0
+        self._host_cache = {}
+
+    async def install(self, context):
+        await context.route("**/*", self._handle)
+
+    def _classify_host(self, host: str):
+        """Vrátí (kategorie_bloku|None, first_party) pro host; výsledek se cachuje."""
+        cached = self._host_cache.get(host)
+        if cached is None:
+            if _host_matches(host, ALWAYS_ALLOW):
+                cached = ("allow", False)
+            elif _host_matches(host, TRACKER_HOSTS):
+                cached = ("tracker", False)
+            elif _host_matches(host, CONSENT_HOSTS):
+                cached = ("consent", False)
+            else:
+                cached = (None, _host_matches(host, self.rules["domains"]))
+            self._host_cache[host] = cached
+        return cached
+
+    def decide(self, url: str, resource_type: str):
+        """Vrátí kategorii, pod kterou se požadavek blokuje, nebo None (povolit)."""
+        host = urlsplit(url).hostname or ""
+        verdict, first_party = self._classify_host(host)
+        if verdict == "allow":
+            return None
+        if verdict:
+            return verdict
+        if resource_type in self.rules["block_types"]:
+            return resource_type
+        if not first_party and self.rules["third_party"] == "block" and not url.startswith("data:"):
+            return "third_party"
+        return None
+
+    async def _handle(self, route):
+        request = route.request
+        category = self.decide(request.url, request.resource_type)
+        if category is None:
+            self.allowed += 1
+            await route.fallback()
+            return
+        self.blocked[category] += 1
+        self.blocked_bytes += TYPICAL_BYTES.get(request.resource_type, DEFAULT_BYTES)
+        try:
+            await route.abort("blockedbyclient")
+        except Exception:
+            pass
+
+    def summary(self) -> dict:
+        return {
+            "site": self.site,
+            "allowed": self.allowed,
+            "blocked": sum(self.blocked.values()),
+            "blocked_by": dict(self.blocked),
+            "saved_bytes_est": self.blocked_bytes,
+        }
+
+    def report(self, log=print):
+        s = self.summary()
+        by = ", ".join(f"{k}={v}" for k, v in self.blocked.most_common())
+        log(f"[policy] {self.site}: povoleno {s['allowed']}, blokováno {s['blocked']} ({by or '-'}), "
+            f"ušetřeno ~{s['saved_bytes_est'] / 1_048_576:.1f} MB")
+        events.emit("stats", resource_policy=s)
@@ -0,0 +1,118 @@
+"""Odložené opakování produktů – čekání na retry nedrží slot workeru.
+
+Dřív se při chybě nebo banu čekalo (3 s, 15 min) uvnitř
+``async with semaphore`` a jeden zablokovaný produkt tak na celou dobu
+vyřadil worker. Neúspěšné produkty navíc vracely ``[]`` a ztratily se.
+
+``RetryQueue`` drží URL k opakování v haldě podle času, kdy jsou na
+řadě (exponenciální backoff s jitterem). Výpadek nebo ban proxy se
+neodkládá per URL – řeší ho ``ProxyLanes`` přesunem kontextů na jiný exit.
+Scraper při chybě zavolá ``defer()`` a slot hned uvolní. Hlavní smyčka
+po každé straně listingu přidá k dávce produkty, které už jsou na řadě
+(``pop_due()``), a po skončení procházení ``drain()`` dočerpá zbytek –
+čeká se mimo semafor, jen dokud není na řadě další URL.
+
+Fronta žije jen v paměti běhu; po přerušení se neúspěšné produkty
+nevrací (resume pokračuje od uložené strany jako dřív).
+"""
+
+import asyncio
+import heapq
+import itertools
+import random
+import time
+
+import scrape_events as events
+
+BASE_DELAY_S = 5.0
+MAX_DELAY_S = 10 * 60
+MAX_ATTEMPTS = 4          # kolikrát se URL odloží, než se vzdá
+
+
+class RetryQueue:
+    def __init__(self, site: str, max_attempts: int = MAX_ATTEMPTS, base_delay: float = BASE_DELAY_S,
+                 max_delay: float = MAX_DELAY_S, log=print):
+        self.site = site
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._log = log
+        self._heap = []                  # (čas, pořadí, url)
+        self._seq = itertools.count()
+        self._pending = {}               # url -> pořadí platného záznamu v haldě
+        self.attempts = {}               # url -> počet odložení (dokud se nepodaří)
+        self.deferred = 0
+        self.recovered = 0
+        self.given_up = 0
+
+    def __len__(self):
+        return len(self._pending)
+
+    def defer(self, url, reason, delay: float = None) -> bool:
+        """Naplánuje opakování URL; False = pokusy vyčerpány (volající ho zaznamená jako chybu)."""
+        n = self.attempts.get(url, 0) + 1
+        if n > self.max_attempts:
+            self.given_up += 1
+            self._pending.pop(url, None)
+            del self.attempts[url]
+            self._log(f"[retry] {url}: vzdáno po {n - 1} opakováních ({reason})")
+            return False
+        self.attempts[url] = n
+        if n == 1:
+            self.deferred += 1
+        if delay is None:
+            delay = min(self.max_delay, self.base_delay * 2 ** (n - 1)) * random.uniform(0.8, 1.2)
+        if url not in self._pending:
+            seq = self._pending[url] = next(self._seq)
+            heapq.heappush(self._heap, (time.monotonic() + delay, seq, url))
+        self._log(f"[retry] {url}: {reason} – pokus {n + 1} za {delay:.0f} s")
+        events.emit("retry", site=self.site, url=url, attempt=n + 1, delay_s=round(delay), reason=str(reason)[:200])
+        return True
+
+    def discard(self, url):
+        """URL se podařilo stáhnout (i mimo frontu, např. po obnově browseru) – opakování zrušit."""
+        if self.attempts.pop(url, None):
+            self.recovered += 1
+        self._pending.pop(url, None)
+
+    def pop_due(self) -> list:
+        """URL, které už jsou na řadě (odebere je z fronty)."""
+        now = time.monotonic()
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            _, seq, url = heapq.heappop(self._heap)
+            if self._pending.get(url) == seq:
+                del self._pending[url]
+                due.append(url)
+        return due
+
+    def next_due_in(self):
+        """Sekundy do dalšího opakování, nebo None (fronta je prázdná)."""
+        while self._heap and self._pending.get(self._heap[0][2]) != self._heap[0][1]:
+            heapq.heappop(self._heap)
+        if not self._heap:
+            return None
+        return max(0.0, self._heap[0][0] - time.monotonic())
+
+    async def drain(self, run):
+        """Dočerpá frontu po skončení procházení.
+
+        ``run(urls)`` vrací async iterátor ``(rows, url)`` (např. ``supervised``);
+        produkty, které znovu selžou, se v něm odloží a přijdou na řadu později.
+        """
+        while True:
+            wait = self.next_due_in()
+            if wait is None:
+                return
+            if wait > 0:
+                self._log(f"[retry] {len(self)} produktů čeká na opakování, další za {wait:.0f} s")
+                await asyncio.sleep(wait)
+            async for rows, url in run(self.pop_due()):
+                if rows:
+                    self.discard(url)
+                yield rows, url
+
+    def report(self, log=None):
+        log = log or self._log
+        log(f"[retry] {self.site}: odloženo {self.deferred} produktů, "
+            f"opakováním zachráněno {self.recovered}, vzdáno {self.given_up}")
@@ -0,0 +1,190 @@
+"""Vzorkovací profiler zapínaný za běhu – bez restartu scraperu.
+
+``watch()`` na začátku ``main()`` (jen se ``SCRAPER_PROFILE_DIR``) hlídá
+požadavky z Manageru (``request()``) a zapíše zásobníky vláken
+(``<token>.cpu.folded``), čekající asyncio tasky (``<token>.await.folded``)
+a souhrn (``<token>.json``, zapisuje se poslední).
+"""
+
+import asyncio
+import json
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+
+CONTROL_ENV = "SCRAPER_PROFILE_DIR"
+REQUEST_FILE = "request.json"
+POLL_S = 1.0
+SAMPLE_INTERVAL_S = 0.01
+MAX_SECONDS = 600
+TOP_FRAMES = 15
+
+_watcher = None
+
+
+def _label(frame) -> str:
+    code = frame.f_code
+    name = getattr(code, "co_qualname", code.co_name)
+    return f"{name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+def _thread_stack(frame) -> list:
+    stack = []
+    while frame is not None:
+        stack.append(_label(frame))
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+def _task_stack(coro) -> list:
+    """Řetěz pozastavených coroutin tasku od vnější po tu, která čeká."""
+    stack = []
+    while coro is not None:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None) or getattr(coro, "ag_frame", None)
+        if frame is None:
+            break
+        stack.append(_label(frame))
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None) or getattr(coro, "ag_await", None)
+    if isinstance(coro, asyncio.Task):
+        stack.append(f"<task {re.sub(r'-[0-9]+$', '', coro.get_name())}>")
+    elif coro is not None and asyncio.isfuture(coro):
+        stack.append("<future>")
+    return stack
+
+
+def _is_idle(stack) -> bool:
+    # Event loop čekající v selectoru (Windows: IOCP proactor) = nic k práci
+    return bool(stack) and ("(selectors.py:" in stack[-1] or "_poll (windows_events.py:" in stack[-1])
+
+
+class _Sampler:
+    def __init__(self, loop, log):
+        self.loop = loop
+        self.loop_thread = threading.get_ident()
+        self.log = log
+
+    def sample(self, seconds: float) -> dict:
+        cpu, waits = Counter(), Counter()
+        me = threading.get_ident()
+        samples = loop_busy = 0
+        t_end = time.monotonic() + seconds
+        while time.monotonic() < t_end:
+            names = {t.ident: re.sub(r'_[0-9]+$', '', t.name) for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = _thread_stack(frame)
+                if ident == self.loop_thread and not _is_idle(stack):
+                    loop_busy += 1
+                cpu[";".join([names.get(ident, "thread")] + stack)] += 1
+            try:
+                tasks = asyncio.all_tasks(self.loop)
+            except RuntimeError:
+                tasks = ()  # loop skončil / množina se měnila
+            for task in tasks:
+                coro = task.get_coro()
+                if getattr(coro, "cr_running", False):
+                    continue  # běžící task je ve vzorku vlákna
+                stack = _task_stack(coro)
+                if stack:
+                    waits[";".join(stack)] += 1
+            samples += 1
+            time.sleep(SAMPLE_INTERVAL_S)
+        return {"samples": samples, "loop_busy": loop_busy, "cpu": cpu, "await": waits}
+
+
+def _top(counter: Counter) -> list:
+    leaf = Counter()
+    for stack, n in counter.items():
+        leaf[stack.rsplit(";", 1)[-1]] += n
+    return leaf.most_common(TOP_FRAMES)
+
+
+def _write(path: Path, text: str):
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text(text, encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def _run_request(sampler, control: Path, req: dict):
+    token = str(req.get("token") or uuid.uuid4().hex[:8])
+    seconds = max(1.0, min(float(req.get("seconds") or 30), MAX_SECONDS))
+    sampler.log(f"[profiler] Vzorkuji {seconds:.0f} s (požadavek {token})")
+    result = sampler.sample(seconds)
+    files = {}
+    for kind in ("cpu", "await"):
+        path = control / f"{token}.{kind}.folded"
+        _write(path, "".join(f"{stack} {n}\n" for stack, n in result[kind].most_common()))
+        files[kind] = path.name
+    samples = result["samples"]
+    summary = {
+        "token": token,
+        "seconds": seconds,
+        "samples": samples,
+        "loop_busy_pct": round(result["loop_busy"] / samples * 100, 1) if samples else None,
+        "top_cpu": _top(result["cpu"]),
+        "top_await": _top(result["await"]),
+        "files": files,
+    }
+    _write(control / f"{token}.json", json.dumps(summary, ensure_ascii=False, indent=1))
+    sampler.log(f"[profiler] Hotovo: {samples} vzorků, event loop vytížen {summary['loop_busy_pct']} %")
+
+
+def _watch_loop(sampler, control: Path):
+    request_path = control / REQUEST_FILE
+    while True:
+        time.sleep(POLL_S)
+        if not request_path.exists():
+            continue
+        try:
+            req = json.loads(request_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            req = None
+            sampler.log(f"[profiler] Neplatný požadavek: {e}")
+        try:
+            request_path.unlink()
+        except OSError:
+            pass
+        if req is None:
+            continue
+        try:
+            _run_request(sampler, control, req)
+        except Exception as e:
+            sampler.log(f"[profiler] Chyba: {e}")
+
+
+def watch(log=print):
+    """Spustí hlídání požadavků na profil (jednou za proces; volat z běžící coroutiny)."""
+    global _watcher
+    control = os.environ.get(CONTROL_ENV)
+    if not control or _watcher is not None:
+        return
+    control = Path(control)
+    control.mkdir(parents=True, exist_ok=True)
+    sampler = _Sampler(asyncio.get_running_loop(), log)
+    _watcher = threading.Thread(target=_watch_loop, args=(sampler, control), name="profiler", daemon=True)
+    _watcher.start()
+
+
+def request(control, seconds: float) -> str:
+    """Požádá běžící scraper o profil; vrací token výstupních souborů."""
+    control = Path(control)
+    control.mkdir(parents=True, exist_ok=True)
+    # Čas pro čitelnost, náhodná přípona – dva požadavky v téže sekundě se nepřepíšou
+    token = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+    _write(control / REQUEST_FILE, json.dumps({"token": token, "seconds": seconds}))
+    return token
+
+
+def result(control, token: str):
+    """Souhrn hotového profilu, nebo None pokud ještě neběží / nedoběhl."""
+    try:
+        return json.loads((Path(control) / f"{token}.json").read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
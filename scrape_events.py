@@ -0,0 +1,65 @@
+"""Strojově čitelný kanál událostí ze scraperů do Scraper Manageru.
+
+Události jdou na stdout jako samostatné řádky s prefixem ``EVENT_PREFIX``
+následovaným kompaktním JSONem, takže se nepletou s běžným logem a Manager
+je umí odfiltrovat jediným ``startswith``. Kanál je aktivní jen pokud
+proces spustil Manager (proměnná prostředí ``SCRAPER_EVENTS=1``) – při
+ručním spuštění v terminálu je ``emit`` no-op.
+
+Typy událostí:
+    progress  – section, section_idx, sections, page, done, total
+    rows      – n (počet zapsaných řádků), product (URL)
+    error     – url, msg
+    timing    – phase, ms
+    stats     – libovolné souhrnné metriky běhu
+"""
+
+import json
+import os
+import sys
+import time
+
+EVENT_PREFIX = "@@EVT "
+ENABLED = os.environ.get("SCRAPER_EVENTS") == "1"
+
+_dumps = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"), default=str).encode
+
+
+def emit(kind: str, **fields):
+    """Odešle jednu událost. Levné – volatelné pro každý produkt."""
+    if not ENABLED:
+        return
+    fields["ev"] = kind
+    fields["t"] = round(time.time(), 3)
+    try:
+        sys.stdout.write(EVENT_PREFIX + _dumps(fields) + "\n")
+    except Exception:
+        pass
+
+
+def progress(section, page, done, total, section_idx=None, sections=None):
+    emit("progress", section=section, page=page, done=done, total=total,
+         section_idx=section_idx, sections=sections)
+
+
+def rows(n: int, product: str = None):
+    emit("rows", n=n, product=product)
+
+
+def error(url: str, msg):
+    emit("error", url=url, msg=str(msg)[:300])
+
+
+def timing(phase: str, started: float):
+    """Zaznamená dobu fáze; ``started`` je hodnota z ``time.monotonic()``."""
+    emit("timing", phase=phase, ms=round((time.monotonic() - started) * 1000))
+
+
+def parse(line: str):
+    """Vrátí dict události, nebo None pokud řádek není událost."""
+    if not line.startswith(EVENT_PREFIX):
+        return None
+    try:
+        return json.loads(line[len(EVENT_PREFIX):])
+    except ValueError:
+        return None
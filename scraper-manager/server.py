@@ -3,7 +3,9 @@
 
 import asyncio
 import json
+import os
 import sys
+import tempfile
 import time
 import uuid
 from collections import deque
@@ -21,6 +23,10 @@ from pydantic import BaseModel
 # Konfigurace scraperů
 # ============================================================
 SCRAPERS_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(SCRAPERS_DIR))
+
+import scrape_events  # noqa: E402  (sdílený modul ze složky scraperů)
+import sampling_profiler  # noqa: E402
 
 SCRAPERS = {
     "smicro": {
@@ -30,6 +36,7 @@ SCRAPERS = {
         "script": str(SCRAPERS_DIR / "smicroScrapePlayWright.py"),
         "output_file": str(SCRAPERS_DIR / "smicro_products.csv"),
         "progress_file": str(SCRAPERS_DIR / "smicroScrapeLastProduct.json"),
+        "resources": {"browser": True, "max_parallel": 1},
         "inputs": [
             {
                 "id": "workers",
@@ -61,6 +68,50 @@ SCRAPERS = {
                 "type": "select",
                 "options": ["ano", "ne"],
             },
+            {
+                "id": "listing_only",
+                "label": "Jen listing",
+                "default": "ne",
+                "hint": "'ano' = rychlý cenový průchod z karet listingu, bez otevírání detailů",
+                "type": "select",
+                "options": ["ano", "ne"],
+                "arg": "--listing-only",
+            },
+            {
+                "id": "hedge",
+                "label": "Hedging navigací",
+                "default": "ne",
+                "hint": "'ano' = detail načítaný déle než p95 webu se zkusí souběžně na nové stránce (max. 10 % navigací)",
+                "type": "select",
+                "options": ["ano", "ne"],
+                "arg": "--hedge",
+            },
+            {
+                "id": "trace_calls",
+                "label": "Trasovat volání Playwright",
+                "default": "ne",
+                "hint": "'ano' = měří každé volání Page/Locator (metoda, selektor, funkce); souhrn na konci běhu a v pw_trace/",
+                "type": "select",
+                "options": ["ano", "ne"],
+                "arg": "--trace-calls",
+            },
+            {
+                "id": "probe_engine",
+                "label": "Sonda engine",
+                "default": "ne",
+                "hint": "'ano' = místo scrapování porovná HTTP / bez JS / render na vzorku detailů a uloží engine_profile.json",
+                "type": "select",
+                "options": ["ano", "ne"],
+                "arg": "--probe-engine",
+            },
+            {
+                "id": "parts",
+                "label": "Part numbery",
+                "default": "",
+                "hint": "Volitelné – jeden part number na řádek; místo sekcí se dohledají jen tyto",
+                "type": "textarea",
+                "arg_file": "--parts",
+            },
         ],
     },
     "it-planet": {
@@ -70,6 +121,7 @@ SCRAPERS = {
         "script": str(SCRAPERS_DIR / "it-planetScrapePlayWright.py"),
         "output_file": str(SCRAPERS_DIR / "it-planet_data.csv"),
         "progress_file": str(SCRAPERS_DIR / "it-planet_progress_v6.json"),
+        "resources": {"browser": True, "max_parallel": 1},
         "inputs": [
             {
                 "id": "workers",
@@ -93,6 +145,50 @@ SCRAPERS = {
                 "hint": "'vse' = vše, nebo číslo konkrétní sekce",
                 "type": "text",
             },
+            {
+                "id": "listing_only",
+                "label": "Jen listing",
+                "default": "ne",
+                "hint": "'ano' = rychlý cenový průchod z karet listingu, bez otevírání detailů",
+                "type": "select",
+                "options": ["ano", "ne"],
+                "arg": "--listing-only",
+            },
+            {
+                "id": "hedge",
+                "label": "Hedging navigací",
+                "default": "ne",
+                "hint": "'ano' = detail načítaný déle než p95 webu se zkusí souběžně na nové stránce (max. 10 % navigací)",
+                "type": "select",
+                "options": ["ano", "ne"],
+                "arg": "--hedge",
+            },
+            {
+                "id": "trace_calls",
+                "label": "Trasovat volání Playwright",
+                "default": "ne",
+                "hint": "'ano' = měří každé volání Page/Locator (metoda, selektor, funkce); souhrn na konci běhu a v pw_trace/",
+                "type": "select",
+                "options": ["ano", "ne"],
+                "arg": "--trace-calls",
+            },
+            {
+                "id": "probe_engine",
+                "label": "Sonda engine",
+                "default": "ne",
+                "hint": "'ano' = místo scrapování porovná HTTP / bez JS / render na vzorku listingů a uloží engine_profile.json",
+                "type": "select",
+                "options": ["ano", "ne"],
+                "arg": "--probe-engine",
+            },
+            {
+                "id": "parts",
+                "label": "Part numbery",
+                "default": "",
+                "hint": "Volitelné – jeden part number na řádek; místo sekcí se dohledají jen tyto",
+                "type": "textarea",
+                "arg_file": "--parts",
+            },
         ],
     },
     "it-market": {
@@ -102,6 +198,7 @@ SCRAPERS = {
         "script": str(SCRAPERS_DIR / "it-marketScrapePlayWright.py"),
         "output_file": str(SCRAPERS_DIR / "it-market.csv"),
         "progress_file": str(SCRAPERS_DIR / "it-marketScrapeLastProduct.json"),
+        "resources": {"browser": True, "max_parallel": 1},
         "inputs": [
             {
                 "id": "headless",
@@ -140,6 +237,59 @@ SCRAPERS = {
                 "type": "select",
                 "options": ["ano", "ne"],
             },
+            {
+                "id": "listing_only",
+                "label": "Jen listing",
+                "default": "ne",
+                "hint": "'ano' = rychlý cenový průchod z karet listingu, bez otevírání detailů",
+                "type": "select",
+                "options": ["ano", "ne"],
+                "arg": "--listing-only",
+            },
+            {
+                "id": "hedge",
+                "label": "Hedging navigací",
+                "default": "ne",
+                "hint": "'ano' = detail načítaný déle než p95 webu se zkusí souběžně na nové stránce (max. 10 % navigací)",
+                "type": "select",
+                "options": ["ano", "ne"],
+                "arg": "--hedge",
+            },
+            {
+                "id": "trace_calls",
+                "label": "Trasovat volání Playwright",
+                "default": "ne",
+                "hint": "'ano' = měří každé volání Page/Locator (metoda, selektor, funkce); souhrn na konci běhu a v pw_trace/",
+                "type": "select",
+                "options": ["ano", "ne"],
+                "arg": "--trace-calls",
+            },
+            {
+                "id": "sitemap",
+                "label": "Produkty ze sitemapy",
+                "default": "ne",
+                "hint": "'ano' = URL produktů ze sitemap místo stránkování, jen změněné od minula",
+                "type": "select",
+                "options": ["ano", "ne"],
+                "arg": "--sitemap",
+            },
+            {
+                "id": "api",
+                "label": "Store API",
+                "default": "ne",
+                "hint": "'ano' = listingy a varianty jako JSON ze Shopware Store API, browser jen jako záloha",
+                "type": "select",
+                "options": ["ano", "ne"],
+                "arg": "--api",
+            },
+            {
+                "id": "parts",
+                "label": "Part numbery",
+                "default": "",
+                "hint": "Volitelné – jeden part number na řádek; místo sekcí se dohledají jen tyto",
+                "type": "textarea",
+                "arg_file": "--parts",
+            },
         ],
     },
     "projector-lamps": {
@@ -149,6 +299,7 @@ SCRAPERS = {
         "script": str(SCRAPERS_DIR / "projectorLampScrape.py"),
         "output_file": str(SCRAPERS_DIR / "vysledky.csv"),
         "progress_file": str(SCRAPERS_DIR / "projectorLampProgress.json"),
+        "resources": {"browser": False, "max_parallel": 1},
         "inputs": [
             {
                 "id": "brand",
@@ -165,6 +316,43 @@ SCRAPERS = {
 for sid, cfg in SCRAPERS.items():
     cfg["available"] = Path(cfg["script"]).exists()
 
+# ============================================================
+# Plánovač – globální rozpočet prostředků
+# ============================================================
+# Souběžné běhy se spouští jen dokud se vejdou do rozpočtu. Výchozí hodnoty
+# odpovídají serveru se 4 GB RAM; lze přepsat proměnnými prostředí.
+WORKER_BUDGET = int(os.environ.get("SCRAPER_WORKER_BUDGET", "6"))          # browser okna celkem
+MEMORY_BUDGET_MB = int(os.environ.get("SCRAPER_MEMORY_BUDGET_MB", "2800"))  # odhad RSS celkem
+BROWSER_BASE_MB = 350      # Chromium + Python interpret jednoho běhu
+SHARED_BASE_MB = 150       # jen Python + Playwright driver (Chromium je sdílený)
+BROWSER_WORKER_MB = 250    # jedno paralelní okno (renderer)
+PLAIN_RUN_MB = 80          # scraper bez browseru (requests)
+SCHEDULER_TICK = 20        # sekund mezi kontrolami cron plánů
+
+SCHEDULES_FILE = Path(__file__).parent / "schedules.json"
+
+# Vzorkovací profiler běžících scraperů (sampling_profiler.py) – řídicí složka per běh
+PROFILES_DIR = Path(__file__).parent / "profiles"
+PROFILE_MAX_S = sampling_profiler.MAX_SECONDS
+PROFILE_GRACE_S = 15       # rezerva na vyzvednutí požadavku a zápis výstupu
+
+# ============================================================
+# Sdílený (teplý) browser
+# ============================================================
+# Manager drží jeden Chromium s CDP endpointem; scrapery se k němu připojí
+# (shared_browser.py) místo studeného startu vlastního browseru.
+SHARED_BROWSER = os.environ.get("SCRAPER_SHARED_BROWSER", "1") == "1"
+SHARED_BROWSER_PORT = int(os.environ.get("SCRAPER_SHARED_BROWSER_PORT", "9333"))
+SHARED_BROWSER_ARGS = [
+    "--headless=new",
+    "--disable-gpu",
+    "--no-sandbox",
+    "--disable-dev-shm-usage",
+    "--disable-blink-features=AutomationControlled",
+    "--no-first-run",
+    "--no-default-browser-check",
+]
+
 # ============================================================
 # Proxy / WARP status cache
 # ============================================================
@@ -190,8 +378,8 @@ def _load_history():
             data = json.load(f)
         for entry in data:
             run_id = entry["id"]
-            # Běhy, které byly "running" při posledním vypnutí, označit jako přerušené
-            if entry.get("status") == "running":
+            # Běhy, které byly "running"/"queued" při posledním vypnutí, označit jako přerušené
+            if entry.get("status") in ("running", "queued"):
                 entry["status"] = "interrupted"
                 if not entry.get("finished_at"):
                     entry["finished_at"] = datetime.now().isoformat()
@@ -200,10 +388,14 @@ def _load_history():
                 "scraper_id": entry["scraper_id"],
                 "scraper_name": entry["scraper_name"],
                 "status": entry["status"],
-                "started_at": entry["started_at"],
+                "queued_at": entry.get("queued_at"),
+                "started_at": entry.get("started_at"),
                 "finished_at": entry.get("finished_at"),
                 "exit_code": entry.get("exit_code"),
                 "inputs": entry.get("inputs", {}),
+                "priority": entry.get("priority", 0),
+                "schedule_id": entry.get("schedule_id"),
+                "progress": entry.get("progress"),
                 "_logs": deque(entry.get("logs", []), maxlen=500),
                 "_subscribers": set(),
                 "_process": None,
@@ -224,10 +416,14 @@ def _save_history():
                 "scraper_id": run["scraper_id"],
                 "scraper_name": run["scraper_name"],
                 "status": run["status"],
+                "queued_at": run.get("queued_at"),
                 "started_at": run["started_at"],
                 "finished_at": run["finished_at"],
                 "exit_code": run["exit_code"],
                 "inputs": run["inputs"],
+                "priority": run.get("priority", 0),
+                "schedule_id": run.get("schedule_id"),
+                "progress": _progress_public(run),
                 "logs": list(run["_logs"]),
             }
             data.append(entry)
@@ -246,6 +442,18 @@ app = FastAPI(title="Scraper Manager")
 @app.on_event("startup")
 async def on_startup():
     _load_history()
+    _load_schedules()
+    asyncio.create_task(_scheduler_loop())
+    if SHARED_BROWSER:
+        # Zahřát browser hned, ať první běh/test nečeká na studený start
+        asyncio.create_task(_ensure_browser())
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    proc = _browser_service.get("proc")
+    if proc and proc.returncode is None:
+        proc.terminate()
 
 STATIC_DIR = Path(__file__).parent / "static"
 app.mount("/static", StaticFiles(directory=str(STATIC_DIR)), name="static")
@@ -257,6 +465,15 @@ app.mount("/static", StaticFiles(directory=str(STATIC_DIR)), name="static")
 class StartRunRequest(BaseModel):
     scraper_id: str
     inputs: Dict[str, str]
+    priority: int = 0
+
+
+class ScheduleRequest(BaseModel):
+    scraper_id: str
+    inputs: Dict[str, str]
+    cron: str
+    priority: int = 0
+    enabled: bool = True
 
 
 # ============================================================
@@ -306,26 +523,54 @@ async def start_run(req: StartRunRequest):
     if not scraper.get("available"):
         raise HTTPException(400, "Script scraperu nenalezen")
 
-    run_id = str(uuid.uuid4())[:8]
-    run = {
-        "id": run_id,
+    run = _enqueue_run(scraper, req.inputs, req.priority)
+    return {"run_id": run["id"], "status": "started" if run["status"] == "running" else run["status"]}
+
+
+@app.get("/api/budget")
+async def get_budget():
+    """Aktuální využití globálního rozpočtu a délka fronty."""
+    workers, memory = _budget_used()
+    return {
+        "workers": {"used": workers, "budget": WORKER_BUDGET},
+        "memory_mb": {"used": memory, "budget": MEMORY_BUDGET_MB},
+        "queued": [r["id"] for r in _queued_runs()],
+    }
+
+
+@app.get("/api/schedules")
+async def get_schedules():
+    return list(schedules.values())
+
+
+@app.post("/api/schedules")
+async def create_schedule(req: ScheduleRequest):
+    if req.scraper_id not in SCRAPERS:
+        raise HTTPException(400, "Neznámý scraper")
+    try:
+        _parse_cron(req.cron)
+    except ValueError as e:
+        raise HTTPException(400, f"Neplatný cron výraz: {e}")
+    sched_id = str(uuid.uuid4())[:8]
+    schedules[sched_id] = {
+        "id": sched_id,
         "scraper_id": req.scraper_id,
-        "scraper_name": scraper["name"],
-        "status": "running",
-        "started_at": datetime.now().isoformat(),
-        "finished_at": None,
-        "exit_code": None,
         "inputs": req.inputs,
-        "_logs": deque(maxlen=500),
-        "_subscribers": set(),
-        "_process": None,
+        "cron": req.cron,
+        "priority": req.priority,
+        "enabled": req.enabled,
+        "last_fired": None,
     }
-    runs[run_id] = run
+    _save_schedules()
+    return schedules[sched_id]
 
-    stdin_lines = _build_stdin(scraper, req.inputs)
-    asyncio.create_task(_run_scraper(run_id, scraper["script"], stdin_lines))
 
-    return {"run_id": run_id, "status": "started"}
+@app.delete("/api/schedules/{schedule_id}")
+async def delete_schedule(schedule_id: str):
+    if schedules.pop(schedule_id, None) is None:
+        raise HTTPException(404, "Plán nenalezen")
+    _save_schedules()
+    return {"status": "ok"}
 
 
 @app.delete("/api/runs/{run_id}")
@@ -334,7 +579,11 @@ async def stop_run(run_id: str):
         raise HTTPException(404, "Run nenalezen")
     run = runs[run_id]
     proc = run.get("_process")
-    if proc and run["status"] == "running":
+    if run["status"] == "queued":
+        run["status"] = "stopped"
+        run["finished_at"] = datetime.now().isoformat()
+        _save_history()
+    elif proc and run["status"] == "running":
         proc.terminate()
         run["status"] = "stopped"
         run["finished_at"] = datetime.now().isoformat()
@@ -358,6 +607,51 @@ async def download_result(run_id: str):
     return FileResponse(str(out_path), filename=out_path.name, media_type=media)
 
 
+@app.post("/api/runs/{run_id}/profile")
+async def profile_run(run_id: str, seconds: int = 30):
+    """Navzorkuje běžící scraper po dobu ``seconds`` a vrátí souhrn (viz sampling_profiler.py)."""
+    if run_id not in runs:
+        raise HTTPException(404, "Run nenalezen")
+    run = runs[run_id]
+    if run["status"] != "running" or not run.get("_process"):
+        raise HTTPException(409, "Run neběží")
+    if run.get("_profiling"):
+        raise HTTPException(409, "Profil už běží")
+    seconds = max(1, min(seconds, PROFILE_MAX_S))
+    control = PROFILES_DIR / run_id
+    run["_profiling"] = True
+    try:
+        token = sampling_profiler.request(control, seconds)
+        deadline = time.monotonic() + seconds + PROFILE_GRACE_S
+        while time.monotonic() < deadline:
+            await asyncio.sleep(1)
+            summary = sampling_profiler.result(control, token)
+            if summary is not None:
+                run["_profile"] = token
+                summary["download"] = {k: f"/api/runs/{run_id}/profile?kind={k}" for k in summary["files"]}
+                return summary
+            if run["status"] != "running":
+                raise HTTPException(409, "Run skončil před dokončením profilu")
+        (control / sampling_profiler.REQUEST_FILE).unlink(missing_ok=True)
+        raise HTTPException(504, "Scraper na požadavek nereagoval (starší verze bez profileru?)")
+    finally:
+        run["_profiling"] = False
+
+
+@app.get("/api/runs/{run_id}/profile")
+async def download_profile(run_id: str, kind: str = "cpu"):
+    """Poslední profil běhu ve formátu folded stacks (``cpu`` nebo ``await``)."""
+    if run_id not in runs:
+        raise HTTPException(404, "Run nenalezen")
+    token = runs[run_id].get("_profile")
+    if kind not in ("cpu", "await"):
+        raise HTTPException(400, "kind musí být cpu nebo await")
+    path = PROFILES_DIR / run_id / f"{token}.{kind}.folded"
+    if not token or not path.exists():
+        raise HTTPException(404, "Profil nenalezen – nejdřív POST /api/runs/{id}/profile")
+    return FileResponse(str(path), filename=f"{run_id}-{path.name}", media_type="text/plain")
+
+
 @app.get("/api/proxy-status")
 async def proxy_status(refresh: bool = False):
     """Vrátí stav proxy/WARP (cachováno 60s)."""
@@ -417,6 +711,19 @@ async def csv_preview(scraper_id: str, n: int = 100):
     return {"header": header, "rows": rows, "total_rows": len(data_lines)}
 
 
+@app.post("/api/scrapers/test-all")
+async def test_all_scrapers():
+    """Spustí testy všech dostupných scraperů souběžně."""
+    available = [cfg for cfg in SCRAPERS.values() if cfg.get("available")]
+    started = time.monotonic()
+    results = await asyncio.gather(*(_run_test(cfg) for cfg in available))
+    return {
+        "ok": all(r["ok"] for r in results),
+        "duration_s": round(time.monotonic() - started, 1),
+        "results": {cfg["id"]: r for cfg, r in zip(available, results)},
+    }
+
+
 @app.post("/api/scrapers/{scraper_id}/test")
 async def test_scraper(scraper_id: str):
     """Spustí scraper s --test flaggem a vrátí výsledek do 60s."""
@@ -425,12 +732,19 @@ async def test_scraper(scraper_id: str):
     scraper = SCRAPERS[scraper_id]
     if not scraper.get("available"):
         raise HTTPException(400, "Script scraperu nenalezen")
+    return await _run_test(scraper)
+
+
+async def _run_test(scraper: dict) -> dict:
+    """Test scraperu (--test): nejdřív přes HTTP, browser jen při Cloudflare."""
+    started = time.monotonic()
     try:
         proc = await asyncio.create_subprocess_exec(
             sys.executable, "-u", scraper["script"], "--test",
             stdout=asyncio.subprocess.PIPE,
             stderr=asyncio.subprocess.STDOUT,
             cwd=str(Path(scraper["script"]).parent),
+            env=await _scraper_env(scraper),
         )
         try:
             stdout, _ = await asyncio.wait_for(proc.communicate(), timeout=60)
@@ -442,11 +756,24 @@ async def test_scraper(scraper_id: str):
             return {"ok": False, "output": "Timeout – test neodpověděl do 60s"}
         output = stdout.decode("utf-8", errors="replace")
         ok = proc.returncode == 0 and "TEST OK" in output
-        return {"ok": ok, "output": output}
+        return {"ok": ok, "output": output, "duration_s": round(time.monotonic() - started, 1)}
     except Exception as e:
         return {"ok": False, "output": f"Chyba spuštění: {e}"}
 
 
+@app.get("/api/browser")
+async def browser_status():
+    """Stav sdíleného browseru (CDP endpoint)."""
+    endpoint = await _ensure_browser() if SHARED_BROWSER else None
+    return {
+        "enabled": SHARED_BROWSER,
+        "endpoint": endpoint,
+        "version": _browser_service.get("version"),
+        "started_at": _browser_service.get("started_at"),
+        "error": _browser_service.get("error"),
+    }
+
+
 @app.post("/api/proxy-check-full")
 async def proxy_check_full():
     """Spustí check_ip.py jako subprocess a vrátí raw výstup."""
@@ -483,7 +810,7 @@ async def ws_logs(websocket: WebSocket, run_id: str):
         except Exception:
             return
 
-    if run["status"] != "running":
+    if run["status"] not in ("running", "queued"):
         await websocket.close()
         return
 
@@ -493,7 +820,7 @@ async def ws_logs(websocket: WebSocket, run_id: str):
             try:
                 await asyncio.wait_for(websocket.receive_text(), timeout=20)
             except asyncio.TimeoutError:
-                if run["status"] != "running":
+                if run["status"] not in ("running", "queued"):
                     break
                 # keepalive ping
                 try:
@@ -509,8 +836,30 @@ async def ws_logs(websocket: WebSocket, run_id: str):
 # ============================================================
 # Helpers
 # ============================================================
+_rows_cache: Dict[str, tuple] = {}
+
+
 def _count_rows(path: Path) -> Optional[int]:
-    """Počet datových řádků ve výstupním souboru (bez hlavičky)."""
+    """Počet datových řádků ve výstupním souboru (bez hlavičky).
+
+    Výsledek se cachuje podle (mtime, size), takže polling frontendu
+    nečte nezměněný soubor znovu.
+    """
+    try:
+        st = path.stat()
+        key = (st.st_mtime_ns, st.st_size)
+        cached = _rows_cache.get(str(path))
+        if cached and cached[0] == key:
+            return cached[1]
+        count = _count_rows_uncached(path)
+        if count is not None:
+            _rows_cache[str(path)] = (key, count)
+        return count
+    except Exception:
+        return None
+
+
+def _count_rows_uncached(path: Path) -> Optional[int]:
     try:
         suffix = path.suffix.lower()
         if suffix == ".xlsx":
@@ -581,11 +930,77 @@ def _run_public(run: dict) -> dict:
         "scraper_id": run["scraper_id"],
         "scraper_name": run["scraper_name"],
         "status": run["status"],
+        "queued_at": run.get("queued_at"),
+        "priority": run.get("priority", 0),
+        "schedule_id": run.get("schedule_id"),
+        "cost": _run_cost(run) if run["status"] in ("queued", "running") else None,
         "started_at": run["started_at"],
         "finished_at": run["finished_at"],
         "exit_code": run["exit_code"],
         "inputs": run["inputs"],
         "log_lines": len(run["_logs"]),
+        "progress": _progress_public(run),
+    }
+
+
+def _handle_event(run: dict, ev: dict):
+    """Zpracuje jednu strukturovanou událost ze scraperu (viz scrape_events.py)."""
+    st = run.get("_ev")
+    if st is None:
+        st = run["_ev"] = {
+            "started": time.monotonic(),
+            "products": 0,
+            "rows": 0,
+            "errors": 0,
+            "timings": {},
+            "last_error": None,
+        }
+    kind = ev.get("ev")
+    if kind == "progress":
+        for k in ("section", "section_idx", "sections", "page", "done", "total"):
+            st[k] = ev.get(k)
+    elif kind == "rows":
+        st["products"] += 1
+        st["rows"] += ev.get("n") or 0
+    elif kind == "error":
+        st["errors"] += 1
+        st["last_error"] = {"url": ev.get("url"), "msg": ev.get("msg")}
+    elif kind == "timing":
+        t = st["timings"].setdefault(ev.get("phase") or "?", {"n": 0, "total_ms": 0})
+        t["n"] += 1
+        t["total_ms"] += ev.get("ms") or 0
+    elif kind == "stats":
+        st.setdefault("stats", {}).update({k: v for k, v in ev.items() if k not in ("ev", "t")})
+
+
+def _progress_public(run: dict) -> Optional[dict]:
+    st = run.get("_ev")
+    if st is None:
+        return run.get("progress")
+    elapsed = max(time.monotonic() - st["started"], 1e-6)
+    product_timing = st["timings"].get("product")
+    # Rychlost = dokončené produkty (úspěšné i neúspěšné) za sekundu běhu
+    finished = st["products"] + st["errors"]
+    rate = finished / elapsed if finished else None
+    eta_page = None
+    if rate and st.get("total") is not None and st.get("done") is not None:
+        eta_page = round(max(st["total"] - st["done"], 0) / rate)
+    return {
+        "section": st.get("section"),
+        "section_idx": st.get("section_idx"),
+        "sections": st.get("sections"),
+        "page": st.get("page"),
+        "done": st.get("done"),
+        "total": st.get("total"),
+        "products": st["products"],
+        "rows": st["rows"],
+        "errors": st["errors"],
+        "last_error": st["last_error"],
+        "rate_per_min": round(rate * 60, 1) if rate else None,
+        "eta_page_s": eta_page,
+        "avg_product_ms": round(product_timing["total_ms"] / product_timing["n"]) if product_timing else None,
+        "timings": {k: {"n": v["n"], "avg_ms": round(v["total_ms"] / v["n"])} for k, v in st["timings"].items() if v["n"]},
+        "stats": st.get("stats"),
     }
 
 
@@ -593,6 +1008,9 @@ def _build_stdin(scraper: dict, inputs: dict) -> List[str]:
     lines = []
     for inp in scraper["inputs"]:
         fid = inp["id"]
+        # Vstupy s "arg"/"arg_file" jsou přepínače příkazové řádky, ne odpovědi na input()
+        if "arg" in inp or "arg_file" in inp:
+            continue
         # Přeskočit category_url pokud kategorie není X
         if fid == "category_url":
             if inputs.get("category", "").strip().lower() != "x":
@@ -606,17 +1024,44 @@ def _build_stdin(scraper: dict, inputs: dict) -> List[str]:
     return lines
 
 
-async def _run_scraper(run_id: str, script: str, stdin_lines: List[str]):
+def _build_args(scraper: dict, inputs: dict, temp_files: List[str]) -> List[str]:
+    """Přepínače příkazové řádky z vstupů typu ano/ne s klíčem "arg".
+
+    Neprázdný vstup s klíčem "arg_file" se uloží do dočasného souboru
+    a předá jako ``<arg_file> <cesta>``; cesta se přidá do ``temp_files``
+    a po skončení běhu se smaže.
+    """
+    args = []
+    for inp in scraper["inputs"]:
+        value = str(inputs.get(inp["id"], inp.get("default", ""))).strip()
+        if "arg" in inp and value.lower() == "ano":
+            args.append(inp["arg"])
+        elif "arg_file" in inp and value:
+            fd, path = tempfile.mkstemp(prefix=f"{inp['id']}_", suffix=".txt")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(value + "\n")
+            temp_files.append(path)
+            args += [inp["arg_file"], path]
+    return args
+
+
+async def _run_scraper(run_id: str, script: str, stdin_lines: List[str], args: List[str] = ()):
     run = runs[run_id]
     try:
         proc = await asyncio.create_subprocess_exec(
             sys.executable,
             "-u",
             script,
+            *args,
             stdin=asyncio.subprocess.PIPE,
             stdout=asyncio.subprocess.PIPE,
             stderr=asyncio.subprocess.STDOUT,
             cwd=str(Path(script).parent),
+            env={
+                **await _scraper_env(SCRAPERS[run["scraper_id"]]),
+                "SCRAPER_EVENTS": "1",
+                sampling_profiler.CONTROL_ENV: str(PROFILES_DIR / run_id),
+            },
         )
         run["_process"] = proc
 
@@ -639,6 +1084,10 @@ async def _run_scraper(run_id: str, script: str, stdin_lines: List[str]):
             if not line_bytes:
                 break
             text = line_bytes.decode("utf-8", errors="replace").rstrip()
+            ev = scrape_events.parse(text)
+            if ev is not None:
+                _handle_event(run, ev)
+                continue
             run["_logs"].append(text)
             await _broadcast(text)
 
@@ -654,7 +1103,299 @@ async def _run_scraper(run_id: str, script: str, stdin_lines: List[str]):
     finally:
         run["finished_at"] = datetime.now().isoformat()
         run["_process"] = None
+        for path in run.pop("_temp_files", ()):
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
         _save_history()
+        _schedule()
+
+
+# ============================================================
+# Sdílený browser
+# ============================================================
+_browser_service: dict = {"proc": None, "endpoint": None, "lock": None}
+
+
+async def _browser_alive(endpoint: str) -> Optional[dict]:
+    try:
+        async with httpx.AsyncClient(timeout=2, trust_env=False) as client:
+            r = await client.get(f"{endpoint}/json/version")
+            return r.json()
+    except Exception:
+        return None
+
+
+async def _chromium_executable() -> str:
+    path = os.environ.get("SCRAPER_CHROMIUM_PATH")
+    if path:
+        return path
+    from playwright.async_api import async_playwright
+    async with async_playwright() as p:
+        return p.chromium.executable_path
+
+
+async def _ensure_browser() -> Optional[str]:
+    """Vrátí CDP endpoint běžícího sdíleného browseru, případně ho (znovu) spustí."""
+    if _browser_service["lock"] is None:
+        _browser_service["lock"] = asyncio.Lock()
+    async with _browser_service["lock"]:
+        endpoint = f"http://127.0.0.1:{SHARED_BROWSER_PORT}"
+        proc = _browser_service["proc"]
+        if proc is not None and proc.returncode is None:
+            info = await _browser_alive(endpoint)
+            if info:
+                _browser_service["version"] = info.get("Browser")
+                return endpoint
+            proc.kill()
+        try:
+            exe = await _chromium_executable()
+            profile_dir = Path(__file__).parent / ".shared-browser-profile"
+            proc = await asyncio.create_subprocess_exec(
+                exe,
+                f"--remote-debugging-port={SHARED_BROWSER_PORT}",
+                "--remote-debugging-address=127.0.0.1",
+                f"--user-data-dir={profile_dir}",
+                *SHARED_BROWSER_ARGS,
+                "about:blank",
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.DEVNULL,
+            )
+            _browser_service["proc"] = proc
+            for _ in range(50):
+                info = await _browser_alive(endpoint)
+                if info:
+                    _browser_service.update(
+                        endpoint=endpoint, error=None, version=info.get("Browser"),
+                        started_at=datetime.now().isoformat(),
+                    )
+                    print(f"[BROWSER] Sdílený browser běží na {endpoint}")
+                    return endpoint
+                if proc.returncode is not None:
+                    break
+                await asyncio.sleep(0.2)
+            raise RuntimeError("browser nenaběhl do 10 s")
+        except Exception as e:
+            _browser_service["error"] = str(e)
+            _browser_service["endpoint"] = None
+            print(f"[BROWSER] Sdílený browser nelze spustit: {e}")
+            return None
+
+
+async def _scraper_env(scraper: dict) -> dict:
+    """Prostředí pro subprocess scraperu (předá CDP endpoint sdíleného browseru)."""
+    env = dict(os.environ)
+    if SHARED_BROWSER and scraper.get("resources", {}).get("browser"):
+        endpoint = await _ensure_browser()
+        if endpoint:
+            env["SCRAPER_CDP_ENDPOINT"] = endpoint
+    return env
+
+
+# ============================================================
+# Plánovač běhů
+# ============================================================
+schedules: Dict[str, dict] = {}
+
+
+def _run_cost(run: dict) -> dict:
+    """Odhad prostředků běhu: počet browser oken a paměť v MB."""
+    scraper = SCRAPERS.get(run["scraper_id"], {})
+    res = scraper.get("resources", {})
+    if not res.get("browser"):
+        return {"workers": 0, "memory_mb": PLAIN_RUN_MB}
+    default = next((i.get("default") for i in scraper.get("inputs", []) if i["id"] == "workers"), "1")
+    raw = str(run["inputs"].get("workers") or default or "1").strip()
+    workers = int(raw) if raw.isdigit() and int(raw) > 0 else 1
+    base = SHARED_BASE_MB if SHARED_BROWSER and _browser_service.get("endpoint") else BROWSER_BASE_MB
+    return {"workers": workers, "memory_mb": base + workers * BROWSER_WORKER_MB}
+
+
+def _budget_used():
+    workers = memory = 0
+    for r in runs.values():
+        if r["status"] == "running":
+            cost = _run_cost(r)
+            workers += cost["workers"]
+            memory += cost["memory_mb"]
+    return workers, memory
+
+
+def _queued_runs() -> List[dict]:
+    queued = [r for r in runs.values() if r["status"] == "queued"]
+    return sorted(queued, key=lambda r: (-r.get("priority", 0), r.get("queued_at") or ""))
+
+
+def _enqueue_run(scraper: dict, inputs: Dict[str, str], priority: int = 0, schedule_id: str = None) -> dict:
+    run_id = str(uuid.uuid4())[:8]
+    run = {
+        "id": run_id,
+        "scraper_id": scraper["id"],
+        "scraper_name": scraper["name"],
+        "status": "queued",
+        "queued_at": datetime.now().isoformat(),
+        "started_at": None,
+        "finished_at": None,
+        "exit_code": None,
+        "inputs": inputs,
+        "priority": priority,
+        "schedule_id": schedule_id,
+        "progress": None,
+        "_logs": deque(maxlen=500),
+        "_subscribers": set(),
+        "_process": None,
+    }
+    runs[run_id] = run
+    _schedule()
+    return run
+
+
+def _schedule():
+    """Spustí čekající běhy, které se vejdou do rozpočtu.
+
+    Fronta je řazena podle priority a času zařazení. Pokud se první běh
+    nevejde do globálního rozpočtu, čeká se (menší běhy ho nepředbíhají,
+    aby velký běh nehladověl). Per-scraper limit souběhu naopak blokuje
+    jen běhy téhož scraperu.
+    """
+    used_workers, used_memory = _budget_used()
+    active = {}
+    for r in runs.values():
+        if r["status"] == "running":
+            active[r["scraper_id"]] = active.get(r["scraper_id"], 0) + 1
+
+    for run in _queued_runs():
+        scraper = SCRAPERS[run["scraper_id"]]
+        cap = scraper.get("resources", {}).get("max_parallel", 1)
+        if active.get(run["scraper_id"], 0) >= cap:
+            continue
+        cost = _run_cost(run)
+        nothing_running = not any(active.values())
+        fits = (used_workers + cost["workers"] <= WORKER_BUDGET
+                and used_memory + cost["memory_mb"] <= MEMORY_BUDGET_MB)
+        if not fits and not nothing_running:
+            break
+        if not fits:
+            # Běh je sám o sobě větší než rozpočet – spustíme ho samotný, jinak by čekal navždy
+            run["_logs"].append(f"[MANAGER] Běh přesahuje rozpočet ({cost}), spouštím ho samostatně.")
+        used_workers += cost["workers"]
+        used_memory += cost["memory_mb"]
+        active[run["scraper_id"]] = active.get(run["scraper_id"], 0) + 1
+        _start_queued(run, scraper)
+
+
+def _start_queued(run: dict, scraper: dict):
+    run["status"] = "running"
+    run["started_at"] = datetime.now().isoformat()
+    stdin_lines = _build_stdin(scraper, run["inputs"])
+    run["_temp_files"] = []
+    args = _build_args(scraper, run["inputs"], run["_temp_files"])
+    asyncio.create_task(_run_scraper(run["id"], scraper["script"], stdin_lines, args))
+
+
+# --- cron ---
+_CRON_RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+
+
+def _parse_cron_field(field: str, lo: int, hi: int) -> Set[int]:
+    values: Set[int] = set()
+    for part in field.split(","):
+        step = 1
+        if "/" in part:
+            part, step_s = part.split("/", 1)
+            step = int(step_s)
+            if step <= 0:
+                raise ValueError(f"krok musí být kladný: {field}")
+        if part == "*":
+            start, end = lo, hi
+        elif "-" in part:
+            a, b = part.split("-", 1)
+            start, end = int(a), int(b)
+        else:
+            start = end = int(part)
+            if step != 1:
+                end = hi
+        if start < lo or end > hi or start > end:
+            raise ValueError(f"hodnota mimo rozsah {lo}-{hi}: {field}")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+def _parse_cron(expr: str) -> List[Set[int]]:
+    """Parsuje 5polový cron výraz (minuta hodina den měsíc den_v_týdnu)."""
+    fields = expr.split()
+    if len(fields) != 5:
+        raise ValueError("očekáváno 5 polí: minuta hodina den měsíc den_v_týdnu")
+    parsed = [_parse_cron_field(f, lo, hi) for f, (lo, hi) in zip(fields, _CRON_RANGES)]
+    # Den v týdnu: 0 i 7 = neděle
+    if 7 in parsed[4]:
+        parsed[4] = (parsed[4] - {7}) | {0}
+    return parsed
+
+
+def _cron_matches(expr: str, dt: datetime) -> bool:
+    minute, hour, dom, month, dow = _parse_cron(expr)
+    if not (dt.minute in minute and dt.hour in hour and dt.month in month):
+        return False
+    day_ok, wday_ok = dt.day in dom, (dt.isoweekday() % 7) in dow
+    # Jako standardní cron: jsou-li omezené oba dny (pole nezačíná '*'), stačí shoda jednoho
+    dom_field, dow_field = expr.split()[2:5:2]
+    if not dom_field.startswith("*") and not dow_field.startswith("*"):
+        return day_ok or wday_ok
+    return day_ok and wday_ok
+
+
+def _load_schedules():
+    if not SCHEDULES_FILE.exists():
+        return
+    try:
+        for entry in json.loads(SCHEDULES_FILE.read_text(encoding="utf-8")):
+            schedules[entry["id"]] = entry
+    except Exception as e:
+        print(f"[SCHEDULE] Nepodařilo se načíst plány: {e}")
+
+
+def _save_schedules():
+    try:
+        with open(SCHEDULES_FILE, "w", encoding="utf-8") as f:
+            json.dump(list(schedules.values()), f, ensure_ascii=False, indent=2)
+    except Exception as e:
+        print(f"[SCHEDULE] Nepodařilo se uložit plány: {e}")
+
+
+def _fire_due_schedules(now: datetime):
+    minute_key = now.strftime("%Y-%m-%dT%H:%M")
+    changed = False
+    for sched in schedules.values():
+        if not sched.get("enabled", True) or sched.get("last_fired") == minute_key:
+            continue
+        try:
+            if not _cron_matches(sched["cron"], now):
+                continue
+        except ValueError:
+            continue
+        scraper = SCRAPERS.get(sched["scraper_id"])
+        if not scraper or not scraper.get("available"):
+            continue
+        sched["last_fired"] = minute_key
+        changed = True
+        # Předchozí běh téhož plánu ještě čeká nebo běží – nehromadíme je
+        if any(r.get("schedule_id") == sched["id"] and r["status"] in ("queued", "running") for r in runs.values()):
+            continue
+        _enqueue_run(scraper, dict(sched["inputs"]), sched.get("priority", 0), schedule_id=sched["id"])
+    if changed:
+        _save_schedules()
+
+
+async def _scheduler_loop():
+    while True:
+        try:
+            _fire_due_schedules(datetime.now())
+            _schedule()
+        except Exception as e:
+            print(f"[SCHEDULE] Chyba plánovače: {e}")
+        await asyncio.sleep(SCHEDULER_TICK)
 
 
 # ============================================================
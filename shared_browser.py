@@ -0,0 +1,86 @@
+"""Připojení ke sdílenému (teplému) Chromiu ze Scraper Manageru.
+
+Manager drží jeden dlouho běžící Chromium s CDP endpointem a jeho adresu
+předává scraperům v proměnné ``SCRAPER_CDP_ENDPOINT``. Scraper se pak jen
+připojí (``connect_over_cdp``) a vytváří si vlastní izolované kontexty –
+odpadá 2–5 s studeného startu browseru při každém běhu i testu.
+
+Při ručním spuštění (bez proměnné), v headful režimu nebo pokud sdílený
+browser neodpovídá, se spustí vlastní Chromium jako dřív.
+
+Víc webů v jednom procesu (``multi_site.py``) sdílí browser přímo:
+runner ho předá ``share_in_process`` a scrapery dostanou ``_BrowserLease``
+– ``close()`` zavře jen kontexty daného scraperu, ne celý browser.
+"""
+
+import os
+
+CDP_ENDPOINT = os.environ.get("SCRAPER_CDP_ENDPOINT")
+
+_in_process = None
+
+
+def share_in_process(browser):
+    """Headless scrapery v tomto procesu budou používat ``browser`` (None = vypnout)."""
+    global _in_process
+    _in_process = browser
+
+
+class _BrowserLease:
+    """Pohled na sdílený browser; ``close()`` zavře jen kontexty vytvořené přes něj."""
+
+    def __init__(self, browser):
+        self._browser = browser
+        self._contexts = set()
+
+    def __getattr__(self, name):
+        return getattr(self._browser, name)
+
+    async def new_context(self, **kw):
+        ctx = await self._browser.new_context(**kw)
+        self._contexts.add(ctx)
+        ctx.on("close", lambda _: self._contexts.discard(ctx))
+        return ctx
+
+    async def close(self):
+        contexts, self._contexts = list(self._contexts), set()
+        for ctx in contexts:
+            try:
+                await ctx.close()
+            except Exception:
+                pass
+
+
+async def launch_browser(playwright, *, headless=True, args=(), proxy_cfg=None, per_context_proxy=False, log=print):
+    """Vrátí ``(browser, context_proxy)``.
+
+    U sdíleného browseru nelze proxy nastavit při startu, proto se vrací
+    jako ``context_proxy`` a volající ji předá do ``new_context(proxy=...)``
+    (viz ``context_kwargs``). U vlastního browseru je proxy nastavena při
+    spuštění a ``context_proxy`` je None – pokud není ``per_context_proxy``,
+    pak se i vlastní browser spustí bez proxy a kontexty si ji nastaví samy
+    (v jednom browseru tak mohou vedle sebe běžet kontexty s proxy i bez ní).
+    """
+    if _in_process is not None and headless and _in_process.is_connected():
+        log("[browser] Používám browser sdílený v procesu")
+        return _BrowserLease(_in_process), proxy_cfg
+    if CDP_ENDPOINT and headless:
+        try:
+            browser = await playwright.chromium.connect_over_cdp(CDP_ENDPOINT, timeout=10000)
+            log(f"[browser] Připojeno ke sdílenému browseru {CDP_ENDPOINT}")
+            return browser, proxy_cfg
+        except Exception as e:
+            log(f"[browser] Sdílený browser nedostupný ({e}) – spouštím vlastní.")
+    kw = dict(headless=headless, args=list(args))
+    if per_context_proxy:
+        return await playwright.chromium.launch(**kw), proxy_cfg
+    if proxy_cfg:
+        kw["proxy"] = proxy_cfg
+    return await playwright.chromium.launch(**kw), None
+
+
+def context_kwargs(context_proxy, **kw):
+    """Doplní per-context proxy do argumentů ``browser.new_context``."""
+    if context_proxy:
+        kw["proxy"] = context_proxy
+    return kw
@@ -0,0 +1,145 @@
+"""Klient Shopware 6 Store API (JSON) nad Playwright ``APIRequestContext``.
+
+Storefront Shopware 6 má v HTML přístupový klíč sales channelu
+(``sw-access-key``, tvar ``SWSC…``) a ID aktuální kategorie
+(``window.activeNavigationId``). S nimi lze listingy, varianty, ceny
+i sklad číst přímo jako JSON z ``/store-api`` – bez renderování stránek
+a klikání na konfigurátor.
+
+Požadavky jdou přes ``context.request`` browser kontextu: sdílí pool
+spojení, proxy i cookies (včetně Cloudflare clearance) s browserem.
+"""
+
+import asyncio
+import html
+import re
+
+# Jedním evaluate: klíč ze storefrontu + ID kategorie aktuální stránky
+STOREFRONT_CONFIG_JS = """
+() => {
+    const m = document.documentElement.innerHTML.match(/SWSC[A-Z0-9]{20,}/);
+    return {
+        accessKey: window.accessKey || (m ? m[0] : null),
+        navigationId: window.activeNavigationId || null,
+    };
+}
+"""
+
+# Asociace potřebné pro řádek CSV (cena, sklad, obrázky, vlastnosti, kategorie)
+PRODUCT_ASSOCIATIONS = {
+    "cover": {"associations": {"media": {}}},
+    "media": {"associations": {"media": {}}},
+    "deliveryTime": {},
+    "options": {"associations": {"group": {}}},
+    "properties": {"associations": {"group": {}}},
+    "seoCategory": {},
+}
+
+
+class StoreApiError(RuntimeError):
+    """Store API vrátila chybu nebo neočekávanou odpověď."""
+
+
+async def read_storefront_config(page) -> dict:
+    """Vrátí ``{"accessKey": ..., "navigationId": ...}`` z načtené stránky storefrontu."""
+    return await page.evaluate(STOREFRONT_CONFIG_JS)
+
+
+class StoreApi:
+    def __init__(self, request, base_url: str, access_key: str, language_id: str = None, concurrency: int = 8):
+        self.request = request
+        self.base_url = base_url.rstrip('/')
+        self.headers = {
+            "sw-access-key": access_key,
+            "Accept": "application/json",
+            "Content-Type": "application/json",
+        }
+        if language_id:
+            self.headers["sw-language-id"] = language_id
+        self._sem = asyncio.Semaphore(concurrency)
+
+    async def post(self, path: str, body: dict = None) -> dict:
+        async with self._sem:
+            resp = await self.request.post(f"{self.base_url}/store-api/{path.lstrip('/')}",
+                                           headers=self.headers, data=body or {}, timeout=30000)
+            if not resp.ok:
+                raise StoreApiError(f"{path}: HTTP {resp.status} {(await resp.text())[:200]}")
+            try:
+                return await resp.json()
+            except Exception as e:
+                raise StoreApiError(f"{path}: odpověď není JSON ({e})") from e
+
+    async def use_language(self, locale_prefix: str = "en"):
+        """Nastaví jazyk kontextu podle kódu locale (např. 'en' → en-GB); vrátí ID nebo None."""
+        data = await self.post("language", {"associations": {"translationCode": {}}, "limit": 50})
+        for lang in data.get("elements", []):
+            code = ((lang.get("translationCode") or {}).get("code") or "").lower()
+            if code.startswith(locale_prefix.lower()):
+                self.headers["sw-language-id"] = lang["id"]
+                return lang["id"]
+        return None
+
+    async def listing(self, category_id: str, page: int, limit: int = 100):
+        """Jedna strana listingu kategorie → ``(produkty, celkem)``."""
+        data = await self.post(f"product-listing/{category_id}", {
+            "p": page,
+            "limit": limit,
+            "associations": PRODUCT_ASSOCIATIONS,
+        })
+        return data.get("elements", []), data.get("total") or 0
+
+    async def variants(self, parent_id: str):
+        """Všechny varianty rodičovského produktu."""
+        out, page = [], 1
+        while True:
+            data = await self.post("product", {
+                "filter": [{"type": "equals", "field": "parentId", "value": parent_id}],
+                "associations": PRODUCT_ASSOCIATIONS,
+                "p": page,
+                "limit": 100,
+            })
+            elements = data.get("elements", [])
+            out.extend(elements)
+            if len(elements) < 100:
+                return out
+            page += 1
+
+
+# === Pomocné funkce pro mapování entit ===
+
+def translated(entity: dict, field: str):
+    if not entity:
+        return None
+    return (entity.get("translated") or {}).get(field) or entity.get(field)
+
+
+def html_to_text(value: str) -> str:
+    if not value:
+        return ""
+    text = re.sub(r'<br\s*/?>|</p>|</li>|</div>', '\n', value, flags=re.I)
+    text = html.unescape(re.sub(r'<[^>]+>', '', text))
+    return "\n".join(l.strip() for l in text.splitlines() if l.strip())
+
+
+def media_urls(product: dict):
+    urls = []
+    cover = ((product.get("cover") or {}).get("media") or {}).get("url")
+    if cover:
+        urls.append(cover)
+    for pm in sorted(product.get("media") or [], key=lambda m: m.get("position") or 0):
+        url = (pm.get("media") or {}).get("url")
+        if url and url not in urls:
+            urls.append(url)
+    return urls
+
+
+def price_parts(product: dict):
+    """Vrátí ``(hrubá, čistá)`` cenu jako čísla, nebo ``(None, None)``."""
+    cp = product.get("calculatedPrice") or {}
+    if not cp and product.get("calculatedPrices"):
+        cp = product["calculatedPrices"][0]
+    total = cp.get("totalPrice", cp.get("unitPrice"))
+    if total is None:
+        return None, None
+    taxes = sum(t.get("tax") or 0 for t in cp.get("calculatedTaxes") or [])
+    return total, total - taxes
@@ -0,0 +1,134 @@
+"""Hledání produktových URL přes sitemapy místo stránkování listingů.
+
+Sitemapy (včetně sitemap indexů a ``.xml.gz``) se stahují streamovaně
+a parsují ``iterparse`` – v paměti je vždy jen jeden ``<url>`` záznam,
+takže i sitemapa se statisíci URL nezabere víc než pár MB.
+
+Každý web dodá vlastní filtry sekcí (``{název_sekce: funkce(url) -> bool}``),
+URL se rozdělí do sekcí podle prvního filtru, který sedí. ``SitemapState``
+si pamatuje ``lastmod`` zpracovaných produktů – při dalším běhu se
+produkty, které se od té doby nezměnily, přeskočí.
+"""
+
+import gzip
+import json
+import os
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from urllib.parse import urljoin
+
+from http_client import make_session, cloudflare_verdict, CloudflareBlocked
+
+
+def _local(tag: str) -> str:
+    return tag.rsplit('}', 1)[-1]
+
+
+def _iter_entries(session, url):
+    """Vrací ``(druh, loc, lastmod)`` z jednoho souboru sitemapy; druh je 'url' nebo 'sitemap'."""
+    with session.get(url, stream=True, timeout=30) as r:
+        if cloudflare_verdict(r.status_code, r.headers, r.url):
+            raise CloudflareBlocked(f"Cloudflare challenge ({r.status_code}) na {r.url}")
+        r.raise_for_status()
+        r.raw.decode_content = True
+        stream = r.raw
+        if url.split('?')[0].endswith('.gz') or 'gzip' in r.headers.get('content-type', ''):
+            stream = gzip.GzipFile(fileobj=r.raw)
+
+        loc = lastmod = None
+        for _, el in ET.iterparse(stream, events=("end",)):
+            tag = _local(el.tag)
+            if tag == 'loc':
+                loc = (el.text or '').strip()
+            elif tag == 'lastmod':
+                lastmod = (el.text or '').strip() or None
+            elif tag in ('url', 'sitemap'):
+                if loc:
+                    yield tag, loc, lastmod
+                loc = lastmod = None
+                el.clear()
+
+
+def iter_sitemap(session, url, _seen=None):
+    """Rekurzivně projde sitemapu / sitemap index; vrací ``(url, lastmod)`` produktů i stránek."""
+    seen = _seen if _seen is not None else set()
+    if url in seen:
+        return
+    seen.add(url)
+    for kind, loc, lastmod in _iter_entries(session, url):
+        if kind == 'sitemap':
+            yield from iter_sitemap(session, loc, seen)
+        else:
+            yield loc, lastmod
+
+
+def sitemap_roots(session, base_url: str):
+    """Sitemapy z ``robots.txt``; pokud tam nejsou, výchozí ``/sitemap.xml``."""
+    roots = []
+    try:
+        r = session.get(urljoin(base_url, "/robots.txt"), timeout=15)
+        if r.ok:
+            for line in r.text.splitlines():
+                if line.lower().startswith("sitemap:"):
+                    roots.append(line.split(":", 1)[1].strip())
+    except Exception:
+        pass
+    return roots or [urljoin(base_url, "/sitemap.xml")]
+
+
+class SitemapState:
+    """``lastmod`` již zpracovaných produktů (JSON ``{url: lastmod}``)."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.data = {}
+        if self.path.exists():
+            try:
+                self.data = json.loads(self.path.read_text(encoding='utf-8'))
+            except Exception:
+                self.data = {}
+
+    def unchanged(self, url: str, lastmod) -> bool:
+        """True pokud se produkt od posledního zpracování nezměnil (bez lastmod = vždy změněn)."""
+        return lastmod is not None and self.data.get(url) == lastmod
+
+    def mark(self, url: str, lastmod):
+        if lastmod is not None:
+            self.data[url] = lastmod
+
+    def save(self):
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        tmp.write_text(json.dumps(self.data, ensure_ascii=False), encoding='utf-8')
+        os.replace(tmp, self.path)
+
+
+def discover(base_url: str, sections: dict, state: SitemapState = None, session=None, log=print):
+    """Rozdělí produktové URL ze sitemap webu do sekcí.
+
+    ``sections`` je ``{název: funkce(url) -> bool}``. Vrací
+    ``({název: [(url, lastmod), ...]}, statistiky)``; nezměněné produkty
+    (podle ``state``) se vynechají. Statistiky: ``total`` (URL v sitemapách),
+    ``matched`` (produktů vybraných sekcí), ``skipped`` (beze změny).
+    Při Cloudflare challenge vyhodí CloudflareBlocked.
+    """
+    session = session or make_session()
+    found = {name: [] for name in sections}
+    seen_urls = set()
+    total = matched = skipped = 0
+    for root in sitemap_roots(session, base_url):
+        for url, lastmod in iter_sitemap(session, root):
+            total += 1
+            if url in seen_urls:
+                continue
+            seen_urls.add(url)
+            for name, matches in sections.items():
+                if matches(url):
+                    matched += 1
+                    if state is not None and state.unchanged(url, lastmod):
+                        skipped += 1
+                    else:
+                        found[name].append((url, lastmod))
+                    break
+    log(f"[sitemap] {total} URL v sitemapách, {matched} produktů vybraných sekcí, "
+        f"{skipped} beze změny přeskočeno")
+    return found, {"total": total, "matched": matched, "skipped": skipped}
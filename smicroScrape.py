@@ -1,13 +1,33 @@
 import requests
-
-WARP_PROXY = {"http": "socks5h://127.0.0.1:40000", "https": "socks5h://127.0.0.1:40000"}
 from bs4 import BeautifulSoup
 import csv
 import os
 import re
+import time
 from urllib.parse import urljoin
 import pandas as pd
 
+from http_client import cloudflare_verdict
+from proxy_pool import default_pool, requests_proxies, is_requests_proxy_error
+
+
+def _get(url):
+    """GET přes proxy z poolu (``SCRAPER_PROXIES``); poolu hlásí latenci, výpadek proxy i ban."""
+    pool = default_pool()
+    proxy = pool.assign("smicro")
+    t0 = time.monotonic()
+    try:
+        r = requests.get(url, proxies=requests_proxies(proxy), timeout=30)
+    except requests.exceptions.RequestException as e:
+        if is_requests_proxy_error(e):
+            pool.report(proxy, False)
+        raise
+    if r.status_code == 429 or cloudflare_verdict(r.status_code, r.headers, r.url):
+        pool.ban(proxy, f"HTTP {r.status_code}")
+    else:
+        pool.report(proxy, True, (time.monotonic() - t0) * 1000)
+    return r
+
 
 def smicro_scrape_product_page():
     """Hlavní funkce pro scrapování produktů ze seznamu stránek"""
@@ -30,7 +50,7 @@ def smicro_scrape_product_page():
         print(f"Scrapuji stránku: {page + 1}")
 
         # Získání HTML obsahu
-        response = requests.get(url, proxies=WARP_PROXY)
+        response = _get(url)
         if response.status_code != 200:
             print(f"Chyba při načítání stránky: {response.status_code}")
             break
@@ -133,7 +153,7 @@ def convert_csv_to_excel(csv_filename):
 
 def smicro_scrape_product_details(url):
     """Funkce pro scrapování detailů jednotlivého produktu"""
-    response = requests.get(url, proxies=WARP_PROXY)
+    response = _get(url)
     if response.status_code != 200:
         print(f"Chyba při načítání produktu: {response.status_code}")
         return None
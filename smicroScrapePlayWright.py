@@ -7,21 +7,41 @@ import time
 import random
 from datetime import datetime, timezone
 from pathlib import Path
-from urllib.parse import urlparse, urlunparse, urlencode, parse_qsl, urljoin
+from urllib.parse import urlparse, urlunparse, urlencode, parse_qsl, urljoin, quote_plus
 
 from playwright.async_api import async_playwright, Page, TimeoutError as PlaywrightTimeoutError
 
+import scrape_events as events
+from shared_browser import launch_browser, context_kwargs
+from http_client import make_session, get_soup, CloudflareBlocked
+from resource_policy import ResourcePolicy
+from browser_state import BrowserState
+from context_pool import ManagedContext, ProxyLanes, supervised, supervised_batches
+from proxy_pool import ProxyPool, playwright_proxy, is_proxy_error
+from extract_schema import extract, extract_static
+from listing_pages import discover_page_size, with_page_size
+from hedge import NavHedger
+from pw_tracer import TRACER
+import sampling_profiler
+from engine_probe import EngineChoice, probe
+from worker_budget import worker_slots
+from retry_queue import RetryQueue
+from part_lookup import parts_arg, load_parts, browser_search, run_part_lookup, NegativeCache
+
 # === KONFIGURACE ===
 BASE_URL = "https://smicro.cz"
 START_URL = "https://smicro.cz"
 SCRIPT_DIR = Path(__file__).resolve().parent
 PROGRESS_FILE = SCRIPT_DIR / "smicroScrapeLastProduct.json"
+# Parametr velikosti stránky listingu; zda ho web přijímá, ověří discover_page_size
+PAGE_SIZE_PARAM = "limit"
+SEARCH_URL = f"{BASE_URL}/vyhledavani?q={{}}"
 
 
 # === SPRÁVA PROGRESSU ===
-def save_progress(category, page, done_urls=None):
+def save_progress(category, page, done_urls=None, page_size=None):
     try:
-        data = {"category": category, "page": page}
+        data = {"category": category, "page": page, "page_size": page_size}
         if done_urls is not None:
             data["done_urls"] = list(done_urls)
         with open(PROGRESS_FILE, 'w', encoding='utf-8') as f:
@@ -47,6 +67,12 @@ def clear_progress():
         pass
 
 
+# === VÝJIMKY ===
+class ProxyConnectionError(Exception):
+    """Proxy selhala – produkt se zopakuje v kontextu s jinou proxy (ProxyLanes)."""
+    pass
+
+
 # === POMOCNÉ FUNKCE ===
 def dbg(msg):
     ts = time.strftime("%H:%M:%S")
@@ -151,7 +177,12 @@ async def get_categories(context):
         await page.close()
 
 
-async def get_listing_product_urls(page: Page, category_url, page_num):
+async def _count_listing(page: Page, category_url, page_size):
+    """Počet produktů na 1. straně listingu při dané velikosti stránky (pro discover_page_size)."""
+    return len(await get_listing_product_urls(page, category_url, 1, page_size))
+
+
+async def get_listing_product_urls(page: Page, category_url, page_num, page_size=None):
     target_url = category_url
     separator = "&" if "?" in category_url else "?"
 
@@ -160,6 +191,7 @@ async def get_listing_product_urls(page: Page, category_url, page_num):
             target_url = re.sub(r'page=\d+', f'page={page_num}', target_url)
         else:
             target_url = f"{target_url}{separator}page={page_num}"
+    target_url = with_page_size(target_url, PAGE_SIZE_PARAM, page_size)
 
     dbg(f"  > Listing page {page_num}: {target_url}")
 
@@ -191,7 +223,57 @@ async def get_listing_product_urls(page: Page, category_url, page_num):
     return []
 
 
-async def extract_product_data(page: Page, url, variant_name="Standard"):
+# Karty produktů na listingu – pro režim --listing-only (bez otevírání detailů)
+CARD_SCHEMA = {
+    "cards": {"each": "#productAjaxPagerContainer .item", "fields": {
+        "href": {"sel": "h3 a", "attr": "href"},
+        "name": {"sel": "h3 a"},
+        "price_no_vat": {"first": [{"sel": ".cena strong"}, {"sel": ".cena"}]},
+        "price_vat": {"first": [{"sel": ".cenaDph strong"}, {"sel": ".cenaDph"}]},
+        "avail": {"first": [{"sel": ".dostupnost"}, {"sel": ".skladem"}, {"sel": "[class*='dostup']"}]},
+    }},
+}
+
+
+async def listing_card_rows(page: Page):
+    """Řádky CSV z karet aktuálně načteného listingu (jeden evaluate).
+
+    Vrací seznam ``(url, row)``; pole, která karta neukazuje, jsou N/A.
+    """
+    raw = await extract(page, CARD_SCHEMA)
+    out = []
+    for c in raw.get('cards') or []:
+        if not c.get('href'):
+            continue
+        url = urljoin(BASE_URL, c['href'])
+        out.append((url, [
+            clean_text(c.get('name') or '') or 'N/A',
+            'Listing',
+            'N/A',
+            'N/A',
+            clean_text(c['avail']) if c.get('avail') else 'N/A',
+            'N/A',
+            parse_price(c['price_no_vat']) if c.get('price_no_vat') else 'N/A',
+            parse_price(c['price_vat']) if c.get('price_vat') else 'N/A',
+            'N/A',
+            url
+        ]))
+    return out
+
+
+# Deklarativní schéma detailu produktu – úprava webu = úprava schématu
+PRODUCT_SCHEMA = {
+    "name": {"sel": "h1"},
+    "data_rows": {"rows": "table.tabData tr", "key": "th", "value": "td", "prefer": "u"},
+    "price_no_vat": {"sel": ".detPrice .cena strong"},
+    "price_vat": {"sel": ".detPrice .cenaDph strong"},
+    "desc": {"sel": "div#popis"},
+    "params": {"rows": "table.tabParam tr", "key": "th", "value": "td"},
+}
+
+
+def map_product_fields(raw, url, variant_name="Standard"):
+    """Převede výstup PRODUCT_SCHEMA (browser i statické HTML) na řádek pro CSV."""
     data = {
         'name': 'N/A',
         'variant': variant_name,
@@ -205,171 +287,214 @@ async def extract_product_data(page: Page, url, variant_name="Standard"):
         'url': url
     }
 
+    if raw.get('name') is not None:
+        data['name'] = clean_text(raw['name'])
+
+    for th, td, u in raw.get('data_rows') or []:
+        header = clean_text(th).lower()
+        val = clean_text(td)
+
+        if "part number" in header:
+            data['part_number'] = val
+        elif "kód produktu" in header and data['part_number'] == 'N/A':
+            data['part_number'] = val
+
+        if "výrobce" in header:
+            data['manufacturer'] = val
+
+        if "dostupnost u nás" in header:
+            data['avail_local'] = clean_text(u) if u is not None else val
+
+        if "dostupnost u dodavatele" in header:
+            data['avail_supplier'] = clean_text(u) if u is not None else val
+
+    if raw.get('price_no_vat') is not None:
+        data['price_no_vat'] = parse_price(raw['price_no_vat'])
+    if raw.get('price_vat') is not None:
+        data['price_vat'] = parse_price(raw['price_vat'])
+
+    desc_parts = []
+    if raw.get('desc') is not None:
+        desc_parts.append(clean_text(raw['desc'][:1200]))
+
+    specs_list = [f"{clean_text(k)}: {clean_text(v)}" for k, v, _ in raw.get('params') or []]
+    if specs_list:
+        desc_parts.append("PARAMETRY: " + " | ".join(specs_list))
+
+    data['specs'] = " ; ".join(desc_parts)
+    return data
+
+
+async def extract_product_data(page: Page, url, variant_name="Standard"):
+    raw = {}
     try:
         # Čekáme na H1, což značí, že se stránka vykreslila
         await page.wait_for_selector('h1', timeout=15000)
+        raw = await extract(page, PRODUCT_SCHEMA)
+    except Exception as e:
+        dbg(f"Chyba extrakce dat {url}: {e}")
+
+    return map_product_fields(raw, url, variant_name)
+
+
+def product_row(d):
+    return [
+        d['name'],
+        d['variant'],
+        d['part_number'],
+        d['manufacturer'],
+        d['avail_local'],
+        d['avail_supplier'],
+        d['price_no_vat'],
+        d['price_vat'],
+        d['specs'],
+        d['url']
+    ]
+
 
-        h1 = page.locator('h1').first
-        if await h1.count() > 0:
-            data['name'] = clean_text(await h1.inner_text())
-
-        rows = await page.locator('table.tabData tr').all()
-        for row in rows:
-            th = row.locator('th')
-            td = row.locator('td')
-
-            if await th.count() > 0 and await td.count() > 0:
-                header = clean_text(await th.inner_text()).lower()
-                val = clean_text(await td.inner_text())
-
-                if "part number" in header:
-                    data['part_number'] = val
-                elif "kód produktu" in header and data['part_number'] == 'N/A':
-                    data['part_number'] = val
-
-                if "výrobce" in header:
-                    data['manufacturer'] = val
-
-                if "dostupnost u nás" in header:
-                    u_tag = td.locator('u')
-                    if await u_tag.count() > 0:
-                        data['avail_local'] = clean_text(await u_tag.inner_text())
-                    else:
-                        data['avail_local'] = val
-
-                if "dostupnost u dodavatele" in header:
-                    u_tag = td.locator('u')
-                    if await u_tag.count() > 0:
-                        data['avail_supplier'] = clean_text(await u_tag.inner_text())
-                    else:
-                        data['avail_supplier'] = val
-
-        price_box = page.locator('.detPrice').first
-        if await price_box.count() > 0:
-            no_vat = price_box.locator('.cena strong')
-            if await no_vat.count() > 0:
-                data['price_no_vat'] = parse_price(await no_vat.inner_text())
-
-            with_vat = price_box.locator('.cenaDph strong')
-            if await with_vat.count() > 0:
-                data['price_vat'] = parse_price(await with_vat.inner_text())
-
-        desc_parts = []
-        # Opravený selektor pro popis, aby nebral <hr>
-        desc_div = page.locator('div#popis').first
-        if await desc_div.count() > 0:
-            full_text = await desc_div.inner_text()
-            desc_parts.append(clean_text(full_text[:1200]))
-
-        param_rows = await page.locator('table.tabParam tr').all()
-        specs_list = []
-        for pr in param_rows:
-            th = pr.locator('th')
-            td = pr.locator('td')
-            if await th.count() > 0 and await td.count() > 0:
-                k = clean_text(await th.inner_text())
-                v = clean_text(await td.inner_text())
-                specs_list.append(f"{k}: {v}")
-
-        if specs_list:
-            desc_parts.append("PARAMETRY: " + " | ".join(specs_list))
-
-        data['specs'] = " ; ".join(desc_parts)
+# Hedging pomalých navigací detailu (--hedge), časy se měří vždy
+NAV_HEDGE = NavHedger("smicro", log=dbg)
 
+# Engine detailu podle engine_profile.json (--probe-engine); detail smicro je vykreslený serverem
+PRODUCT_ENGINE = EngineChoice("smicro", "product", log=dbg)
+
+
+def scrape_product_static(session, url):
+    """Detail přes HTTP (engine "http") – řádky, nebo None (volající použije browser)."""
+    try:
+        raw = extract_static(get_soup(session, url), PRODUCT_SCHEMA)
+    except CloudflareBlocked as e:
+        PRODUCT_ENGINE.demote(e)
+        return None
     except Exception as e:
-        dbg(f"Chyba extrakce dat {url}: {e}")
+        dbg(f"    HTTP detail {url} selhal ({e}) – zkouším browser")
+        return None
+    if raw.get('name') is None or not raw.get('data_rows'):
+        PRODUCT_ENGINE.demote("detail bez H1/tabulky dat")
+        return None
+    return [product_row(map_product_fields(raw, url))]
 
-    return data
 
+async def scrape_product(context, url, semaphore, retries=None, session=None, nojs=False):
+    # Náhodný delay pro bezpečnost – před slotem, aby čekání neblokovalo worker
+    await asyncio.sleep(random.uniform(1.0, 3.0))
 
-async def scrape_product(context, url, semaphore):
     async with semaphore:
-        # Zvýšený náhodný delay pro bezpečnost
-        await asyncio.sleep(random.uniform(1.0, 3.0))
-
-        page = await context.new_page()
+        t0 = time.monotonic()
+        if session is not None and PRODUCT_ENGINE.engine == "http":
+            rows = await asyncio.to_thread(scrape_product_static, session, url)
+            if rows:
+                events.timing("product", t0)
+                return rows, url
+
+        # Kontext bez JS patří k lane (stejná proxy, po failoveru/recyklaci se vymění s ním)
+        page_context = context
+        if nojs and PRODUCT_ENGINE.engine == "nojs":
+            try:
+                page_context = await context.nojs()
+                page = await page_context.new_page()
+            except Exception as e:
+                PRODUCT_ENGINE.demote(e)  # kontext bez JS nejde otevřít (např. pád browseru)
+                page_context = context
+        if page_context is context:
+            page = await context.new_page()
         all_extracted = []
 
         try:
-            # Neblokujeme nic, aby se stránka načetla přirozeně a nevypadalo to podezřele
-            # Maximálně můžeme blokovat obrázky, pokud server nehlídá fingerprinting
-            await page.route("**/*.{png,jpg,jpeg,gif,webp}", lambda route: route.abort())
-
-            loaded = False
-            attempt = 0
-            while True:
-                attempt += 1
-                try:
-                    await page.goto(url, timeout=90000, wait_until="commit")
-                    loaded = True
-                    break
-                except Exception as e:
-                    err_str = str(e)
-                    if "ERR_SOCKS_CONNECTION_FAILED" in err_str:
-                        dbg(f"    Proxy nedostupná ({url}) – ban detekován. Čekám 15 minut před pokusem {attempt + 1}...")
-                        await asyncio.sleep(15 * 60)
-                    elif attempt >= 3:
-                        dbg(f"    Chyba ({url}) po {attempt} pokusech: {err_str[:50]}...")
-                        break
-                    else:
-                        dbg(f"    Timeout/Error ({url}) pokus {attempt}: {err_str[:50]}...")
-                        await asyncio.sleep(3)
-
-            if not loaded:
-                dbg(f"SKIP: Nepodařilo se načíst {url}")
-                return []
+            try:
+                page, _ = await NAV_HEDGE.goto(page_context, page, url, timeout=90000, wait_until="commit")
+            except Exception as e:
+                # Selhání proxy (SOCKS, tunel) není chyba URL – ProxyLanes přesune kontexty na jiný exit
+                if is_proxy_error(e):
+                    raise ProxyConnectionError(f"Proxy selhala u produktu {url}: {e}") from e
+                # Opakování se naplánuje do fronty a slot se hned uvolní
+                reason = f"Timeout/Error: {str(e)[:50]}..."
+                if retries is None or not retries.defer(url, reason):
+                    dbg(f"SKIP: Nepodařilo se načíst {url} ({reason})")
+                    events.error(url, "nepodařilo se načíst")
+                return [], url
 
             base_data = await extract_product_data(page, url)
+            if page_context is not context and base_data['name'] == 'N/A':
+                PRODUCT_ENGINE.demote("detail bez JS nemá data")
+                raise RuntimeError("detail bez JS nemá data")
             all_extracted.append(base_data)
 
-            rows_to_return = []
-            for d in all_extracted:
-                rows_to_return.append([
-                    d['name'],
-                    d['variant'],
-                    d['part_number'],
-                    d['manufacturer'],
-                    d['avail_local'],
-                    d['avail_supplier'],
-                    d['price_no_vat'],
-                    d['price_vat'],
-                    d['specs'],
-                    d['url']
-                ])
+            rows_to_return = [product_row(d) for d in all_extracted]
 
+            events.timing("product", t0)
             return rows_to_return, url
 
+        except ProxyConnectionError:
+            raise
         except Exception as e:
-            dbg(f"Kritická chyba produktu {url}: {e}")
-            return []
+            if is_proxy_error(e):
+                raise ProxyConnectionError(f"Proxy selhala u produktu {url}: {e}") from e
+            if retries is None or not retries.defer(url, f"chyba: {e}"):
+                dbg(f"Kritická chyba produktu {url}: {e}")
+                events.error(url, e)
+            return [], url
         finally:
             await page.close()
 
 
 # === TEST MODE ===
+def run_http_test() -> bool:
+    """Rychlý test bez browseru: kategorie, listing a tabulka dat prvního produktu.
+
+    Vrátí True při úspěchu; při Cloudflare challenge vyhodí CloudflareBlocked
+    a volající pokračuje browser testem (run_test).
+    """
+    print("=== SMICRO.CZ Test (HTTP) ===")
+    session = make_session()
+    soup = get_soup(session, START_URL)
+
+    categories = {}
+    for link in soup.select('.categories.HPcategories ol li a'):
+        desc = link.select_one('.mDesc')
+        href = link.get('href')
+        if desc and href and desc.get_text(strip=True):
+            categories[clean_text(desc.get_text())] = urljoin(BASE_URL, href)
+    if not categories:
+        raise RuntimeError("Nepodařilo se načíst kategorie")
+    cat_name, cat_url = next(iter(categories.items()))
+    print(f"[1/3] Kategorie OK – načteno {len(categories)}, první: '{cat_name}'")
+
+    sep = "&" if "?" in cat_url else "?"
+    listing = get_soup(session, f"{cat_url}{sep}page=1")
+    urls = {urljoin(BASE_URL, a.get('href')) for a in listing.select('#productAjaxPagerContainer .item h3 a') if a.get('href')}
+    if not urls:
+        raise RuntimeError("Žádné produkty na straně 1")
+    print(f"[2/3] Listing OK – {len(urls)} URL na straně 1")
+
+    prod_url = sorted(urls)[0]
+    raw = extract_static(get_soup(session, prod_url), PRODUCT_SCHEMA)
+    if raw.get('name') is None or not raw.get('data_rows'):
+        raise RuntimeError(f"Detail produktu bez H1/tabulky dat: {prod_url}")
+    data = map_product_fields(raw, prod_url)
+    print(f"[3/3] Produkt OK: {data['name']} (PN: {data['part_number']}, cena: {data['price_no_vat']})")
+    print("=== TEST OK === (HTTP)")
+    return True
+
+
 async def run_test():
-    import socket
     print("=== SMICRO.CZ Test ===")
     try:
-        proxy_url = "socks5://127.0.0.1:40000"
-        try:
-            host, port = proxy_url.replace("socks5://", "").split(":")
-            s = socket.create_connection((host, int(port)), timeout=3)
-            s.close()
-            proxy_cfg = {"server": proxy_url}
-        except Exception:
-            proxy_cfg = None
+        pool = ProxyPool.from_env(log=dbg)
+        await asyncio.to_thread(pool.probe_all)
+        proxy_cfg = playwright_proxy(pool.assign("test"))
+        if not proxy_cfg:
             print("[test] Proxy nedostupná – připojuji přímo")
 
         async with async_playwright() as p:
-            launch_kw = {"headless": True, "args": ["--disable-blink-features=AutomationControlled"]}
-            if proxy_cfg:
-                launch_kw["proxy"] = proxy_cfg
-            browser = await p.chromium.launch(**launch_kw)
-            context = await browser.new_context(
+            browser, ctx_proxy = await launch_browser(
+                p, headless=True, args=["--disable-blink-features=AutomationControlled"], proxy_cfg=proxy_cfg)
+            context = await browser.new_context(**context_kwargs(
+                ctx_proxy,
                 user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36",
                 viewport={"width": 1400, "height": 900}
-            )
+            ))
+            await ResourcePolicy("smicro").install(context)
             # 1) Kategorie
             categories = await get_categories(context)
             if not categories:
@@ -413,63 +538,164 @@ async def run_test():
         sys.exit(1)
 
 
+# === SONDA ENGINE (--probe-engine) ===
+async def run_engine_probe(context, categories):
+    """Porovná HTTP / browser bez JS / plný render na vzorku detailů (engine_profile.json).
+
+    Listing se nesonduje – smicro ho vždy načítá v browseru.
+    """
+    session = await asyncio.to_thread(make_session, True, 4, "smicro")
+    nojs = await context.sibling(java_script_enabled=False)
+    try:
+        list_page = await context.new_page()
+        try:
+            product_urls = await get_listing_product_urls(list_page, next(iter(categories.values())), 1)
+        finally:
+            await list_page.close()
+        await probe("smicro", "product", product_urls, PRODUCT_SCHEMA, context, nojs,
+                    lambda u: get_soup(session, u), log=dbg)
+    finally:
+        await nojs.close()
+
+
 # === HLAVNÍ SMYČKA ===
 async def main():
+    sampling_profiler.watch(dbg)
     if '--test' in sys.argv:
+        if '--browser' not in sys.argv:
+            try:
+                if await asyncio.to_thread(run_http_test):
+                    sys.exit(0)
+            except CloudflareBlocked as e:
+                print(f"[test] {e} – zkouším browser")
+            except Exception as e:
+                print(f"TEST ERROR: {e}")
+                sys.exit(1)
         await run_test()
         return
 
-    import socket
     print("=== SMICRO.CZ Scraper (Headful Version) ===")
+    listing_only = '--listing-only' in sys.argv
+    NAV_HEDGE.enabled = '--hedge' in sys.argv
+    if '--trace-calls' in sys.argv:
+        TRACER.enable("smicro")
+    parts_file = parts_arg(sys.argv)
+    if parts_file:
+        print(f"Režim: vyhledání part numberů ze souboru {parts_file}")
+    elif listing_only:
+        print("Režim: jen listing (karty produktů, bez detailů)")
     csv_name = "smicro_products.csv"
 
     print("DOPORUČENÍ: Pro stabilitu zadejte max 2 nebo 3 workery.")
     w_input = input("Počet workerů (okno) [2]: ").strip()
     max_concurrent = int(w_input) if w_input.isdigit() else 2
 
-    proxy_url = "socks5://127.0.0.1:40000"
-    try:
-        s = socket.create_connection(("127.0.0.1", 40000), timeout=3)
-        s.close()
-        proxy_cfg = {"server": proxy_url}
-        print("[proxy] WARP proxy dostupná – připojuji přes proxy.")
-    except Exception:
-        proxy_cfg = None
+    # Proxy z poolu (SCRAPER_PROXIES); žádná použitelná = přímé připojení
+    pool = ProxyPool.from_env(log=dbg)
+    await asyncio.to_thread(pool.probe_all)
+    proxy_url = ProxyLanes.first_proxy(pool, "smicro")
+    if proxy_url:
+        print(f"[proxy] Proxy {proxy_url} dostupná – připojuji přes proxy.")
+    else:
         print("[proxy] Proxy nedostupná – připojuji přímo (bez proxy).")
 
+    # Blokujeme jen obrázky a trackery, aby se stránka načetla přirozeně
+    # a nevypadalo to podezřele (viz RULESETS v resource_policy.py)
+    policy = ResourcePolicy("smicro")
+
     async with async_playwright() as p:
-        def make_context_args(use_proxy):
-            kw = {
-                "headless": True,
-                "args": ["--disable-blink-features=AutomationControlled"],
-            }
-            if use_proxy and proxy_cfg:
-                kw["proxy"] = proxy_cfg
-            return kw
-
-        browser = await p.chromium.launch(**make_context_args(True))
-        context = await browser.new_context(
-            user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36",
-            viewport={"width": 1400, "height": 900}
-        )
+        def context_for(proxy):
+            """``(factory, on_retire)`` kontextu přes danou proxy (URL, None = přímo)."""
+            cfg = playwright_proxy(proxy)
+
+            async def new_scrape_context(br, **extra):
+                ctx = await br.new_context(**context_kwargs(
+                    cfg,
+                    user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36",
+                    viewport={"width": 1400, "height": 900},
+                    **BrowserState("smicro", cfg).kwargs(dbg),
+                    **extra,
+                ))
+                await policy.install(ctx)
+                return ctx
+
+            return new_scrape_context, lambda old: BrowserState("smicro", cfg).save(old, dbg)
+
+        async def open_browser(proxy):
+            async def launch():
+                br, _ = await launch_browser(
+                    p,
+                    headless=True,
+                    args=["--disable-blink-features=AutomationControlled"],
+                    proxy_cfg=playwright_proxy(proxy),
+                    per_context_proxy=True,  # proxy per kontext – lanes a failover bez restartu browseru
+                    log=dbg,
+                )
+                return br
+
+            br = await launch()
+            factory, on_retire = context_for(proxy)
+            ctx = ManagedContext(br, await factory(br), factory=factory, launch=launch,
+                                 on_retire=on_retire, log=dbg)
+            # Workery rozložené po exitech poolu; ban (Cloudflare, 429) / výpadek přesune jen dotčené kontexty
+            return br, ctx, ProxyLanes(ctx, context_for, pool, "smicro", proxy, log=dbg)
+
+        browser, context, lanes = await open_browser(proxy_url)
+
+        async def scrape_lane(u, semaphore, retries=None, session=None, nojs=False):
+            # Při chybě proxy se produkt zopakuje v kontextu s jinou proxy, pak se odloží do fronty
+            try:
+                return await lanes.run(
+                    lambda ctx: scrape_product(ctx, u, semaphore, retries, session, nojs),
+                    ProxyConnectionError)
+            except ProxyConnectionError as e:
+                if retries is None or not retries.defer(u, str(e)):
+                    dbg(f"SKIP: {e}")
+                    events.error(u, e)
+                return [], u
+
+        if parts_file:
+            writer = CsvWriter(csv_name)
+            semaphore = worker_slots("smicro", max_concurrent)
+            await lanes.start(max_concurrent)
+            await run_part_lookup(
+                load_parts(parts_file),
+                lambda pn: browser_search(context, SEARCH_URL.format(quote_plus(pn)),
+                                          '#productAjaxPagerContainer .item h3 a', 'table.tabData'),
+                lambda urls: supervised_batches(context, urls, lambda u: scrape_lane(u, semaphore), log=dbg),
+                writer, NegativeCache("smicro"), concurrency=max_concurrent, log=dbg,
+            )
+            await context.save_state()
+            policy.report(dbg)
+            NAV_HEDGE.report(dbg)
+            TRACER.report(dbg)
+            lanes.stop()
+            await context.browser.close()
+            return
 
         # Načtení kategorií – při selhání přes proxy zkusíme přímo
         categories = await get_categories(context)
 
-        if not categories and proxy_cfg:
+        if not categories and proxy_url:
             print("[proxy] Kategorie nenačteny přes proxy – zkouším přímé připojení...")
+            pool.mark_down(proxy_url, "kategorie nenačteny")
+            lanes.stop()
+            await context.close()
             await browser.close()
-            proxy_cfg = None
-            browser = await p.chromium.launch(**make_context_args(False))
-            context = await browser.new_context(
-                user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36",
-                viewport={"width": 1400, "height": 900}
-            )
+            proxy_url = None
+            browser, context, lanes = await open_browser(None)
             categories = await get_categories(context)
 
         if not categories:
             print("Nepodařilo se načíst žádné kategorie. Zkontrolujte připojení.")
-            await browser.close()
+            lanes.stop()
+            await context.browser.close()
+            return
+
+        if '--probe-engine' in sys.argv:
+            await run_engine_probe(context, categories)
+            lanes.stop()
+            await context.browser.close()
             return
 
         print("\nNalezené kategorie:")
@@ -496,7 +722,8 @@ async def main():
                 urls_to_scrape.append((name, categories[name]))
         else:
             print("Neplatná volba.")
-            await browser.close()
+            lanes.stop()
+            await context.browser.close()
             return
 
         # Načtení progressu
@@ -516,8 +743,33 @@ async def main():
         resume_done_urls = set(progress.get('done_urls', [])) if progress and start_cat_name else set()
         is_on_resume_page = start_cat_name is not None
 
+        # Velikost stránky listingu: při resume ta uložená (čísla stránek na ní závisí),
+        # jinak největší, kterou web přijme
+        if start_cat_name is not None:
+            page_size = progress.get('page_size')
+        else:
+            probe_page = await context.new_page()
+            try:
+                first_url = urls_to_scrape[0][1]
+                page_size = await discover_page_size(
+                    lambda size: _count_listing(probe_page, first_url, size), log=dbg)
+            finally:
+                await probe_page.close()
+
         writer = CsvWriter(csv_name)
-        semaphore = asyncio.Semaphore(max_concurrent)
+        semaphore = worker_slots("smicro", max_concurrent)
+        retries = RetryQueue("smicro", log=dbg)
+
+        # Detail nejlevnějším enginem, který ověřila sonda (--probe-engine); jinak plný render
+        session = None
+        if PRODUCT_ENGINE.load() == "http":
+            session = await asyncio.to_thread(make_session, True, max_concurrent, "smicro")
+        nojs = PRODUCT_ENGINE.engine == "nojs"
+
+        await lanes.start(max_concurrent)
+
+        def scrape(u):
+            return scrape_lane(u, semaphore, retries, session, nojs)
 
         total_products = 0
         skip_to_cat = start_cat_name is not None
@@ -538,7 +790,18 @@ async def main():
             start_page = 1  # jen pro první kategorii po restartu
 
             while True:
-                product_urls = await get_listing_product_urls(list_page, cat_url, curr_page_num)
+                # Obnova po pádu / recyklace kontextu jen mezi stranami – produkty předchozí strany jsou hotové
+                list_page = await context.checkpoint(list_page)
+
+                t_listing = time.monotonic()
+                try:
+                    product_urls = await get_listing_product_urls(list_page, cat_url, curr_page_num, page_size)
+                except Exception:
+                    if not context.crashed:
+                        raise
+                    print("  > Browser spadl při načítání listingu – obnovuji a opakuji stranu...")
+                    continue
+                events.timing("listing", t_listing)
 
                 if not product_urls:
                     print(f"  > Strana {curr_page_num} je prázdná. Konec kategorie.")
@@ -558,28 +821,63 @@ async def main():
                 else:
                     print(f"  > Strana {curr_page_num}: Nalezeno {len(product_urls)} produktů. Zpracovávám...")
 
-                if filtered:
-                    tasks = []
-                    for u in filtered:
-                        tasks.append(asyncio.create_task(scrape_product(context, u, semaphore)))
+                page_done = skipped
+                cat_idx = [n for n, _ in urls_to_scrape].index(cat_name)
+
+                if listing_only:
+                    card_rows = [(u, r) for u, r in await listing_card_rows(list_page) if u not in done_urls_page]
+                    writer.write([r for _, r in card_rows])
+                    total_products += len(card_rows)
+                    events.rows(len(card_rows))
+                    events.progress(cat_name, curr_page_num, len(product_urls), len(product_urls),
+                                    cat_idx, len(urls_to_scrape))
+                    save_progress(cat_name, curr_page_num + 1, page_size=page_size)
+                    curr_page_num += 1
+                    continue
 
-                    for res in asyncio.as_completed(tasks):
-                        rows, url = await res
+                events.progress(cat_name, curr_page_num, page_done, len(product_urls), cat_idx, len(urls_to_scrape))
+
+                # K dávce se přidají odložené produkty, které už jsou na řadě
+                due = retries.pop_due()
+                if filtered or due:
+                    # Produkty rozpracované při pádu browseru se po obnově zkusí znovu
+                    async for rows, url in supervised(context, filtered + due, scrape, log=dbg):
+                        if url not in due:
+                            page_done += 1
                         if rows:
+                            retries.discard(url)
                             writer.write(rows)
                             total_products += 1
                             done_urls_page.add(url)
-                            save_progress(cat_name, curr_page_num, done_urls_page)
+                            save_progress(cat_name, curr_page_num, done_urls_page, page_size)
+                            events.rows(len(rows), url)
+                        events.progress(cat_name, curr_page_num, page_done, len(product_urls),
+                                        cat_idx, len(urls_to_scrape))
 
-                save_progress(cat_name, curr_page_num + 1)
+                save_progress(cat_name, curr_page_num + 1, page_size=page_size)
                 curr_page_num += 1
 
             await list_page.close()
+            await context.save_state()
+
+        if retries:
+            print(f"\n>>> Opakuji {len(retries)} odložených produktů...")
+            async for rows, url in retries.drain(lambda urls: supervised(context, urls, scrape, log=dbg)):
+                if rows:
+                    writer.write(rows)
+                    total_products += 1
+                    events.rows(len(rows), url)
 
         print(f"\n=== HOTOVO ===")
         print(f"Celkem uloženo produktů: {total_products}")
+        await context.save_state()
+        policy.report(dbg)
+        NAV_HEDGE.report(dbg)
+        TRACER.report(dbg)
+        retries.report(dbg)
         clear_progress()
-        await browser.close()
+        lanes.stop()
+        await context.browser.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,86 @@
+"""Sloty workerů – samostatný semafor, nebo férový podíl na sdíleném rozpočtu.
+
+Scraper spuštěný samostatně dostane obyčejný ``asyncio.Semaphore``
+s počtem workerů ze vstupu. Když běží víc webů v jednom procesu
+(``multi_site.py``), runner nainstaluje ``SharedBudget`` a scrapery
+místo vlastního semaforu dostanou pohled na společný rozpočet: web
+nepřekročí svůj limit, celkem se nepřekročí rozpočet a volný slot
+dostane čekající web s nejmenším počtem běžících workerů (max-min
+férovost), takže web s dlouhou frontou nevyhladoví ostatní.
+"""
+
+import asyncio
+
+_shared = None
+
+
+class SharedBudget:
+    def __init__(self, total: int):
+        self.total = total
+        self.limits = {}
+        self.in_use = {}
+        self.waiting = {}
+        self._cond = asyncio.Condition()
+
+    def _can_run(self, site) -> bool:
+        return (sum(self.in_use.values()) < self.total
+                and self.in_use.get(site, 0) < self.limits[site])
+
+    def _may_run(self, site) -> bool:
+        if not self._can_run(site):
+            return False
+        mine = self.in_use.get(site, 0)
+        # Přednost má čekající web s méně běžícími workery (pokud sám může běžet)
+        return all(self.in_use.get(s, 0) >= mine for s, n in self.waiting.items()
+                   if n and s != site and self._can_run(s))
+
+    async def acquire(self, site):
+        async with self._cond:
+            self.waiting[site] = self.waiting.get(site, 0) + 1
+            try:
+                await self._cond.wait_for(lambda: self._may_run(site))
+            finally:
+                self.waiting[site] -= 1
+            self.in_use[site] = self.in_use.get(site, 0) + 1
+
+    async def release(self, site):
+        async with self._cond:
+            self.in_use[site] -= 1
+            self._cond.notify_all()
+
+    def slots(self, site: str, limit: int) -> "_SiteSlots":
+        self.limits[site] = max(1, limit)
+        return _SiteSlots(self, site)
+
+    def summary(self) -> str:
+        parts = [f"{s} {self.in_use.get(s, 0)}/{n}" for s, n in self.limits.items()]
+        return f"{sum(self.in_use.values())}/{self.total} ({', '.join(parts)})"
+
+
+class _SiteSlots:
+    """Náhrada ``asyncio.Semaphore`` pro ``async with`` – slot ze sdíleného rozpočtu."""
+
+    def __init__(self, budget: SharedBudget, site: str):
+        self._budget = budget
+        self._site = site
+
+    async def __aenter__(self):
+        await self._budget.acquire(self._site)
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._budget.release(self._site)
+
+
+def install(total: int) -> SharedBudget:
+    """Sdílený rozpočet pro všechny weby v procesu (volá ``multi_site.py``)."""
+    global _shared
+    _shared = SharedBudget(total)
+    return _shared
+
+
+def worker_slots(site: str, n: int):
+    """Sloty pro ``async with`` – vlastní semafor, nebo podíl na sdíleném rozpočtu."""
+    if _shared is None:
+        return asyncio.Semaphore(n)
+    return _shared.slots(site, n)